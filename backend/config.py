@@ -10,5 +10,91 @@ config = {
     'MODEL_NAME': os.getenv('MODEL_NAME', 'gpt-3.5-turbo'),
     'MAX_TOKENS': int(os.getenv('MAX_TOKENS', 1000)),
     'TEMPERATURE': float(os.getenv('TEMPERATURE', 0.7)),
-    'DATA_PATH': os.getenv('DATA_PATH', 'data/sample_products.json')
-}
\ No newline at end of file
+    'DATA_PATH': os.getenv('DATA_PATH', 'data/sample_products.json'),
+
+    # MongoDB connection pool
+    'MONGODB_URL': os.getenv('MONGODB_URL', 'mongodb://localhost:27017'),
+    'MONGODB_DB_NAME': os.getenv('MONGODB_DB_NAME', 'proddesc'),
+    'MONGODB_MAX_POOL_SIZE': int(os.getenv('MONGODB_MAX_POOL_SIZE', 100)),
+    'MONGODB_MIN_POOL_SIZE': int(os.getenv('MONGODB_MIN_POOL_SIZE', 0)),
+    'MONGODB_WAIT_QUEUE_TIMEOUT_MS': int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS', 5000)),
+    'MONGODB_READ_PREFERENCE': os.getenv('MONGODB_READ_PREFERENCE', 'primary'),
+
+    # Completion cache
+    'COMPLETION_CACHE_ENABLED': os.getenv('COMPLETION_CACHE_ENABLED', 'true').lower() == 'true',
+    'COMPLETION_CACHE_MAX_ENTRIES': int(os.getenv('COMPLETION_CACHE_MAX_ENTRIES', 1024)),
+    'COMPLETION_CACHE_TTL_SECONDS': int(os.getenv('COMPLETION_CACHE_TTL_SECONDS', 3600)),
+    'COMPLETION_CACHE_SQLITE_PATH': os.getenv('COMPLETION_CACHE_SQLITE_PATH', ''),
+    'COMPLETION_CACHE_SQLITE_MAX_ENTRIES': int(os.getenv('COMPLETION_CACHE_SQLITE_MAX_ENTRIES', 100000)),
+
+    # Concurrent field generation
+    'GENERATION_MAX_CONCURRENCY': int(os.getenv('GENERATION_MAX_CONCURRENCY', 8)),
+    'GENERATION_MAX_CONCURRENCY_PER_USER': int(os.getenv('GENERATION_MAX_CONCURRENCY_PER_USER', 4)),
+
+    # Background generation jobs
+    'JOB_STORE': os.getenv('JOB_STORE', 'mongo'),
+    'JOB_WORKERS': int(os.getenv('JOB_WORKERS', 2)),
+    'JOB_LEASE_SECONDS': int(os.getenv('JOB_LEASE_SECONDS', 120)),
+    'JOB_MAX_ATTEMPTS': int(os.getenv('JOB_MAX_ATTEMPTS', 3)),
+    'JOB_POLL_INTERVAL_SECONDS': float(os.getenv('JOB_POLL_INTERVAL_SECONDS', 1.0)),
+
+    # Bulk catalogue import
+    'IMPORT_DIR': os.getenv('IMPORT_DIR', 'data/imports'),
+    'IMPORT_BATCH_SIZE': int(os.getenv('IMPORT_BATCH_SIZE', 500)),
+    'IMPORT_CONCURRENCY': int(os.getenv('IMPORT_CONCURRENCY', 8)),
+    'IMPORT_TOKENS_PER_MINUTE': int(os.getenv('IMPORT_TOKENS_PER_MINUTE', 200000)),
+
+    # OpenAI client-side rate limiting
+    'OPENAI_REQUESTS_PER_MINUTE': int(os.getenv('OPENAI_REQUESTS_PER_MINUTE', 500)),
+    'OPENAI_TOKENS_PER_MINUTE': int(os.getenv('OPENAI_TOKENS_PER_MINUTE', 200000)),
+    'OPENAI_MAX_RETRIES': int(os.getenv('OPENAI_MAX_RETRIES', 5)),
+    'OPENAI_BACKOFF_BASE_SECONDS': float(os.getenv('OPENAI_BACKOFF_BASE_SECONDS', 1.0)),
+    'OPENAI_BACKOFF_MAX_SECONDS': float(os.getenv('OPENAI_BACKOFF_MAX_SECONDS', 60.0)),
+
+    # Image uploads
+    'IMAGE_MAX_UPLOAD_BYTES': int(os.getenv('IMAGE_MAX_UPLOAD_BYTES', 10 * 1024 * 1024)),
+    'IMAGE_UPLOAD_CHUNK_BYTES': int(os.getenv('IMAGE_UPLOAD_CHUNK_BYTES', 1024 * 1024)),
+    'IMAGE_S3_PART_BYTES': int(os.getenv('IMAGE_S3_PART_BYTES', 8 * 1024 * 1024)),
+    'IMAGE_IO_WORKERS': int(os.getenv('IMAGE_IO_WORKERS', 4)),
+    'UPLOADS_CACHE_MAX_AGE_SECONDS': int(os.getenv('UPLOADS_CACHE_MAX_AGE_SECONDS', 31536000)),
+    'IMAGE_DIRECT_UPLOAD_EXPIRES_SECONDS': int(os.getenv('IMAGE_DIRECT_UPLOAD_EXPIRES_SECONDS', 900)),
+    # Development only: uploads land here until stored (outside the public /uploads mount, same filesystem)
+    'IMAGE_INCOMING_DIR': os.getenv('IMAGE_INCOMING_DIR', 'data/uploads-in-progress'),
+
+    # Generated images
+    'IMAGE_RESPONSE_FORMAT': os.getenv('IMAGE_RESPONSE_FORMAT', 'url'),
+    'IMAGE_DOWNLOAD_TIMEOUT_SECONDS': float(os.getenv('IMAGE_DOWNLOAD_TIMEOUT_SECONDS', 60.0)),
+    'IMAGE_DOWNLOAD_MAX_CONNECTIONS': int(os.getenv('IMAGE_DOWNLOAD_MAX_CONNECTIONS', 10)),
+
+    # Resized image variants (empty widths disables them)
+    'IMAGE_VARIANT_WIDTHS': [int(width) for width in os.getenv('IMAGE_VARIANT_WIDTHS', '320,640,1024').split(',') if width.strip()],
+    'IMAGE_VARIANT_FORMATS': [fmt.strip().lower() for fmt in os.getenv('IMAGE_VARIANT_FORMATS', 'webp,jpeg').split(',') if fmt.strip()],
+    'IMAGE_VARIANT_QUALITY': int(os.getenv('IMAGE_VARIANT_QUALITY', 80)),
+    'IMAGE_VARIANT_WORKERS': int(os.getenv('IMAGE_VARIANT_WORKERS', os.cpu_count() or 1)),
+
+    # JSON product store (ProductService)
+    'PRODUCT_STORE_MODE': os.getenv('PRODUCT_STORE_MODE', 'snapshot'),
+    'PRODUCT_LOAD_MODE': os.getenv('PRODUCT_LOAD_MODE', 'eager'),
+    'PRODUCT_WAL_FSYNC_INTERVAL_SECONDS': float(os.getenv('PRODUCT_WAL_FSYNC_INTERVAL_SECONDS', 1.0)),
+    'PRODUCT_WAL_COMPACT_AFTER': int(os.getenv('PRODUCT_WAL_COMPACT_AFTER', 10000)),
+
+    # Product listing
+    'PRODUCTS_PAGE_SIZE': int(os.getenv('PRODUCTS_PAGE_SIZE', 1000)),
+    'PRODUCTS_MAX_PAGE_SIZE': int(os.getenv('PRODUCTS_MAX_PAGE_SIZE', 1000)),
+    'PRODUCTS_COUNT_CACHE_TTL_SECONDS': float(os.getenv('PRODUCTS_COUNT_CACHE_TTL_SECONDS', 30.0)),
+    'PRODUCTS_BULK_MAX_OPERATIONS': int(os.getenv('PRODUCTS_BULK_MAX_OPERATIONS', 1000)),
+
+    # Authenticated user cache
+    'AUTH_USER_CACHE_TTL_SECONDS': float(os.getenv('AUTH_USER_CACHE_TTL_SECONDS', 30.0)),
+    'AUTH_USER_CACHE_MAX_ENTRIES': int(os.getenv('AUTH_USER_CACHE_MAX_ENTRIES', 10000)),
+
+    # Password hashing
+    'AUTH_BCRYPT_ROUNDS': int(os.getenv('AUTH_BCRYPT_ROUNDS', 12)),
+    'AUTH_HASH_WORKERS': int(os.getenv('AUTH_HASH_WORKERS', os.cpu_count() or 1)),
+    'AUTH_HASH_MAX_QUEUE': int(os.getenv('AUTH_HASH_MAX_QUEUE', 32)),
+
+    # Prompt token budgets (0 context tokens uses the model's known context window)
+    'LLM_MAX_PROMPT_TOKENS': int(os.getenv('LLM_MAX_PROMPT_TOKENS', 4000)),
+    'LLM_MAX_COMPLETION_TOKENS': int(os.getenv('LLM_MAX_COMPLETION_TOKENS', 4000)),
+    'LLM_CONTEXT_TOKENS': int(os.getenv('LLM_CONTEXT_TOKENS', 0))
+}
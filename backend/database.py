@@ -1,26 +1,141 @@
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
-from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import monitoring
+from typing import Optional
+from config import config
+import threading
+import logging
 
-# Load environment variables
-load_dotenv()
+logger = logging.getLogger(__name__)
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Track connection pool activity for the metrics endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.created = 0
+        self.closed = 0
+        self.checked_out = 0
+        self.waiting = 0
+        self.checkout_failed = 0
+
+    def _incr(self, name: str, delta: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + delta)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._incr("created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._incr("closed")
+
+    def connection_check_out_started(self, event):
+        self._incr("waiting")
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.waiting -= 1
+            self.checkout_failed += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.waiting -= 1
+            self.checked_out += 1
+
+    def connection_checked_in(self, event):
+        self._incr("checked_out", -1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checked_out": self.checked_out,
+                "waiting": self.waiting,
+                "created": self.created,
+                "closed": self.closed,
+                "open": self.created - self.closed,
+                "checkout_failed": self.checkout_failed,
+            }
+
+
+# Process-wide client, created once at application startup
+client: Optional[AsyncIOMotorClient] = None
+db: Optional[AsyncIOMotorDatabase] = None
+pool_stats = PoolStatsListener()
+
+
+def connect_to_mongo():
+    """Create the shared MongoDB client and connection pool"""
+    global client, db
+    if client is not None:
+        return client
+    client = AsyncIOMotorClient(
+        config['MONGODB_URL'],
+        maxPoolSize=config['MONGODB_MAX_POOL_SIZE'],
+        minPoolSize=config['MONGODB_MIN_POOL_SIZE'],
+        waitQueueTimeoutMS=config['MONGODB_WAIT_QUEUE_TIMEOUT_MS'],
+        event_listeners=[pool_stats]
+    )
+    db = client[config['MONGODB_DB_NAME']]
+    logger.info(
+        f"MongoDB client created (maxPoolSize={config['MONGODB_MAX_POOL_SIZE']}, "
+        f"minPoolSize={config['MONGODB_MIN_POOL_SIZE']})"
+    )
+    return client
+
+
+def close_mongo_connection():
+    """Close the shared MongoDB client"""
+    global client, db
+    if client is not None:
+        client.close()
+    client = None
+    db = None
 
-# MongoDB connection
-MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
-client = AsyncIOMotorClient(MONGODB_URL)
-db = client.proddesc_db
 
 async def init_db():
     """Initialize database and create indexes if needed"""
+    database = get_database()
+
     # Create indexes for users collection
-    await db.users.create_index("email", unique=True)
-    
+    await database.users.create_index("email", unique=True)
+
     # Create indexes for products collection
-    await db.products.create_index("user_id")
-    await db.products.create_index([("user_id", 1), ("created_at", -1)])
-    
+    await database.products.create_index("user_id")
+    await database.products.create_index([("user_id", 1), ("created_at", -1)])
+    # Keyset pagination indexes for GET /products; _id breaks ties between equal sort values
+    for sort_field in ("created_at", "updated_at", "name", "price"):
+        await database.products.create_index([("user_id", 1), (sort_field, 1), ("_id", 1)])
+    # Lets the variant pipeline find variants already rendered for a shared image
+    await database.products.create_index("image_variants.source")
+
     print("Database initialized successfully")
 
-def get_database():
+
+def get_database() -> AsyncIOMotorDatabase:
     """Get database instance"""
-    return db 
\ No newline at end of file
+    if db is None:
+        connect_to_mongo()
+    return db
+
+
+def get_pool_stats() -> dict:
+    """Get connection pool statistics"""
+    stats = pool_stats.snapshot()
+    stats["max_pool_size"] = config['MONGODB_MAX_POOL_SIZE']
+    stats["min_pool_size"] = config['MONGODB_MIN_POOL_SIZE']
+    return stats
@@ -1,17 +1,45 @@
-from typing import Generator
-from pymongo import MongoClient
-from pymongo.database import Database
-from fastapi import Depends
-from database import get_database
-from motor.motor_asyncio import AsyncIOMotorClient
-
-def get_database() -> Generator[Database, None, None]:
-    client = AsyncIOMotorClient("mongodb://localhost:27017")
-    try:
-        yield client.proddesc
-    finally:
-        client.close()
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.read_preferences import ReadPreference
+from config import config
+import database
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+_databases_by_read_preference = {}
+
+
+def get_database() -> AsyncIOMotorDatabase:
+    """Dependency returning the shared database handle"""
+    return database.get_database()
+
+
+def with_read_preference(mode: str):
+    """Build a database dependency that reads with the given read preference"""
+    if mode not in READ_PREFERENCES:
+        raise ValueError(f"Unknown read preference '{mode}'")
+
+    def dependency() -> AsyncIOMotorDatabase:
+        db = database.get_database()
+        cached = _databases_by_read_preference.get(mode)
+        # The shared client may have been recreated (e.g. across test apps)
+        if cached is None or cached[0] is not db:
+            cached = (db, db.with_options(read_preference=READ_PREFERENCES[mode]))
+            _databases_by_read_preference[mode] = cached
+        return cached[1]
+
+    return dependency
+
+
+# Used by read-only routes; configurable so list views can be served by secondaries
+get_read_database = with_read_preference(config['MONGODB_READ_PREFERENCE'])
+
 
 async def get_db():
     """Dependency to get database instance"""
-    return get_database() 
\ No newline at end of file
+    return get_database()
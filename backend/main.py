@@ -1,15 +1,24 @@
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from motor.motor_asyncio import AsyncIOMotorClient
+from fastapi.responses import ORJSONResponse
 from routes.auth import router as auth_router
 from routes.products import router as products_router
 from routes.content import router as content_router
+from routes.metrics import router as metrics_router
+from routes.jobs import router as jobs_router
+from services.job_queue import job_queue
+from services.generation_jobs import register_generation_jobs
+from services.openai_service import close_download_client, CHAT_MODEL
+from services.prompt_budget import preload_encodings
+from config import config
+from services.image_variants import image_variants
 from utils.auth import get_current_user
+from utils.http_cache import ImmutableStaticFiles
+from utils.body_limit import BodySizeLimitMiddleware, MULTIPART_OVERHEAD_BYTES
 from models.user import User
 import os
 from dotenv import load_dotenv
-from database import init_db
+from database import init_db, connect_to_mongo, close_mongo_connection, get_database
 import logging
 import uvicorn
 
@@ -19,7 +28,14 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Product Description API")
+app = FastAPI(title="Product Description API", default_response_class=ORJSONResponse)
+
+# Refuse oversized image uploads before they are spooled (added first so CORS still wraps the 413)
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_bytes=config['IMAGE_MAX_UPLOAD_BYTES'] + MULTIPART_OVERHEAD_BYTES,
+    paths=r"/api/products/[^/]+/image"
+)
 
 # CORS middleware
 app.add_middleware(
@@ -28,29 +44,37 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag"],
 )
 
-# MongoDB connection
-MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
-client = AsyncIOMotorClient(MONGODB_URL)
-db = client.proddesc_db
-
 # Mount static files for development
 if os.getenv("ENVIRONMENT") != "production":
-    app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
-
-# Dependency to get database
-def get_database():
-    return db
+    app.mount("/uploads", ImmutableStaticFiles(directory="uploads"), name="uploads")
 
 # Include routers
 app.include_router(auth_router, prefix="/api/auth", tags=["auth"])
 app.include_router(products_router, prefix="/api", tags=["products"])
 app.include_router(content_router, prefix="/api", tags=["content"])
+app.include_router(metrics_router, prefix="/api", tags=["metrics"])
+app.include_router(jobs_router, prefix="/api", tags=["jobs"])
+
+register_generation_jobs(job_queue)
 
 @app.on_event("startup")
 async def startup_event():
+    connect_to_mongo()
     await init_db()
+    await job_queue.start(get_database())
+    image_variants.start()
+    # Loads in the background so a slow tokenizer download never delays startup; counts are estimated until then
+    preload_encodings([CHAT_MODEL, config['MODEL_NAME']])
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await job_queue.stop()
+    await close_download_client()
+    image_variants.shutdown()
+    close_mongo_connection()
 
 @app.get("/")
 async def root():
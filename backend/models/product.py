@@ -1,6 +1,6 @@
 from datetime import datetime
-from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, ConfigDict
+from typing import List, Optional, Dict, Any, Literal
+from pydantic import BaseModel, ConfigDict, Field
 from bson import ObjectId
 
 class MarketingCopy(BaseModel):
@@ -12,6 +12,16 @@ class MarketingCopy(BaseModel):
         "linkedin": ""
     }
 
+class ImageVariant(BaseModel):
+    width: int
+    format: str
+    url: str
+
+class ImageVariants(BaseModel):
+    """Resized copies of image_url; only valid while `source` equals the product's image_url"""
+    source: str = ""
+    items: List[ImageVariant] = []
+
 class ProductBase(BaseModel):
     name: str
     price: float
@@ -27,6 +37,47 @@ class ProductBase(BaseModel):
 class ProductCreate(ProductBase):
     pass
 
+class ProductUpdate(BaseModel):
+    """Partial update; only the fields that are sent are written"""
+    name: Optional[str] = None
+    price: Optional[float] = None
+    brand: Optional[str] = None
+    basic_description: Optional[str] = None
+    category: Optional[str] = None
+    subcategory: Optional[str] = None
+    features: Optional[List[str]] = None
+    materials: Optional[List[str]] = None
+    colors: Optional[List[str]] = None
+    tags: Optional[List[str]] = None
+    image_url: Optional[str] = None
+    seo_title: Optional[str] = None
+    seo_description: Optional[str] = None
+    detailed_description: Optional[str] = None
+    marketing_copy: Optional[MarketingCopy] = None
+    is_completed: Optional[bool] = None
+    content: Optional[Dict[str, Any]] = None
+
+    model_config = ConfigDict(extra="forbid")
+
+class BulkProductOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    id: Optional[str] = None
+    product: Optional[Dict[str, Any]] = None
+
+class BulkProductRequest(BaseModel):
+    operations: List[BulkProductOperation]
+    ordered: bool = False
+
+class ImageUploadRequest(BaseModel):
+    """An image the client will upload directly to storage"""
+    filename: str
+    content_type: str
+    size: int
+    sha256: str
+
+class ImageUploadComplete(BaseModel):
+    upload_id: str
+
 class Product(BaseModel):
     id: Optional[str] = None
     user_id: Optional[str] = None
@@ -41,14 +92,17 @@ class Product(BaseModel):
     colors: List[str] = []
     tags: List[str] = []
     image_url: str = ""
+    image_variants: ImageVariants = ImageVariants()
     seo_title: str = ""
     seo_description: str = ""
     detailed_description: str = ""
     marketing_copy: MarketingCopy = MarketingCopy()
-    created_at: datetime = datetime.utcnow()
-    updated_at: datetime = datetime.utcnow()
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
     is_completed: bool = False
     content: Dict[str, Any] = {}
+    # Incremented on every update; used for optimistic concurrency (If-Match)
+    version: int = 0
 
     model_config = ConfigDict(
         arbitrary_types_allowed=True,
@@ -69,6 +123,7 @@ class Product(BaseModel):
             "colors": self.colors,
             "tags": self.tags,
             "image_url": self.image_url,
+            "image_variants": self.image_variants.model_dump(),
             "seo_title": self.seo_title,
             "seo_description": self.seo_description,
             "detailed_description": self.detailed_description,
@@ -76,7 +131,8 @@ class Product(BaseModel):
             "created_at": self.created_at,
             "updated_at": self.updated_at,
             "is_completed": self.is_completed,
-            "content": self.content
+            "content": self.content,
+            "version": self.version
         }
         if self.id:
             data["_id"] = ObjectId(self.id)
@@ -84,6 +140,23 @@ class Product(BaseModel):
             data["user_id"] = ObjectId(self.user_id)
         return data
 
+    @classmethod
+    def dump_db(cls, data: dict, include: Optional[set] = None) -> dict:
+        """
+        Response dict for a stored document, equivalent to from_dict(data).model_dump()
+
+        Documents are written through our own models, so read routes skip
+        re-validating them; missing fields get their defaults.
+        """
+        dumped = _dump_defaults(cls, data, include)
+        if "id" in dumped:
+            dumped["id"] = str(data["_id"]) if "_id" in data else None
+        if "user_id" in dumped and dumped["user_id"] is not None:
+            dumped["user_id"] = str(dumped["user_id"])
+        if isinstance(dumped.get("marketing_copy"), dict):
+            dumped["marketing_copy"] = _dump_defaults(MarketingCopy, dumped["marketing_copy"])
+        return dumped
+
     @classmethod
     def from_dict(cls, data: dict) -> 'Product':
         id_str = str(data.pop("_id")) if "_id" in data else None
@@ -97,4 +170,21 @@ class Product(BaseModel):
             id=id_str,
             user_id=user_id_str,
             **data
-        ) 
\ No newline at end of file
+        ) 
+
+def _dump_defaults(model: type, data: dict, include: Optional[set] = None) -> dict:
+    """The model's fields taken from `data`, falling back to their defaults"""
+    dumped = {}
+    for name, field in model.model_fields.items():
+        if include is not None and name not in include:
+            continue
+        if name in data:
+            dumped[name] = data[name]
+        else:
+            default = field.get_default(call_default_factory=True)
+            dumped[name] = default.model_dump() if isinstance(default, BaseModel) else default
+    return dumped
+
+def versioned_update(changes: dict) -> dict:
+    """Update document that $sets `changes` and bumps updated_at and version, keeping ETags fresh"""
+    return {"$set": {**changes, "updated_at": datetime.utcnow()}, "$inc": {"version": 1}}
@@ -5,13 +5,15 @@ from datetime import datetime, timedelta
 from typing import Optional
 from models.user import User, UserCreate, UserResponse
 from utils.auth import (
-    verify_password,
-    get_password_hash,
     create_tokens,
     get_current_user,
     refresh_access_token,
+    oauth2_scheme,
+    user_cache,
+    password_hasher,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
+from services.password_hasher import PasswordHasherBusyError
 from pydantic import BaseModel, EmailStr
 from dependencies.database import get_database
 from bson import ObjectId
@@ -39,6 +41,23 @@ class LoginRequest(BaseModel):
     email: EmailStr
     password: str
 
+def hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-ins in progress, please retry",
+        headers={"Retry-After": "1"}
+    )
+
+async def check_password(db: AsyncIOMotorDatabase, user_data: dict, password: str) -> bool:
+    """Verify off the event loop, storing a new hash if the bcrypt cost has changed"""
+    try:
+        valid, new_hash = await password_hasher.verify_and_update(password, user_data["hashed_password"])
+    except PasswordHasherBusyError:
+        raise hasher_busy()
+    if valid and new_hash:
+        await db.users.update_one({"_id": user_data["_id"]}, {"$set": {"hashed_password": new_hash}})
+    return valid
+
 @router.post("/register", response_model=UserResponse)
 async def register(user: UserCreate, db: Database = Depends(get_database)):
     # Check if user already exists
@@ -49,11 +68,16 @@ async def register(user: UserCreate, db: Database = Depends(get_database)):
             detail="Email already registered"
         )
     
+    try:
+        hashed_password = await password_hasher.hash(user.password)
+    except PasswordHasherBusyError:
+        raise hasher_busy()
+
     # Create new user
     now = datetime.utcnow()
     user_dict = {
         "email": user.email,
-        "hashed_password": get_password_hash(user.password),
+        "hashed_password": hashed_password,
         "full_name": user.full_name,
         "is_active": True,
         "is_superuser": False,
@@ -86,7 +110,7 @@ async def login_json(
             )
         
         # Verify password
-        if not verify_password(login_data.password, user_data["hashed_password"]):
+        if not await check_password(db, user_data, login_data.password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect email or password"
@@ -100,6 +124,8 @@ async def login_json(
             "refresh_token": refresh_token,
             "token_type": "bearer"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -112,7 +138,7 @@ async def login(
     db: Database = Depends(get_database)
 ):
     # Find user by email
-    user_data = db.users.find_one({"email": form_data.username})
+    user_data = await db.users.find_one({"email": form_data.username})
     
     # Check if user exists and password is correct
     if not user_data:
@@ -122,7 +148,7 @@ async def login(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    if not verify_password(form_data.password, user_data["hashed_password"]):
+    if not await check_password(db, user_data, form_data.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -152,10 +178,11 @@ async def login(
     )
     
     # Update last login time
-    db.users.update_one(
+    await db.users.update_one(
         {"_id": user_data["_id"]},
         {"$set": {"updated_at": datetime.utcnow()}}
     )
+    user_cache.invalidate_user(user_data["_id"])
     
     return LoginResponse(
         access_token=access_token,
@@ -169,8 +196,8 @@ async def login_legacy(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Database = Depends(get_database)
 ):
-    user_data = db.users.find_one({"email": form_data.username})
-    if not user_data or not verify_password(form_data.password, user_data["hashed_password"]):
+    user_data = await db.users.find_one({"email": form_data.username})
+    if not user_data or not await check_password(db, user_data, form_data.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -204,7 +231,12 @@ async def refresh_token(token_data: TokenRefresh):
         )
 
 @router.get("/me", response_model=UserResponse)
-async def read_users_me(current_user: User = Depends(get_current_user)):
+async def read_users_me(
+    current_user: User = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    # get_current_user leaves out the products array; only this route returns it
+    user_data = await db.users.find_one({"_id": current_user.id}, {"products": 1}) or {}
     return UserResponse(
         id=current_user.id,
         email=current_user.email,
@@ -213,12 +245,17 @@ async def read_users_me(current_user: User = Depends(get_current_user)):
         is_superuser=current_user.is_superuser,
         created_at=current_user.created_at,
         updated_at=current_user.updated_at,
-        products=current_user.products
+        products=[str(product_id) for product_id in user_data.get("products", [])]
     )
 
 @router.post("/logout")
-async def logout(current_user: User = Depends(get_current_user)):
+async def logout(
+    token: str = Depends(oauth2_scheme),
+    current_user: User = Depends(get_current_user)
+):
     """Logout user"""
+    # Stop serving this token from the user cache straight away
+    user_cache.invalidate_token(token)
     try:
         # In a real application, you might want to blacklist the token
         # or perform other cleanup operations
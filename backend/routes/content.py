@@ -1,12 +1,19 @@
 from services import openai_service
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 from pymongo.database import Database
 from models.user import User
-from models.product import Product
+from models.product import Product, versioned_update
 from utils.auth import get_current_user
 from dependencies.database import get_database
 from services.openai_service import OpenAIService
+from utils.prompts import get_prompt_for_field
+from services.job_queue import job_queue
+from services.generation_jobs import GENERATE_BASIC_DATA, COMPLETE_PRODUCT
+from services.image_service import ImageService
+from services.product_writes import save_generated_fields
 import logging
+import json
 from bson import ObjectId, errors as bson_errors
 
 router = APIRouter()
@@ -29,7 +36,8 @@ async def generate_field(
     payload: dict,
     current_user: User = Depends(get_current_user),
     db: Database = Depends(get_database),
-    openai_service: OpenAIService = Depends()
+    openai_service: OpenAIService = Depends(),
+    image_service: ImageService = Depends()
 ):
     try:
         # Convert product_id to ObjectId
@@ -54,8 +62,9 @@ async def generate_field(
         product = Product(**product_data)
 
         image_options = payload.get("imageOptions", {})
+        use_cache = not payload.get("bypassCache", False)
         # Generate content for the specified field
-        generated_content = await openai_service.generate_missing_field(product, field, image_options)
+        generated_content = await openai_service.generate_missing_field(product, field, image_options, use_cache=use_cache)
 
         if field == "features":
             if isinstance(generated_content, str):
@@ -65,10 +74,7 @@ async def generate_field(
                 ]
         
         # Update the database with the generated content
-        await db.products.update_one(
-            {"_id": product_id},
-            {"$set": {field: generated_content}}
-        )
+        await save_generated_fields(db, image_service, product_id, {field: generated_content})
 
         return {
             "message": f"{field} generated successfully.",
@@ -81,11 +87,235 @@ async def generate_field(
             detail="Error generating field"
         )
     
+def _sse_event(event: str, data: dict) -> str:
+    """Format a Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.api_route("/products/{product_id}/generate-field/stream", methods=["GET", "POST"])
+async def stream_field(
+    product_id: str,
+    field: str,
+    request: Request,
+    bypass_cache: bool = False,
+    current_user: User = Depends(get_current_user),
+    db: Database = Depends(get_database),
+    openai_service: OpenAIService = Depends()
+):
+    # Convert product_id to ObjectId
+    try:
+        product_id = ObjectId(product_id)
+    except bson_errors.InvalidId:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid product ID"
+        )
+
+    if field == "image_url":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Images cannot be streamed"
+        )
+
+    # Get product
+    product_data = await db.products.find_one({"_id": product_id, "user_id": current_user.id})
+    if not product_data:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found"
+        )
+
+    product = Product(**convert_objectid_to_str(product_data))
+    try:
+        # Validate the field before the response starts streaming
+        get_prompt_for_field(product, field)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    async def event_stream():
+        chunks = []
+        stream = openai_service.stream_missing_field(
+            product, field, user_id=str(current_user.id), use_cache=not bypass_cache
+        )
+        try:
+            async for delta in stream:
+                if await request.is_disconnected():
+                    logger.info(f"Client disconnected, discarding streamed {field}")
+                    return
+                chunks.append(delta)
+                yield _sse_event("token", {"content": delta})
+
+            content = openai_service.coerce_field_value(field, "".join(chunks).strip())
+            await db.products.update_one(
+                {"_id": product_id},
+                versioned_update({field: content})
+            )
+            yield _sse_event("done", {"field": field, "generated_content": content})
+        except Exception as e:
+            logger.error(f"Error streaming field: {str(e)}")
+            yield _sse_event("error", {"detail": "Error generating field"})
+        finally:
+            await stream.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/products/{product_id}/generate-fields")
+async def generate_fields(
+    product_id: str,
+    payload: dict,
+    current_user: User = Depends(get_current_user),
+    db: Database = Depends(get_database),
+    openai_service: OpenAIService = Depends(),
+    image_service: ImageService = Depends()
+):
+    try:
+        # Convert product_id to ObjectId
+        try:
+            product_id = ObjectId(product_id)
+        except bson_errors.InvalidId:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid product ID"
+            )
+
+        fields = payload.get("fields", [])
+        if not fields:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="No fields requested"
+            )
+
+        # Get product
+        product_data = await db.products.find_one({"_id": product_id, "user_id": current_user.id})
+        if not product_data:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Product not found"
+            )
+
+        product = Product(**convert_objectid_to_str(product_data))
+
+        use_cache = not payload.get("bypassCache", False)
+        generated_content, errors = await openai_service.generate_fields(
+            product,
+            fields,
+            image_options=payload.get("imageOptions", {}),
+            user_id=str(current_user.id),
+            use_cache=use_cache
+        )
+
+        # Persist every successful field in a single update
+        if generated_content:
+            await save_generated_fields(db, image_service, product_id, generated_content)
+
+        return {
+            "message": "Fields generated successfully." if not errors else "Some fields could not be generated.",
+            "generated_content": generated_content,
+            "errors": errors
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error generating fields: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error generating fields"
+        )
+
+@router.post("/products/{product_id}/generate-fields/stream")
+async def stream_fields(
+    product_id: str,
+    payload: dict,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Database = Depends(get_database),
+    openai_service: OpenAIService = Depends(),
+    image_service: ImageService = Depends()
+):
+    """
+    generate-fields as Server-Sent Events: a `field` (or `error`) event as
+    each field finishes, then `done` once they are all stored in one update
+    """
+    # Convert product_id to ObjectId
+    try:
+        product_id = ObjectId(product_id)
+    except bson_errors.InvalidId:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid product ID"
+        )
+
+    fields = payload.get("fields", [])
+    if not fields:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No fields requested"
+        )
+
+    # Get product
+    product_data = await db.products.find_one({"_id": product_id, "user_id": current_user.id})
+    if not product_data:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found"
+        )
+
+    product = Product(**convert_objectid_to_str(product_data))
+
+    async def event_stream():
+        generated_content = {}
+        errors = {}
+        results = openai_service.iter_fields(
+            product,
+            fields,
+            image_options=payload.get("imageOptions", {}),
+            user_id=str(current_user.id),
+            use_cache=not payload.get("bypassCache", False)
+        )
+        try:
+            async for field, value, error in results:
+                if await request.is_disconnected():
+                    logger.info("Client disconnected, discarding generated fields")
+                    if generated_content.get("image_url"):
+                        # No product references the generated image
+                        await image_service.release_image(db, generated_content["image_url"])
+                    return
+                if error is None:
+                    generated_content[field] = value
+                    yield _sse_event("field", {"field": field, "generated_content": value})
+                else:
+                    errors[field] = error
+                    yield _sse_event("error", {"field": field, "detail": error})
+
+            if generated_content:
+                await save_generated_fields(db, image_service, product_id, generated_content)
+            yield _sse_event("done", {"generated_content": generated_content, "errors": errors})
+        except Exception as e:
+            logger.error(f"Error streaming fields: {str(e)}")
+            yield _sse_event("error", {"detail": "Error generating fields"})
+        finally:
+            await results.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/products/{product_id}/generate")
 async def generate_content(
     product_id: str,
+    payload: dict = None,
     current_user: User = Depends(get_current_user),
     db: Database = Depends(get_database),
+    openai_service: OpenAIService = Depends(),
+    image_service: ImageService = Depends()
 ):
     try:
         # Convert product_id to ObjectId
@@ -98,49 +328,32 @@ async def generate_content(
             )
 
         # Get product
-        product = await db.products.find_one({"_id": product_id, "user_id": current_user.id})
-        if not product:
+        product_data = await db.products.find_one({"_id": product_id, "user_id": current_user.id})
+        if not product_data:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Product not found"
             )
-        
-        required_fields = [
-            "name", "price", "brand", "category", "basic_description",
-            "features", "materials", "colors", "tags", "seo_title",
-            "seo_description", "detailed_description", "marketing_copy"
-        ]
 
-        missing_fields = {field: None for field in required_fields if not product.get(field)}
+        product = Product(**convert_objectid_to_str(product_data))
 
+        missing_fields = openai_service.get_missing_fields(product)
         if not missing_fields:
             return {"message": "No missing fields to generate."}
 
-        generated_content = {}
-        for field in missing_fields:
-            if field in ["seo_title", "seo_description"]:
-                generated_content.update(
-                    openai_service.generate_seo_content(product, style={"tone": "professional"})
-                )
-            elif field == "detailed_description":
-                generated_content[field] = openai_service.generate_content(product).get("detailed_description")
-            elif field == "marketing_copy":
-                generated_content[field] = openai_service.generate_marketing_email(product, style={"tone": "engaging"})
-            else:
-                # Generate other fields (e.g., features, materials, etc.)
-                generated_content[field] = openai_service.generate_missing_fields(product, field).get(field)
+        # One structured call for all missing fields, per-field fallback for invalid keys
+        use_cache = not (payload or {}).get("bypassCache", False)
+        generated_content = await openai_service.generate_all_missing_fields(product, missing_fields, use_cache=use_cache)
 
         # Update the database with the generated content
-        if product_id:
-            await db.products.update_one(
-                {"_id": product_id},
-                {"$set": generated_content}
-            )
+        await save_generated_fields(db, image_service, product_id, generated_content)
 
         return {
             "message": "Missing content generated successfully.",
             "generated_content": generated_content
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating content: {str(e)}")
         raise HTTPException(
@@ -148,13 +361,12 @@ async def generate_content(
             detail="Error generating content"
         )
 
-@router.post("/products/{product_id}/generate-basic-data")
+@router.post("/products/{product_id}/generate-basic-data", status_code=status.HTTP_202_ACCEPTED)
 async def generate_basic_data(
     product_id: str,
     payload: dict,
     current_user: User = Depends(get_current_user),
-    db: Database = Depends(get_database),
-    openai_service: OpenAIService = Depends()
+    db: Database = Depends(get_database)
 ):
     try:
         # Convert product_id to ObjectId
@@ -167,66 +379,82 @@ async def generate_basic_data(
             )
 
         # Get product
-        product = await db.products.find_one({"_id": product_id, "user_id": current_user.id})
+        product = await db.products.find_one({"_id": product_id, "user_id": current_user.id}, {"_id": 1})
         if not product:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Product not found"
             )
 
-        description_options = payload.get("descriptionOptions", {})
-        image_options = payload.get("imageOptions", {})
-
-        basic_data = await openai_service.generate_basic_data(product, db, product_id, description_options, image_options)
-
-        # Update the product in the database
-        await db.products.update_one(
-            {"_id": product_id},
-            {"$set": basic_data}
+        # Generation runs on the job workers; poll GET /api/jobs/{job_id} for progress
+        job = await job_queue.enqueue(
+            GENERATE_BASIC_DATA,
+            current_user.id,
+            {
+                "descriptionOptions": payload.get("descriptionOptions", {}),
+                "imageOptions": payload.get("imageOptions", {}),
+                "bypassCache": payload.get("bypassCache", False)
+            },
+            product_id=product_id
         )
 
         return {
-            "message": "Basic data generated successfully.",
-            "generated_basic_data": basic_data
+            "message": "Basic data generation queued.",
+            "job_id": str(job["_id"]),
+            "status": job["status"]
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating basic data: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error generating basic data"
         )
-@router.post("/complete/{product_id}")
+
+@router.post("/complete/{product_id}", status_code=status.HTTP_202_ACCEPTED)
 async def complete_product(
     product_id: str,
+    payload: dict = None,
     current_user: User = Depends(get_current_user),
-    db: Database = Depends(get_database),
-    openai_service: OpenAIService = Depends()
+    db: Database = Depends(get_database)
 ):
     try:
+        # Convert product_id to ObjectId
+        try:
+            product_id = ObjectId(product_id)
+        except bson_errors.InvalidId:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid product ID"
+            )
+
         # Get product
-        product = db.products.find_one({
-            "_id": product_id,
-            "user_id": current_user.id
-        })
+        product = await db.products.find_one({"_id": product_id, "user_id": current_user.id}, {"_id": 1})
         if not product:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Product not found"
             )
 
-        # Complete product with missing fields
-        completed_product = await openai_service.complete_product(product)
-        
-        # Update product with completed fields
-        db.products.update_one(
-            {"_id": product_id},
-            {"$set": completed_product}
+        # Complete product with missing fields on the job workers
+        job = await job_queue.enqueue(
+            COMPLETE_PRODUCT,
+            current_user.id,
+            {"bypassCache": (payload or {}).get("bypassCache", False)},
+            product_id=product_id
         )
 
-        return completed_product
+        return {
+            "message": "Product completion queued.",
+            "job_id": str(job["_id"]),
+            "status": job["status"]
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error completing product: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error completing product"
-        ) 
\ No newline at end of file
+        )
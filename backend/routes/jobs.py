@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from models.user import User
+from utils.auth import get_current_user
+from services.job_queue import job_queue
+from utils.converter import convert_objectid_to_str
+from bson import ObjectId, errors as bson_errors
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+def serialize_job(job: dict) -> dict:
+    """Public view of a job document"""
+    return convert_objectid_to_str({
+        "id": job["_id"],
+        "type": job["type"],
+        "product_id": job.get("product_id"),
+        "status": job["status"],
+        "current_step": job.get("current_step"),
+        "progress": job.get("progress", []),
+        "attempts": job.get("attempts", 0),
+        "max_attempts": job.get("max_attempts"),
+        "result": job.get("result"),
+        "error": job.get("error"),
+        "created_at": job.get("created_at"),
+        "updated_at": job.get("updated_at")
+    })
+
+@router.get("/jobs/{job_id}")
+async def get_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Get the status and progress of a background job"""
+    try:
+        job = await job_queue.get(ObjectId(job_id))
+    except bson_errors.InvalidId:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid job ID"
+        )
+    if not job or job["user_id"] != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return serialize_job(job)
@@ -0,0 +1,29 @@
+from fastapi import APIRouter
+from database import get_pool_stats
+from services.completion_cache import completion_cache
+from services.concurrency import generation_limiter
+from services.rate_limiter import openai_rate_limiter
+from services.image_service import upload_stats
+from services.image_variants import image_variants
+from utils.auth import password_hasher
+from utils.prompts import prompt_stats
+from services.prompt_budget import token_usage
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+@router.get("/metrics")
+async def get_metrics():
+    """Runtime metrics for the API process"""
+    return {
+        "mongo_pool": get_pool_stats(),
+        "completion_cache": completion_cache.stats(),
+        "generation": generation_limiter.stats(),
+        "openai_rate_limits": openai_rate_limiter.stats(),
+        "image_uploads": upload_stats.snapshot(),
+        "image_variants": image_variants.stats(),
+        "password_hashing": password_hasher.stats(),
+        "prompts": prompt_stats.snapshot(),
+        "llm_tokens": token_usage.stats()
+    }
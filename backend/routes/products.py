@@ -1,16 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Request, Response, Header
+from fastapi.responses import FileResponse, ORJSONResponse
+from typing import List, Optional
 from pymongo.database import Database
-from models.product import Product, ProductCreate
+from models.product import (
+    Product, ProductCreate, ProductUpdate, BulkProductRequest, ImageUploadRequest, ImageUploadComplete
+)
 from models.user import User
 from utils.auth import get_current_user
-from services.image_service import ImageService
-from dependencies.database import get_database
+from services.image_service import ImageService, ImageTooLargeError, DirectUploadError
+from dependencies.database import get_database, get_read_database
 import logging
 from datetime import datetime
 from bson import ObjectId, errors as bson_errors
 from motor.motor_asyncio import AsyncIOMotorCursor, AsyncIOMotorDatabase
 from utils.converter import convert_objectid_to_str, safe_text , sanitize_unicode
+from services.job_queue import job_queue
+from services.generation_jobs import IMPORT_CATALOGUE, import_results_path
+from services.product_query import (
+    InvalidQueryError, parse_sort, parse_fields, build_projection,
+    encode_cursor, decode_cursor, keyset_filter, list_summary, product_counts
+)
+from services.product_bulk import execute_bulk
+from services.product_writes import MissingImageError, variant_urls, write_product_fields
+from utils.http_cache import PRODUCT_CACHE_CONTROL, product_etag, list_etag, etag_matches, not_modified
+from config import config
+import aiofiles
+import os
+import uuid
 
 
 router = APIRouter()
@@ -35,6 +51,7 @@ async def create_product(
         # Insert into database
         product_dict = new_product.to_dict()
         result = await db.products.insert_one(product_dict)
+        product_counts.invalidate(ObjectId(current_user.id))
         
         # Get the created product
         created_product = await db.products.find_one({"_id": result.inserted_id})
@@ -46,25 +63,150 @@ async def create_product(
             detail="Error creating product"
         )
 
+@router.post("/products:bulk")
+async def bulk_products(
+    request: BulkProductRequest,
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_database),
+    image_service: ImageService = Depends()
+):
+    """Create, update and delete many products in one request"""
+    if len(request.operations) > config['PRODUCTS_BULK_MAX_OPERATIONS']:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {config['PRODUCTS_BULK_MAX_OPERATIONS']} operations per request"
+        )
+    try:
+        user_id = ObjectId(current_user.id)
+        results = await execute_bulk(db, user_id, request.operations, ordered=request.ordered, image_service=image_service)
+        product_counts.invalidate(user_id)
+
+        counts = {}
+        for result in results:
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+        return {"results": results, "counts": counts}
+    except Exception as e:
+        logger.error(f"Error running bulk product operations: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error running bulk product operations"
+        )
+
+@router.post("/products/import", status_code=status.HTTP_202_ACCEPTED)
+async def import_products(
+    file: UploadFile = File(...),
+    generate: bool = Form(True),
+    current_user: User = Depends(get_current_user)
+):
+    """Queue a bulk import of a JSONL or CSV catalogue file"""
+    extension = os.path.splitext(file.filename or "")[1].lower()
+    if extension not in (".jsonl", ".csv"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Catalogue must be a .jsonl or .csv file"
+        )
+    try:
+        # Spool the upload to disk in chunks; the job streams it from there
+        os.makedirs(config['IMPORT_DIR'], exist_ok=True)
+        input_path = os.path.join(config['IMPORT_DIR'], f"{uuid.uuid4().hex}{extension}")
+        async with aiofiles.open(input_path, "wb") as out:
+            while chunk := await file.read(1024 * 1024):
+                await out.write(chunk)
+
+        job = await job_queue.enqueue(
+            IMPORT_CATALOGUE,
+            current_user.id,
+            {"input_path": input_path, "generate": generate}
+        )
+        return {
+            "message": "Catalogue import queued.",
+            "job_id": str(job["_id"]),
+            "status": job["status"]
+        }
+    except Exception as e:
+        logger.error(f"Error importing products: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error importing products"
+        )
+
+@router.get("/products/import/{job_id}/results")
+async def get_import_results(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Download the per-row results of a catalogue import"""
+    try:
+        job = await job_queue.get(ObjectId(job_id))
+    except bson_errors.InvalidId:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid job ID"
+        )
+    if not job or job["user_id"] != current_user.id or job["type"] != IMPORT_CATALOGUE:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Import not found"
+        )
+    results_path = import_results_path(job["_id"])
+    if not os.path.exists(results_path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Import results not available yet"
+        )
+    return FileResponse(results_path, media_type="application/x-ndjson", filename=f"{job_id}.results.jsonl")
+
 @router.get("/products", response_model=List[Product])
 async def get_products(
+    limit: int = Query(config['PRODUCTS_PAGE_SIZE'], ge=1, le=config['PRODUCTS_MAX_PAGE_SIZE']),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
+    sort: str = Query("created_at", description="created_at, updated_at, name or price; prefix with - for descending"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. name,price,image_url"),
+    count: bool = Query(False, description="Return the user's total product count in X-Total-Count"),
+    if_none_match: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
-    db: AsyncIOMotorDatabase = Depends(get_database)
+    db: AsyncIOMotorDatabase = Depends(get_read_database)
 ):
-    """Get all products for the current user"""
+    """Get a page of products for the current user"""
     try:
         # Convert string ID to ObjectId
         user_id = ObjectId(current_user.id)
-        
-        # Get async cursor
-        cursor: AsyncIOMotorCursor = db.products.find({"user_id": user_id})
-        
-        # Convert cursor to list using Motor's async method
-        product_docs = await cursor.to_list(length=1000)  # Adjust length as needed
-        
-        # Convert MongoDB documents to Pydantic models
-        return [Product.from_dict(doc) for doc in product_docs]
-        
+        sort_field, direction = parse_sort(sort)
+        requested_fields = parse_fields(fields)
+        query = {"user_id": user_id}
+        if cursor:
+            query.update(keyset_filter(sort_field, direction, *decode_cursor(cursor)))
+
+        headers = {"Cache-Control": PRODUCT_CACHE_CONTROL}
+        # Revalidation is answered from one aggregate without fetching or serialising the page
+        headers["ETag"] = list_etag(f"{sort}|{fields}|{cursor}|{limit}|{count}", await list_summary(db, user_id))
+        if etag_matches(if_none_match, headers["ETag"]):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        # Keyset pagination on (user_id, sort_field, _id); one extra row tells us whether there is a next page
+        product_docs = await db.products.find(
+            query,
+            build_projection(requested_fields, sort_field)
+        ).sort([(sort_field, direction), ("_id", direction)]).limit(limit + 1).to_list(length=limit + 1)
+
+        if len(product_docs) > limit:
+            product_docs = product_docs[:limit]
+            headers["X-Next-Cursor"] = encode_cursor(product_docs[-1], sort_field)
+        if count:
+            headers["X-Total-Count"] = str(await product_counts.get(db, user_id))
+
+        # Stored documents are trusted: dump them without validation and let orjson encode them
+        include = None if requested_fields is None else {"id", *requested_fields}
+        return ORJSONResponse(
+            content=[Product.dump_db(doc, include) for doc in product_docs],
+            headers=headers
+        )
+
+    except InvalidQueryError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except bson_errors.InvalidId as e:
         logger.error(f"Invalid ID error: {str(e)}")
         raise HTTPException(
@@ -81,21 +223,34 @@ async def get_products(
 @router.get("/products/{product_id}", response_model=Product)
 async def get_product(
     product_id: str,
+    if_none_match: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
-    db = Depends(get_database)
+    db = Depends(get_read_database)
 ):
     """Get a specific product by ID"""
     try:
-        product = await db.products.find_one({
+        query = {
             "_id": ObjectId(product_id),
             "user_id": ObjectId(current_user.id)
-        })
+        }
+        if if_none_match:
+            # Revalidation only needs the version; skip loading and serialising the document
+            current = await db.products.find_one(query, {"version": 1})
+            if current and etag_matches(if_none_match, product_etag(current.get("version"))):
+                return not_modified(product_etag(current.get("version")))
+
+        product = await db.products.find_one(query)
         if not product:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Product not found"
             )
-        return Product.from_dict(product)
+        return ORJSONResponse(
+            content=Product.dump_db(product),
+            headers={"ETag": product_etag(product.get("version")), "Cache-Control": PRODUCT_CACHE_CONTROL}
+        )
+    except HTTPException:
+        raise
     except bson_errors.InvalidId:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -108,52 +263,124 @@ async def get_product(
             detail="Error fetching product"
         )
 
-@router.put("/products/{product_id}", response_model=Product)
-async def update_product(
-    product_id: str,
-    product: Product,
-    current_user: User = Depends(get_current_user),
-    db = Depends(get_database)
-):
-    """Update a product"""
+# Fields a client update may never overwrite
+PROTECTED_FIELDS = {"id", "user_id", "created_at", "updated_at", "version", "image_variants"}
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """Read the expected version from an If-Match header such as "3" (None means unconditional)"""
+    if if_match is None or if_match.strip() == "*":
+        return None
     try:
-        
+        return int(if_match.strip().removeprefix("W/").strip('"'))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="If-Match must be a product version ETag"
+        )
 
-        # Check if product exists and belongs to user
-        existing_product = await db.products.find_one({
-            "_id": ObjectId(product_id),
-            "user_id": ObjectId(current_user.id)
-        })
-        if not existing_product:
+async def apply_product_update(db, image_service: ImageService, product_id: str, user_id: str, changes: dict, expected_version: Optional[int]) -> Product:
+    """
+    Ownership check, diff and write of a product update
+
+    Only the fields whose values differ from the stored document are $set;
+    when nothing differs the product is returned as is and its version is
+    unchanged. With an expected version the write only applies if nobody
+    else updated the product first (412 otherwise). A new image_url takes a
+    reference on the image and the replaced one is released.
+    """
+    query = {"_id": ObjectId(product_id), "user_id": ObjectId(user_id)}
+    while True:
+        current = await db.products.find_one(query)
+        if current is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Product not found"
             )
-        
-        product.id = product_id
-        product.user_id = current_user.id
-        product.updated_at = datetime.utcnow()
-
-        logger.info(f"Updating product: {product.to_dict()}")
-        
-        await db.products.update_one(
-            {"_id": ObjectId(product_id)},
-            {"$set": product.to_dict()}
-        )
+        if expected_version is not None and (current.get("version") or 0) != expected_version:
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="Product was modified by another request"
+            )
 
-        logger.info(f"Product updated successfully: {product.to_dict()}")
+        changed = {field: value for field, value in changes.items() if field not in current or current[field] != value}
+        if not changed:
+            return Product.from_dict(current)
 
-        # Fetch the updated product
-        updated_product = await db.products.find_one({"_id": product_id})
+        try:
+            # The diff is only valid against the version it was taken from
+            updated_product = await write_product_fields(db, image_service, current, changed)
+        except MissingImageError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        if updated_product is not None:
+            return Product.from_dict(updated_product)
+        if expected_version is not None:
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="Product was modified by another request"
+            )
+        # An unconditional update lost the race; diff against the newer document
 
-        # Convert ObjectId fields to strings
-        updated_product = convert_objectid_to_str(updated_product)
+@router.put("/products/{product_id}", response_model=Product)
+async def update_product(
+    product_id: str,
+    product: Product,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_database),
+    image_service: ImageService = Depends()
+):
+    """Update a product"""
+    try:
+        # Write the fields the client sent; identity and timestamps are server-owned
+        changes = product.model_dump(exclude_unset=True, exclude=PROTECTED_FIELDS)
+        updated_product = await apply_product_update(
+            db, image_service, product_id, current_user.id, changes, parse_if_match(if_match)
+        )
+        response.headers["ETag"] = product_etag(updated_product.version)
+        return updated_product
+    except HTTPException:
+        raise
+    except bson_errors.InvalidId:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid product ID"
+        )
+    except Exception as e:
+        logger.error(f"Error updating product: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error updating product"
+        )
 
-        logger.info(f"Product updated: {updated_product}")
-        return {
-            "message": "Product updated successfully.",
-            "product": updated_product
-        }
+@router.patch("/products/{product_id}", response_model=Product)
+async def patch_product(
+    product_id: str,
+    product: ProductUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_database),
+    image_service: ImageService = Depends()
+):
+    """Partially update a product"""
+    changes = product.model_dump(exclude_unset=True, exclude_none=True)
+    if not changes:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No fields to update"
+        )
+    try:
+        updated_product = await apply_product_update(
+            db, image_service, product_id, current_user.id, changes, parse_if_match(if_match)
+        )
+        response.headers["ETag"] = product_etag(updated_product.version)
+        return updated_product
+    except HTTPException:
+        raise
     except bson_errors.InvalidId:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -170,20 +397,26 @@ async def update_product(
 async def delete_product(
     product_id: str,
     current_user: User = Depends(get_current_user),
-    db = Depends(get_database)
+    db = Depends(get_database),
+    image_service: ImageService = Depends()
 ):
     """Delete a product"""
     try:
-        result = await db.products.delete_one({
-            "_id": ObjectId(product_id),
-            "user_id": ObjectId(current_user.id)
-        })
-        if result.deleted_count == 0:
+        deleted = await db.products.find_one_and_delete(
+            {"_id": ObjectId(product_id), "user_id": ObjectId(current_user.id)},
+            projection={"image_url": 1, "image_variants": 1}
+        )
+        if deleted is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Product not found"
             )
+        product_counts.invalidate(ObjectId(current_user.id))
+        if deleted.get("image_url"):
+            await image_service.release_image(db, deleted["image_url"], variant_urls(deleted))
         return {"message": "Product deleted successfully"}
+    except HTTPException:
+        raise
     except bson_errors.InvalidId:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -196,6 +429,30 @@ async def delete_product(
             detail="Error deleting product"
         )
 
+async def find_own_product(db, product_id: str, user_id: str) -> dict:
+    product = await db.products.find_one(
+        {"_id": ObjectId(product_id), "user_id": ObjectId(user_id)},
+        {"image_url": 1, "image_variants": 1, "version": 1}
+    )
+    if not product:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found"
+        )
+    return product
+
+async def attach_image(db, image_service: ImageService, product: dict, image_url: str):
+    """Point a product at a newly uploaded image, whose reference the upload already took"""
+    while await write_product_fields(db, image_service, product, {"image_url": image_url}, image_acquired=True) is None:
+        # Another write landed in between; the image it replaced is the one to release
+        product = await db.products.find_one({"_id": product["_id"]}, {"image_url": 1, "image_variants": 1, "version": 1})
+        if product is None:
+            await image_service.release_image(db, image_url)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Product not found"
+            )
+
 @router.post("/products/{product_id}/image")
 async def upload_product_image(
     product_id: str,
@@ -206,43 +463,139 @@ async def upload_product_image(
 ):
     try:
         # Check if product exists and belongs to user
-        product = await db.products.find_one({
-            "_id": ObjectId(product_id),
-            "user_id": ObjectId(current_user.id)
-        })
-        if not product:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Product not found"
-            )
-
-        # Delete old image if exists
-        if product.get("image_url"):
-            await image_service.delete_image(product["image_url"])
+        product = await find_own_product(db, product_id, current_user.id)
 
-        # Upload new image
-        image_url = await image_service.upload_image(file, str(current_user.id))
+        # Upload new image first so a rejected upload keeps the old one
+        image_url = await image_service.upload_image(file, db)
         if not image_url:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Error uploading image"
             )
 
-        # Update product with new image URL
-        await db.products.update_one(
-            {"_id": ObjectId(product_id)},
-            {"$set": {"image_url": image_url}}
-        )
-
+        await attach_image(db, image_service, product, image_url)
         return {"image_url": image_url}
+    except ImageTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
     except bson_errors.InvalidId:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid product ID"
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error uploading product image: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error uploading product image"
-        ) 
\ No newline at end of file
+        )
+
+@router.post("/products/{product_id}/image/upload-url")
+async def create_image_upload_url(
+    product_id: str,
+    upload: ImageUploadRequest,
+    current_user: User = Depends(get_current_user),
+    db: Database = Depends(get_database),
+    image_service: ImageService = Depends()
+):
+    """
+    Step one of a direct upload: the client PUTs the image to `upload_url`
+    (presigned S3 in production) and then calls /image/complete
+    """
+    try:
+        await find_own_product(db, product_id, current_user.id)
+        return await image_service.create_direct_upload(
+            db, str(current_user.id), product_id, upload.filename, upload.content_type, upload.size, upload.sha256
+        )
+    except ImageTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except DirectUploadError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except bson_errors.InvalidId:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid product ID"
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error creating image upload URL: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error creating image upload URL"
+        )
+
+@router.post("/products/{product_id}/image/complete")
+async def complete_image_upload(
+    product_id: str,
+    upload: ImageUploadComplete,
+    current_user: User = Depends(get_current_user),
+    db: Database = Depends(get_database),
+    image_service: ImageService = Depends()
+):
+    """Step two of a direct upload: verify the uploaded object and attach it to the product"""
+    try:
+        claims = image_service.read_direct_upload(upload.upload_id, str(current_user.id), product_id)
+        product = await find_own_product(db, product_id, current_user.id)
+        image_url = await image_service.complete_direct_upload(db, claims)
+        await attach_image(db, image_service, product, image_url)
+        return {"image_url": image_url}
+    except DirectUploadError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except bson_errors.InvalidId:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid product ID"
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error completing image upload: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error completing image upload"
+        )
+
+@router.put("/uploads/direct/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def receive_direct_upload(
+    upload_id: str,
+    request: Request,
+    image_service: ImageService = Depends()
+):
+    """
+    Development stand-in for the presigned S3 URL. Like S3, the signed
+    upload_id is the only credential, so clients can PUT without auth headers.
+    """
+    if image_service.is_production:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not found"
+        )
+    try:
+        claims = image_service.read_direct_upload(upload_id)
+        await image_service.receive_direct_upload(claims, request.stream())
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    except DirectUploadError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Error receiving direct upload: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error receiving upload"
+        )
@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime
+
+import httpx
+from fastapi import Depends, FastAPI
+from motor.motor_asyncio import AsyncIOMotorClient
+
+# Allow importing the backend packages when run from the scripts directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from config import config
+from dependencies.database import get_database
+from models.user import User
+import utils.auth as auth
+from utils.auth import create_tokens, get_current_user, user_cache
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Latency of an authenticated no-op route with and without the user cache")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests timed per mode")
+    parser.add_argument("--products", type=int, default=5000, help="Size of the test user's products array")
+    parser.add_argument("--mongomock", action="store_true", help="Use an in-memory mongomock database instead of MONGODB_URL")
+    return parser.parse_args()
+
+def build_app(db):
+    app = FastAPI()
+    app.dependency_overrides[get_database] = lambda: db
+
+    @app.get("/noop")
+    async def noop(current_user: User = Depends(get_current_user)):
+        return {"id": str(current_user.id)}
+
+    return app
+
+async def time_requests(client, token, requests):
+    headers = {"Authorization": f"Bearer {token}"}
+    await client.get("/noop", headers=headers)
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = await client.get("/noop", headers=headers)
+        latencies.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+    percentiles = statistics.quantiles(latencies, n=100)
+    return percentiles[49], percentiles[98]
+
+async def run(args):
+    if args.mongomock:
+        from mongomock_motor import AsyncMongoMockClient
+        client = AsyncMongoMockClient()
+    else:
+        client = AsyncIOMotorClient(config['MONGODB_URL'])
+    db = client[config['MONGODB_DB_NAME']]
+
+    now = datetime.utcnow()
+    result = await db.users.insert_one({
+        "email": f"benchmark-{uuid.uuid4().hex}@example.com",
+        "hashed_password": "x" * 60,
+        "full_name": "Auth Benchmark",
+        "is_active": True,
+        "is_superuser": False,
+        "created_at": now,
+        "updated_at": now,
+        "products": [str(uuid.uuid4()) for _ in range(args.products)]
+    })
+    token, _ = create_tokens(data={"sub": str(result.inserted_id)})
+
+    try:
+        transport = httpx.ASGITransport(app=build_app(db))
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as http:
+            ttl_seconds, projection = user_cache.ttl_seconds, auth.CURRENT_USER_PROJECTION
+            user_cache.ttl_seconds = 0
+            # Previous behaviour: the whole user document on every request
+            auth.CURRENT_USER_PROJECTION = None
+            results = {"full document": await time_requests(http, token, args.requests)}
+            auth.CURRENT_USER_PROJECTION = projection
+            results["projected"] = await time_requests(http, token, args.requests)
+            user_cache.ttl_seconds = ttl_seconds
+            results["cached"] = await time_requests(http, token, args.requests)
+    finally:
+        await db.users.delete_one({"_id": result.inserted_id})
+        client.close()
+
+    print(f"{args.requests} requests per mode, user with {args.products} products")
+    print(f"{'mode':<15}{'p50 ms':>10}{'p99 ms':>10}")
+    for mode, (p50, p99) in results.items():
+        print(f"{mode:<15}{p50:>10.3f}{p99:>10.3f}")
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
@@ -0,0 +1,80 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+from PIL import Image, ImageDraw, ImageFilter
+
+# Allow importing the backend packages when run from the scripts directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from config import config
+from services.image_variants import ImageVariantPipeline
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Image variant throughput (images/second per core)")
+    parser.add_argument("--images", type=int, default=24, help="Source images per run")
+    parser.add_argument("--size", type=int, default=1024, help="Width and height of the generated PNG sources")
+    parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}", help="Comma-separated pool sizes to try")
+    parser.add_argument("--widths", default=",".join(str(width) for width in config['IMAGE_VARIANT_WIDTHS']))
+    parser.add_argument("--formats", default=",".join(config['IMAGE_VARIANT_FORMATS']))
+    return parser.parse_args()
+
+def make_source(path: str, size: int, seed: int):
+    """A PNG roughly as hard to compress as a generated product shot: shapes, gradients and noise"""
+    rng = random.Random(seed)
+    image = Image.linear_gradient("L").resize((size, size)).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = rng.randrange(size), rng.randrange(size)
+        radius = rng.randrange(size // 20, size // 4)
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=tuple(rng.randrange(256) for _ in range(3)))
+    image = image.filter(ImageFilter.GaussianBlur(2))
+    noise = Image.effect_noise((size, size), 24).convert("RGB")
+    Image.blend(image, noise, 0.15).save(path, "PNG")
+
+async def run_pool(pipeline: ImageVariantPipeline, sources):
+    # One warm-up image so process start-up is not counted
+    await pipeline.render(sources[0])
+    started = time.perf_counter()
+    results = await asyncio.gather(*(pipeline.render(source) for source in sources))
+    return time.perf_counter() - started, results
+
+async def run(args):
+    widths = [int(width) for width in args.widths.split(",")]
+    formats = [fmt.strip() for fmt in args.formats.split(",")]
+    cores = os.cpu_count() or 1
+
+    with tempfile.TemporaryDirectory() as directory:
+        sources = []
+        for index in range(args.images):
+            path = os.path.join(directory, f"source-{index}.png")
+            make_source(path, args.size, index)
+            sources.append(path)
+        original_bytes = sum(os.path.getsize(path) for path in sources) / len(sources)
+
+        print(f"{args.images} {args.size}px PNG sources (avg {original_bytes / 1024:.0f} KB), widths {widths}, formats {formats}, {cores} cores")
+        print(f"{'workers':<10}{'images/s':>10}{'per core':>10}")
+        results = []
+        for workers in sorted({int(value) for value in args.workers.split(",")}):
+            pipeline = ImageVariantPipeline(widths, formats, config['IMAGE_VARIANT_QUALITY'], workers)
+            try:
+                elapsed, results = await run_pool(pipeline, sources)
+            finally:
+                pipeline.shutdown()
+            throughput = args.images / elapsed
+            print(f"{workers:<10}{throughput:>10.2f}{throughput / min(workers, cores):>10.2f}")
+
+    print(f"{'variant':<14}{'avg KB':>10}")
+    sizes = {}
+    for rendered in results:
+        for width, fmt, data in rendered:
+            sizes.setdefault((width, fmt), []).append(len(data))
+    for (width, fmt), values in sorted(sizes.items()):
+        print(f"{f'{width} {fmt}':<14}{sum(values) / len(values) / 1024:>10.1f}")
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
@@ -0,0 +1,63 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from passlib.context import CryptContext
+
+# Allow importing the backend packages when run from the scripts directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from config import config
+from services.password_hasher import PasswordHasher
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Login throughput and event loop stalls for bcrypt verification")
+    parser.add_argument("--logins", type=int, default=32, help="Concurrent logins per run")
+    parser.add_argument("--rounds", type=int, default=config['AUTH_BCRYPT_ROUNDS'], help="bcrypt cost")
+    parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}", help="Comma-separated pool sizes to try")
+    return parser.parse_args()
+
+async def heartbeat(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Longest time the event loop was unable to run a 10 ms timer"""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+async def run_burst(verify, logins: int):
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(heartbeat(stop))
+    await asyncio.sleep(0)
+    started = time.perf_counter()
+    await asyncio.gather(*(verify() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    return elapsed, await monitor
+
+async def run(args):
+    context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=args.rounds)
+    hashed = context.hash("correct horse battery staple")
+
+    async def inline():
+        # Previous behaviour: verify directly inside the route handler
+        return context.verify("correct horse battery staple", hashed)
+
+    runs = [("inline", 1, inline)]
+    for workers in sorted({int(value) for value in args.workers.split(",")}):
+        hasher = PasswordHasher(context, workers, max_queue=args.logins)
+        runs.append((f"pool x{workers}", workers, lambda hasher=hasher: hasher.verify_and_update("correct horse battery staple", hashed)))
+
+    cores = os.cpu_count() or 1
+    print(f"bcrypt cost {args.rounds}, {args.logins} concurrent logins, {cores} cores")
+    print(f"{'mode':<10}{'logins/s':>10}{'per core':>10}{'max loop stall ms':>20}")
+    for name, workers, verify in runs:
+        elapsed, stall = await run_burst(verify, args.logins)
+        throughput = args.logins / elapsed
+        print(f"{name:<10}{throughput:>10.2f}{throughput / min(workers, cores):>10.2f}{stall * 1000:>20.1f}")
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
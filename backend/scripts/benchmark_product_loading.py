@@ -0,0 +1,79 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Allow importing the backend packages when run from the scripts directory
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND_DIR)
+
+MODES = ("eager", "stream", "mmap")
+
+# Runs in a fresh interpreter per mode so resident memory is not shared between runs
+MEASURE = """
+import json, resource, time
+started = time.perf_counter()
+from services.product_service import ProductService
+service = ProductService()
+elapsed = time.perf_counter() - started
+memory = {"peak_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, "RssAnon": 0, "RssFile": 0}
+# Private heap vs shared file-backed pages (the mmap'd catalogue shows up as RssFile)
+with open("/proc/self/status") as status:
+    for line in status:
+        name = line.split(":")[0]
+        if name in memory:
+            memory[name] = int(line.split()[1])
+print(json.dumps({"products": len(service.products), "seconds": elapsed, **memory}))
+"""
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare ProductService load time and resident memory per loading mode")
+    parser.add_argument("--count", type=int, default=100000, help="Number of synthetic products to generate")
+    parser.add_argument("--source", default=os.path.join(BACKEND_DIR, "data", "products.json"),
+                        help="Products used as templates for the synthetic catalogue")
+    return parser.parse_args()
+
+def write_catalogue(path, source, count):
+    with open(source, "r") as file:
+        templates = json.load(file)
+    with open(path, "w") as file:
+        file.write("[")
+        for index in range(count):
+            product = dict(templates[index % len(templates)])
+            product["id"] = f"prod{index + 1:06d}"
+            product["name"] = f"{product['name']} #{index + 1}"
+            product["price"] = round(product.get("price", 0) + index % 100, 2)
+            file.write(("," if index else "") + json.dumps(product))
+        file.write("]")
+
+def measure(mode, data_path):
+    env = dict(os.environ, DATA_PATH=data_path, PRODUCT_LOAD_MODE=mode, PRODUCT_STORE_MODE="snapshot")
+    result = subprocess.run(
+        [sys.executable, "-c", MEASURE],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        data_path = os.path.join(directory, "products.json")
+        write_catalogue(data_path, args.source, args.count)
+        size_mb = os.path.getsize(data_path) / 1_000_000
+        print(f"{args.count} products, {size_mb:.1f} MB JSON")
+
+        scale = 100000 / args.count
+
+        # Build the JSONL sidecar first so the mmap row measures loading, not conversion
+        measure("mmap", data_path)
+        print("Per 100k products; private = heap unique to each worker, shared = page cache")
+        print(f"{'mode':<8}{'load s':>10}{'peak MB':>10}{'private MB':>12}{'shared MB':>11}")
+        for mode in MODES:
+            result = measure(mode, data_path)
+            print(f"{mode:<8}{result['seconds'] * scale:>10.2f}{result['peak_kb'] / 1024 * scale:>10.1f}"
+                  f"{result['RssAnon'] / 1024 * scale:>12.1f}{result['RssFile'] / 1024 * scale:>11.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+# Allow importing the backend packages when run from the scripts directory
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND_DIR)
+
+from models.product import Product
+from utils.prompts import FIELD_TEMPLATES, get_prompt_for_field, get_prompt_for_product_description
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Prompt renders per second, before and after template compilation")
+    parser.add_argument("--renders", type=int, default=100000, help="Renders timed per run")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per mode; the best is reported")
+    parser.add_argument("--source", default=os.path.join(BACKEND_DIR, "data", "products.json"))
+    return parser.parse_args()
+
+def legacy_product_info(prompt, product):
+    # Previous add_product_info_to_prompt: one += per present field
+    if product.name:
+        prompt += f"\nProduct Name: {product.name}"
+    if product.brand:
+        prompt += f"\nBrand: {product.brand}"
+    if product.price:
+        prompt += f"\nPrice: ${product.price}"
+    if product.category:
+        prompt += f"\nCategory: {product.category}"
+    if product.basic_description:
+        prompt += f"\nBasic Description: {product.basic_description}"
+    if product.features:
+        prompt += f"\nFeatures: {', '.join(product.features)}"
+    if product.materials:
+        prompt += f"\nMaterials: {', '.join(product.materials)}"
+    if product.colors:
+        prompt += f"\nColors: {', '.join(product.colors)}"
+    if product.tags:
+        prompt += f"\nTags: {', '.join(product.tags)}"
+    return prompt
+
+# The previous get_prompt_for_field built one f-string per field; each is its text around {base_info}
+LEGACY_FIELD_PIECES = {field: template.source.split("{base_info}") for field, template in FIELD_TEMPLATES.items()}
+
+def legacy_field_prompt(product, field):
+    base_info = legacy_product_info("", product)
+    prompts = {name: f"{before}{base_info}{after}" for name, (before, after) in LEGACY_FIELD_PIECES.items()}
+    return prompts[field]
+
+def legacy_description_prompt(product, style):
+    # Previous get_prompt_for_product_description: one += per line
+    prompt = "Create a compelling product description for the following e-commerce product:\n\n"
+    if product.category:
+        prompt += f"CATEGORY: {product.category}\n"
+    if product.features and len(product.features) > 0:
+        prompt += "\nKEY FEATURES:\n"
+        for feature in product.features:
+            prompt += f"• {feature}\n"
+    if product.materials and len(product.materials) > 0:
+        prompt += "\nMATERIALS:\n"
+        for material in product.materials:
+            prompt += f"• {material}\n"
+    if product.colors and len(product.colors) > 0:
+        prompt += f"\nAVAILABLE COLORS: {', '.join(product.colors)}\n"
+    if product.basic_description:
+        prompt += f"\nBASIC PRODUCT INFO: {product.basic_description}\n"
+    if product.tags and len(product.tags) > 0:
+        prompt += f"\nTARGET KEYWORDS: {', '.join(product.tags)}\n"
+    prompt += "\n--- WRITING INSTRUCTIONS ---\n"
+    prompt += f"TONE: {style.get('tone', 'professional')}\n"
+    if style.get('length') == 'short':
+        prompt += "LENGTH: Concise, approximately 75-100 words\n"
+    elif style.get('length') == 'long':
+        prompt += "LENGTH: Detailed, approximately 200-250 words\n"
+    else:
+        prompt += "LENGTH: Balanced, approximately 150-175 words\n"
+    prompt += f"TARGET AUDIENCE: {style.get('audience', 'general consumers')}\n"
+    prompt += "\nSTRUCTURE:\n"
+    prompt += "1. Start with an attention-grabbing opening that highlights a key benefit\n"
+    prompt += "2. Describe what the product is and its primary use cases\n"
+    prompt += "3. Highlight 3-4 key features and their benefits to the user\n"
+    prompt += "4. Include relevant details about quality, materials, or design\n"
+    prompt += "5. End with a concise call-to-action or value proposition\n"
+    prompt += "\nADDITIONAL GUIDELINES:\n"
+    prompt += "• Use active voice and present tense\n"
+    prompt += "• Focus on benefits, not just features\n"
+    prompt += "• Create vivid, sensory language where appropriate\n"
+    prompt += "• Avoid clichés and generic marketing language\n"
+    if style.get('keywords'):
+        prompt += f"\nPlease naturally incorporate these keywords: {', '.join(style['keywords'])}\n"
+    prompt += "\nProvide the product description as a cohesive, ready-to-use text without headings or bullet points unless they enhance readability. Don't include any disclaimers or explanations about the content."
+    return prompt
+
+def time_renders(render, jobs, renders: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for index in range(renders):
+            render(*jobs[index % len(jobs)])
+        best = min(best, time.perf_counter() - started)
+    return renders / best
+
+def run(args):
+    with open(args.source, "r") as file:
+        products = [Product(**product) for product in json.load(file)]
+    fields = list(FIELD_TEMPLATES)
+    field_jobs = [(product, field) for product in products for field in fields]
+    style = {"tone": "friendly", "length": "short", "audience": "runners", "keywords": ["lightweight", "breathable"]}
+    description_jobs = [(product, style) for product in products]
+
+    for product, field in field_jobs:
+        assert legacy_field_prompt(product, field) == get_prompt_for_field(product, field)
+    for product, _ in description_jobs:
+        assert legacy_description_prompt(product, style) == get_prompt_for_product_description(product, style)
+
+    print(f"{len(products)} products, {len(fields)} field prompts, best of {args.repeat} x {args.renders} renders per mode")
+    print(f"{'mode':<34}{'renders/s':>12}")
+    modes = [
+        ("field: all f-strings (before)", legacy_field_prompt, field_jobs),
+        ("field: compiled", get_prompt_for_field, field_jobs),
+        ("description: += (before)", legacy_description_prompt, description_jobs),
+        ("description: compiled", get_prompt_for_product_description, description_jobs),
+    ]
+    for name, render, jobs in modes:
+        print(f"{name:<34}{time_renders(render, jobs, args.renders, args.repeat):>12,.0f}")
+
+if __name__ == "__main__":
+    run(parse_args())
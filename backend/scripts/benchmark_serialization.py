@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.testclient import TestClient
+
+# Allow importing the backend packages when run from the scripts directory
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND_DIR)
+
+from models.product import Product
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare product list serialization paths")
+    parser.add_argument("--count", type=int, default=1000, help="Products per response (one full list page)")
+    parser.add_argument("--requests", type=int, default=50, help="Requests timed per path")
+    parser.add_argument("--source", default=os.path.join(BACKEND_DIR, "data", "products.json"),
+                        help="Products used as templates for the synthetic documents")
+    return parser.parse_args()
+
+def build_documents(source, count):
+    """Documents shaped like the products collection, with generated content filled in"""
+    with open(source, "r") as file:
+        templates = json.load(file)
+    user_id = ObjectId()
+    created = datetime(2024, 1, 1)
+    documents = []
+    for index in range(count):
+        document = dict(templates[index % len(templates)])
+        document.pop("id", None)
+        document.update({
+            "_id": ObjectId(),
+            "user_id": user_id,
+            "detailed_description": "Generated description. " * 40,
+            "seo_title": f"{document['name']} | Shop now",
+            "created_at": created + timedelta(minutes=index),
+            "updated_at": created + timedelta(minutes=index),
+            "version": 1
+        })
+        documents.append(document)
+    return documents
+
+def build_app(documents):
+    app = FastAPI()
+
+    @app.get("/validated", response_model=List[Product], response_class=JSONResponse)
+    async def validated():
+        # Previous path: validate each document, then FastAPI re-validates and jsonable_encodes it
+        return [Product.from_dict(dict(document)) for document in documents]
+
+    @app.get("/trusted")
+    async def trusted():
+        # Current path: dump stored documents without validation and encode with orjson
+        return ORJSONResponse(content=[Product.dump_db(document) for document in documents])
+
+    return app
+
+def time_path(client, path, requests):
+    client.get(path)
+    started = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path)
+    elapsed = (time.perf_counter() - started) / requests
+    return elapsed, len(response.content), response.json()
+
+def main():
+    args = parse_args()
+    documents = build_documents(args.source, args.count)
+    client = TestClient(build_app(documents))
+
+    results = {path: time_path(client, f"/{path}", args.requests) for path in ("validated", "trusted")}
+    validated_body = results["validated"][2]
+    trusted_body = results["trusted"][2]
+    assert [product["id"] for product in validated_body] == [product["id"] for product in trusted_body]
+
+    print(f"{args.count} products per response, {args.requests} requests per path")
+    print(f"{'path':<11}{'ms/request':>12}{'KB':>10}")
+    for path, (elapsed, size, _) in results.items():
+        print(f"{path:<11}{elapsed * 1000:>12.2f}{size / 1024:>10.1f}")
+    print(f"speedup: {results['validated'][0] / results['trusted'][0]:.1f}x")
+
+if __name__ == "__main__":
+    main()
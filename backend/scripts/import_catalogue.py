@@ -0,0 +1,64 @@
+import argparse
+import asyncio
+import os
+import sys
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+
+# Allow importing the backend packages when run from the scripts directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from config import config
+from services.catalogue_import import CatalogueImport
+
+# Load environment variables
+load_dotenv()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Bulk import products from a JSONL or CSV file")
+    parser.add_argument("input", help="Path to a .jsonl or .csv file of ProductCreate rows")
+    parser.add_argument("--email", required=True, help="Email of the user who will own the products")
+    parser.add_argument("--results", help="Path of the results JSONL (default: <input>.results.jsonl)")
+    parser.add_argument("--checkpoint", help="Path of the checkpoint file (default: <results>.checkpoint)")
+    parser.add_argument("--no-generate", action="store_true", help="Only insert the products, skip generation")
+    parser.add_argument("--batch-size", type=int, default=config['IMPORT_BATCH_SIZE'])
+    parser.add_argument("--concurrency", type=int, default=config['IMPORT_CONCURRENCY'])
+    parser.add_argument("--tokens-per-minute", type=int, default=config['IMPORT_TOKENS_PER_MINUTE'])
+    return parser.parse_args()
+
+async def import_catalogue(args):
+    # Connect to MongoDB
+    client = AsyncIOMotorClient(config['MONGODB_URL'])
+    db = client[config['MONGODB_DB_NAME']]
+
+    user = await db.users.find_one({"email": args.email}, {"_id": 1})
+    if not user:
+        print(f"No user found with email {args.email}.")
+        client.close()
+        return
+
+    async def on_progress(progress):
+        print(f"Rows up to {progress['last_row']} done: {progress}")
+
+    catalogue_import = CatalogueImport(
+        db,
+        user["_id"],
+        args.input,
+        args.results or f"{args.input}.results.jsonl",
+        checkpoint_path=args.checkpoint,
+        generate=not args.no_generate,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        tokens_per_minute=args.tokens_per_minute,
+        on_progress=on_progress
+    )
+    counts = await catalogue_import.run()
+    print(f"Import complete: {counts}")
+    print(f"Results written to {catalogue_import.results_path}")
+
+    # Close the connection
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(import_catalogue(parse_args()))
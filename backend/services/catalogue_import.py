@@ -0,0 +1,279 @@
+import asyncio
+import csv
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from bson import ObjectId
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+from config import config
+from models.product import Product, ProductCreate, versioned_update
+from services.openai_service import OpenAIService
+from services.prompt_budget import missing_fields_completion_tokens
+from utils.prompts import get_prompt_for_missing_fields
+
+logger = logging.getLogger(__name__)
+
+LIST_COLUMNS = {"features", "materials", "colors", "tags"}
+CSV_LIST_SEPARATOR = "|"
+DUPLICATE_KEY_ERROR = 11000
+
+
+def iter_rows(path: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Stream `(row_number, row)` pairs from a JSONL or CSV file, one line at a time
+
+    Lines that are not valid JSON are yielded as the decoding error so the
+    caller can report them without aborting the run.
+    """
+    is_csv = path.lower().endswith(".csv")
+    with open(path, "r", newline="" if is_csv else None, encoding="utf-8") as file:
+        if is_csv:
+            for row_number, row in enumerate(csv.DictReader(file), start=1):
+                for column in LIST_COLUMNS:
+                    if row.get(column):
+                        row[column] = [item.strip() for item in row[column].split(CSV_LIST_SEPARATOR) if item.strip()]
+                    elif column in row:
+                        row[column] = []
+                yield row_number, {key: value for key, value in row.items() if value != ""}
+        else:
+            for row_number, line in enumerate(file, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield row_number, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield row_number, e
+
+
+def import_object_id(run_id: str, row_number: int) -> ObjectId:
+    """Deterministic _id so re-inserting a row after a crash is a no-op"""
+    return ObjectId(hashlib.sha256(f"{run_id}:{row_number}".encode()).digest()[:12])
+
+
+class TokenBudget:
+    """
+    Sliding one-minute window of estimated tokens spent on generation
+    """
+
+    def __init__(self, tokens_per_minute: int):
+        self.tokens_per_minute = tokens_per_minute
+        self._spent = deque()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int):
+        if not self.tokens_per_minute:
+            return
+        tokens = min(tokens, self.tokens_per_minute)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                while self._spent and self._spent[0][0] <= now - 60:
+                    self._spent.popleft()
+                used = sum(spent for _, spent in self._spent)
+                if used + tokens <= self.tokens_per_minute:
+                    self._spent.append((now, tokens))
+                    return
+                await asyncio.sleep(self._spent[0][0] + 60 - now)
+
+
+def checkpoint_path_for(results_path: str) -> str:
+    return f"{results_path}.checkpoint"
+
+
+class CatalogueImport:
+    """
+    Streaming bulk import of `ProductCreate` rows with optional generation
+
+    Rows are read in batches of `batch_size`, inserted with one
+    `insert_many`, then generated with at most `concurrency` products in
+    flight. After each batch the checkpoint records the last row done and
+    the size of the results file, so a crashed run drops results written
+    after the checkpoint and resumes from the next batch. Memory use is
+    bounded by the batch size, not the file size.
+
+    The run shares its event loop with the API, so reading rows and writing
+    results and checkpoints (with their fsyncs) happen in worker threads.
+    """
+
+    def __init__(
+        self,
+        db,
+        user_id: ObjectId,
+        input_path: str,
+        results_path: str,
+        checkpoint_path: Optional[str] = None,
+        run_id: Optional[str] = None,
+        generate: bool = True,
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        openai_service: Optional[OpenAIService] = None,
+        on_progress: Optional[Callable[[dict], Awaitable[None]]] = None
+    ):
+        self.db = db
+        self.user_id = user_id
+        self.input_path = input_path
+        self.results_path = results_path
+        self.checkpoint_path = checkpoint_path or checkpoint_path_for(results_path)
+        self.run_id = run_id or os.path.basename(input_path)
+        self.generate = generate
+        self.batch_size = batch_size or config['IMPORT_BATCH_SIZE']
+        self.concurrency = concurrency or config['IMPORT_CONCURRENCY']
+        self.budget = TokenBudget(tokens_per_minute if tokens_per_minute is not None else config['IMPORT_TOKENS_PER_MINUTE'])
+        self.openai_service = openai_service or OpenAIService()
+        self.on_progress = on_progress
+        self.counts = {"inserted": 0, "generated": 0, "invalid": 0, "failed": 0}
+
+    def _load_checkpoint(self) -> dict:
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, "r") as file:
+                checkpoint = json.load(file)
+            if checkpoint.get("run_id") == self.run_id:
+                return checkpoint
+        return {"run_id": self.run_id, "last_row": 0, "results_size": 0, "counts": dict(self.counts)}
+
+    def _save_checkpoint(self, last_row: int, results_size: int):
+        temp_path = f"{self.checkpoint_path}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump({
+                "run_id": self.run_id,
+                "last_row": last_row,
+                "results_size": results_size,
+                "counts": self.counts
+            }, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.checkpoint_path)
+
+    async def run(self) -> dict:
+        checkpoint = await asyncio.to_thread(self._load_checkpoint)
+        start_after = checkpoint["last_row"]
+        self.counts = checkpoint.get("counts", self.counts)
+        if start_after:
+            logger.info(f"Resuming catalogue import {self.run_id} after row {start_after}")
+        await asyncio.to_thread(self._discard_uncheckpointed_results, checkpoint.get("results_size"))
+
+        rows = iter_rows(self.input_path)
+        results = await asyncio.to_thread(open, self.results_path, "a", encoding="utf-8")
+        try:
+            while True:
+                batch = await asyncio.to_thread(self._read_batch, rows, start_after)
+                if not batch:
+                    break
+                await self._process_batch(batch, results)
+        finally:
+            rows.close()
+            await asyncio.to_thread(results.close)
+
+        return dict(self.counts)
+
+    def _read_batch(self, rows: Iterator[Tuple[int, Any]], start_after: int) -> List[Tuple[int, Any]]:
+        batch = []
+        for row_number, row in rows:
+            if row_number <= start_after:
+                continue
+            batch.append((row_number, row))
+            if len(batch) >= self.batch_size:
+                break
+        return batch
+
+    def _discard_uncheckpointed_results(self, results_size: Optional[int]):
+        """Results of a batch that crashed before its checkpoint are written again on resume"""
+        # Checkpoints from before results_size was recorded cannot tell; keep everything
+        if results_size is None or not os.path.exists(self.results_path):
+            return
+        if os.path.getsize(self.results_path) > results_size:
+            logger.info(f"Discarding results written after the last checkpoint of {self.run_id}")
+            os.truncate(self.results_path, results_size)
+
+    async def _process_batch(self, batch: List[Tuple[int, dict]], results):
+        documents = []
+        outcomes = {}
+        now = datetime.utcnow()
+        for row_number, row in batch:
+            try:
+                if isinstance(row, Exception):
+                    raise row
+                product = ProductCreate(**row)
+            except (ValidationError, ValueError, TypeError) as e:
+                outcomes[row_number] = {"row": row_number, "status": "invalid", "error": str(e)}
+                continue
+            document = Product(user_id=str(self.user_id), **product.model_dump()).to_dict()
+            document["_id"] = import_object_id(self.run_id, row_number)
+            document["created_at"] = now
+            document["updated_at"] = now
+            documents.append((row_number, document))
+
+        if documents:
+            await self._insert(documents)
+
+        if self.generate:
+            window = asyncio.Semaphore(self.concurrency)
+
+            async def generate(row_number, document):
+                async with window:
+                    outcomes[row_number] = await self._generate(row_number, document)
+
+            await asyncio.gather(*(generate(row_number, document) for row_number, document in documents))
+        else:
+            for row_number, document in documents:
+                outcomes[row_number] = {"row": row_number, "product_id": str(document["_id"]), "status": "inserted"}
+
+        lines = []
+        for row_number, _ in batch:
+            outcome = outcomes[row_number]
+            if outcome["status"] != "inserted":
+                self.counts[outcome["status"]] += 1
+            lines.append(json.dumps(outcome) + "\n")
+
+        last_row = batch[-1][0]
+        await asyncio.to_thread(self._write_results, results, lines, last_row)
+        if self.on_progress:
+            await self.on_progress({"last_row": last_row, **self.counts})
+
+    def _write_results(self, results, lines: List[str], last_row: int):
+        results.writelines(lines)
+        results.flush()
+        # The checkpoint must never point past results that are not on disk
+        os.fsync(results.fileno())
+        self._save_checkpoint(last_row, results.tell())
+
+    async def _insert(self, documents: List[Tuple[int, dict]]):
+        try:
+            result = await self.db.products.insert_many([document for _, document in documents], ordered=False)
+            inserted = len(result.inserted_ids)
+        except BulkWriteError as e:
+            # Rows inserted before a crash keep their deterministic _id; skip them
+            other_errors = [error for error in e.details["writeErrors"] if error["code"] != DUPLICATE_KEY_ERROR]
+            if other_errors:
+                raise
+            # Their count was lost with the checkpoint that was never written, so count them now
+            inserted = e.details["nInserted"] + len(e.details["writeErrors"])
+        self.counts["inserted"] += inserted
+
+    async def _generate(self, row_number: int, document: dict) -> dict:
+        product_id = document["_id"]
+        try:
+            product = Product.from_dict(dict(document))
+            fields = self.openai_service.get_missing_fields(product)
+            prompt = get_prompt_for_missing_fields(product, fields)
+            # Prompt tokens plus the completion allowance the request will reserve
+            await self.budget.acquire(
+                self.openai_service.budget.count(prompt) + missing_fields_completion_tokens(fields)
+            )
+            generated = await self.openai_service.generate_all_missing_fields(product, fields)
+            if generated:
+                await self.db.products.update_one({"_id": product_id}, versioned_update(generated))
+            return {"row": row_number, "product_id": str(product_id), "status": "generated"}
+        except Exception as e:
+            logger.error(f"Error generating imported row {row_number}: {str(e)}")
+            return {"row": row_number, "product_id": str(product_id), "status": "failed", "error": str(e)}
@@ -0,0 +1,221 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(model: str, system_message: str, prompt: str, temperature: float, max_tokens: int, response_format: Optional[dict] = None) -> str:
+    """Content-addressed key for a chat completion request"""
+    parts = [model, system_message, prompt, temperature, max_tokens]
+    if response_format:
+        parts.append(response_format)
+    payload = json.dumps(
+        parts,
+        ensure_ascii=False,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryCacheTier:
+    """
+    In-process LRU tier with TTL and size-based eviction
+    """
+
+    name = "memory"
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = (value, time.time() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCacheTier:
+    """
+    On-disk tier shared by every worker process on the host
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: float):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS completions_accessed_at ON completions (accessed_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, expires_at FROM completions WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] < now:
+            conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE completions SET accessed_at = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def set(self, key: str, value: str):
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO completions (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, value, now + self.ttl_seconds, now)
+        )
+        conn.execute("DELETE FROM completions WHERE expires_at < ?", (now,))
+        conn.execute(
+            "DELETE FROM completions WHERE key IN ("
+            "SELECT key FROM completions ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def clear(self):
+        self._connection().execute("DELETE FROM completions")
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+
+
+class CompletionCache:
+    """
+    Multi-tier cache for chat completion responses
+
+    Tiers are checked in order; a hit in a slower tier is promoted into the
+    faster tiers above it.
+    """
+
+    def __init__(self, tiers: List, enabled: bool = True):
+        self.tiers = tiers
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.hits_by_tier = {tier.name: 0 for tier in tiers}
+
+    async def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        for index, tier in enumerate(self.tiers):
+            try:
+                value = await self._call(tier, tier.get, key)
+            except Exception as e:
+                logger.warning(f"Completion cache {tier.name} lookup failed: {str(e)}")
+                continue
+            if value is not None:
+                self.hits += 1
+                self.hits_by_tier[tier.name] += 1
+                for upper in self.tiers[:index]:
+                    try:
+                        await self._call(upper, upper.set, key, value)
+                    except Exception as e:
+                        logger.warning(f"Completion cache {upper.name} promotion failed: {str(e)}")
+                return value
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: str):
+        if not self.enabled:
+            return
+        for tier in self.tiers:
+            try:
+                await self._call(tier, tier.set, key, value)
+            except Exception as e:
+                logger.warning(f"Completion cache {tier.name} write failed: {str(e)}")
+
+    async def _call(self, tier, func, *args):
+        # Disk-backed tiers must not block the event loop
+        if isinstance(tier, MemoryCacheTier):
+            return func(*args)
+        return await asyncio.to_thread(func, *args)
+
+    def clear(self):
+        for tier in self.tiers:
+            tier.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "hits_by_tier": dict(self.hits_by_tier),
+            "memory_entries": len(self.tiers[0]) if self.tiers else 0,
+        }
+
+
+def _build_completion_cache() -> CompletionCache:
+    tiers = [
+        MemoryCacheTier(
+            max_entries=config['COMPLETION_CACHE_MAX_ENTRIES'],
+            ttl_seconds=config['COMPLETION_CACHE_TTL_SECONDS']
+        )
+    ]
+    if config['COMPLETION_CACHE_SQLITE_PATH']:
+        tiers.append(SQLiteCacheTier(
+            path=config['COMPLETION_CACHE_SQLITE_PATH'],
+            max_entries=config['COMPLETION_CACHE_SQLITE_MAX_ENTRIES'],
+            ttl_seconds=config['COMPLETION_CACHE_TTL_SECONDS']
+        ))
+    return CompletionCache(tiers, enabled=config['COMPLETION_CACHE_ENABLED'])
+
+
+# Shared by every OpenAIService instance in the process
+completion_cache = _build_completion_cache()
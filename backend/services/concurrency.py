@@ -0,0 +1,81 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from config import config
+
+
+class ConcurrencyLimiter:
+    """
+    Bound the number of in-flight generations globally and per user
+    """
+
+    def __init__(self, max_concurrency: int, max_concurrency_per_user: int):
+        self.max_concurrency = max_concurrency
+        self.max_concurrency_per_user = max_concurrency_per_user
+        self._global = asyncio.Semaphore(max_concurrency)
+        self._per_user = {}
+        self._per_user_refs = {}
+        self.active = 0
+        self.waiting = 0
+
+    @asynccontextmanager
+    async def slot(self, user_id: Optional[str] = None):
+        """Hold one global slot (and one slot for the user, if given) while generating"""
+        user_semaphore = self._acquire_user_semaphore(user_id) if user_id else None
+        self.waiting += 1
+        try:
+            if user_semaphore is not None:
+                await user_semaphore.acquire()
+            try:
+                await self._global.acquire()
+            except BaseException:
+                if user_semaphore is not None:
+                    user_semaphore.release()
+                raise
+        except BaseException:
+            self.waiting -= 1
+            self._release_user_semaphore(user_id)
+            raise
+        self.waiting -= 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._global.release()
+            if user_semaphore is not None:
+                user_semaphore.release()
+            self._release_user_semaphore(user_id)
+
+    def _acquire_user_semaphore(self, user_id: str) -> asyncio.Semaphore:
+        if user_id not in self._per_user:
+            self._per_user[user_id] = asyncio.Semaphore(self.max_concurrency_per_user)
+            self._per_user_refs[user_id] = 0
+        self._per_user_refs[user_id] += 1
+        return self._per_user[user_id]
+
+    def _release_user_semaphore(self, user_id: Optional[str]):
+        # Drop idle per-user semaphores so the map does not grow with every user seen
+        if not user_id or user_id not in self._per_user_refs:
+            return
+        self._per_user_refs[user_id] -= 1
+        if self._per_user_refs[user_id] <= 0:
+            del self._per_user_refs[user_id]
+            del self._per_user[user_id]
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_concurrency_per_user": self.max_concurrency_per_user,
+            "users": len(self._per_user),
+        }
+
+
+# Shared by every OpenAIService instance in the process
+generation_limiter = ConcurrencyLimiter(
+    max_concurrency=config['GENERATION_MAX_CONCURRENCY'],
+    max_concurrency_per_user=config['GENERATION_MAX_CONCURRENCY_PER_USER']
+)
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import os
+
+from config import config
+from models.product import Product
+from services.catalogue_import import CatalogueImport, checkpoint_path_for
+from services.image_service import ImageService
+from services.job_queue import JobContext, JobQueue
+from services.openai_service import OpenAIService
+from services.product_writes import save_generated_fields
+from utils.converter import convert_objectid_to_str
+
+logger = logging.getLogger(__name__)
+
+GENERATE_BASIC_DATA = "generate_basic_data"
+COMPLETE_PRODUCT = "complete_product"
+IMPORT_CATALOGUE = "import_catalogue"
+
+
+async def _load_product(context: JobContext) -> dict:
+    job = context.job
+    product = await context.db.products.find_one({"_id": job["product_id"], "user_id": job["user_id"]})
+    if not product:
+        raise ValueError("Product not found")
+    return product
+
+
+async def generate_basic_data_job(context: JobContext) -> dict:
+    """Generate SEO/basic fields, the detailed description and (optionally) the image"""
+    job = context.job
+    payload = job["payload"]
+    product = await _load_product(context)
+
+    async def on_progress(fields):
+        for field in fields:
+            await context.progress(f"field {field} done", field=field)
+
+    openai_service = OpenAIService()
+    return await openai_service.generate_basic_data(
+        product,
+        context.db,
+        job["product_id"],
+        payload.get("descriptionOptions", {}),
+        payload.get("imageOptions", {}),
+        use_cache=not payload.get("bypassCache", False),
+        on_progress=on_progress
+    )
+
+
+async def complete_product_job(context: JobContext) -> dict:
+    """
+    Generate every missing field with one structured call, falling back to
+    per-field calls for what it missed, and report each field as it is done
+    """
+    job = context.job
+    payload = job["payload"]
+    product = Product(**convert_objectid_to_str(await _load_product(context)))
+
+    async def on_progress(fields):
+        for field in fields:
+            await context.progress(f"field {field} done", field=field)
+
+    openai_service = OpenAIService()
+    generated, errors = await openai_service.complete_missing_fields(
+        product,
+        user_id=str(job["user_id"]),
+        use_cache=not payload.get("bypassCache", False),
+        on_progress=on_progress
+    )
+    for field, error in errors.items():
+        await context.progress(f"field {field} failed", field=field, error=error)
+
+    # Keep what succeeded; a retry only regenerates the fields that are still missing
+    if generated:
+        await save_generated_fields(context.db, ImageService(), job["product_id"], generated)
+    if errors:
+        raise ValueError(f"Error generating fields: {', '.join(errors)}")
+    return generated
+
+
+def import_results_path(job_id) -> str:
+    return os.path.join(config['IMPORT_DIR'], f"{job_id}.results.jsonl")
+
+
+async def import_catalogue_job(context: JobContext) -> dict:
+    """Bulk insert an uploaded catalogue file and generate its products"""
+    job = context.job
+    payload = job["payload"]
+
+    async def on_progress(progress: dict):
+        await context.progress(f"rows up to {progress['last_row']} done", **progress)
+
+    # Checkpoint is keyed on the job, so a retried job resumes where it stopped
+    catalogue_import = CatalogueImport(
+        context.db,
+        job["user_id"],
+        payload["input_path"],
+        import_results_path(job["_id"]),
+        run_id=str(job["_id"]),
+        generate=payload.get("generate", True),
+        on_progress=on_progress
+    )
+    counts = await catalogue_import.run()
+    return {**counts, "results_path": catalogue_import.results_path}
+
+
+async def cleanup_import_job(job: dict):
+    """Once an import is over only its results are kept; the uploaded catalogue and checkpoint go"""
+    for path in (job["payload"]["input_path"], checkpoint_path_for(import_results_path(job["_id"]))):
+        try:
+            await asyncio.to_thread(os.remove, path)
+        except FileNotFoundError:
+            pass
+
+
+def register_generation_jobs(queue: JobQueue):
+    queue.register(GENERATE_BASIC_DATA, generate_basic_data_job)
+    queue.register(COMPLETE_PRODUCT, complete_product_job)
+    queue.register(IMPORT_CATALOGUE, import_catalogue_job, on_finished=cleanup_import_job)
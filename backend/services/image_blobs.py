@@ -0,0 +1,112 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo import ReturnDocument
+
+# A delete that has not finished in this long is assumed to have crashed
+DELETE_TIMEOUT = timedelta(seconds=60)
+DELETE_POLL_SECONDS = 0.05
+
+
+class ImageBlobs:
+    """
+    Reference counts for content-addressed images, one document per stored blob
+
+    Uploads are stored under a hash of their bytes, so identical images
+    uploaded for many products share one file; a blob is only deleted when
+    the last product referencing it lets go. While its storage is deleted
+    the blob is marked `deleting`, and an upload that acquires it meanwhile
+    waits for the delete and then stores the bytes again.
+    """
+
+    def __init__(self, db):
+        self.collection = db.image_blobs
+
+    async def acquire(self, key: str, size: int, content_type: Optional[str]) -> bool:
+        """Add a reference; returns True if the blob is already stored and need not be written again"""
+        before = await self.collection.find_one_and_update(
+            {"_id": key},
+            {
+                "$inc": {"refs": 1},
+                "$setOnInsert": {
+                    "size": size,
+                    "content_type": content_type,
+                    "stored": False,
+                    "created_at": datetime.utcnow()
+                }
+            },
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+        if before and before.get("deleting"):
+            # Writing now could land before the delete does; our reference keeps the document alive
+            await self._wait_for_delete(key, before["deleting_at"])
+            return False
+        # A concurrent first upload may still be writing; writing identical bytes again is harmless
+        return bool(before and before.get("stored"))
+
+    async def _wait_for_delete(self, key: str, deleting_at: datetime):
+        while True:
+            blob = await self.collection.find_one({"_id": key}, {"deleting": 1, "deleting_at": 1})
+            if blob is None or not blob.get("deleting") or blob["deleting_at"] != deleting_at:
+                return
+            if datetime.utcnow() - deleting_at > DELETE_TIMEOUT:
+                await self.collection.update_one(
+                    {"_id": key, "deleting_at": deleting_at},
+                    {"$set": {"deleting": False}}
+                )
+                return
+            await asyncio.sleep(DELETE_POLL_SECONDS)
+
+    async def is_tracked(self, key: str) -> bool:
+        return await self.collection.find_one({"_id": key}, {"_id": 1}) is not None
+
+    async def is_stored(self, key: str) -> bool:
+        return await self.collection.find_one({"_id": key, "stored": True}, {"_id": 1}) is not None
+
+    async def acquire_if_stored(self, key: str) -> bool:
+        """Add a reference only if the blob is already stored; returns whether it was"""
+        after = await self.collection.find_one_and_update(
+            {"_id": key, "stored": True},
+            {"$inc": {"refs": 1}}
+        )
+        return after is not None
+
+    async def mark_stored(self, key: str):
+        await self.collection.update_one({"_id": key}, {"$set": {"stored": True}})
+
+    async def release(self, key: str) -> Optional[bool]:
+        """
+        Drop a reference. Returns True if that was the last one: the blob is
+        now marked `deleting` and the caller must delete its storage and then
+        call finish_delete. Returns False if other products still use it, and
+        None if the image is not tracked (e.g. uploaded before deduplication).
+        """
+        after = await self.collection.find_one_and_update(
+            {"_id": key},
+            {"$inc": {"refs": -1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if after is None:
+            return None
+        if after["refs"] > 0:
+            return False
+        # Only one caller wins the mark; an upload that re-acquires the blob before it keeps the storage
+        result = await self.collection.update_one(
+            {"_id": key, "refs": {"$lte": 0}, "deleting": {"$ne": True}},
+            {"$set": {"deleting": True, "deleting_at": datetime.utcnow(), "stored": False}}
+        )
+        return result.modified_count == 1
+
+    async def finish_delete(self, key: str):
+        """Forget a blob whose storage is gone, unless an upload acquired it during the delete"""
+        result = await self.collection.delete_one({"_id": key, "deleting": True, "refs": {"$lte": 0}})
+        if result.deleted_count == 0:
+            # The waiting upload stores the bytes again once this clears
+            await self.collection.update_one({"_id": key, "deleting": True}, {"$set": {"deleting": False}})
+
+    async def abandon(self, key: str):
+        """Drop the reference of an upload whose write failed; there is no storage of ours to delete"""
+        if await self.release(key):
+            await self.finish_delete(key)
@@ -1,79 +1,619 @@
 import os
+import asyncio
+import base64
+import hashlib
+import re
+import time
+import threading
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import UploadFile
+from jose import JWTError, jwt
 import uuid
-from typing import Optional
+from typing import AsyncIterator, Iterable, Optional, Tuple, Union
+from config import config
+from services.image_blobs import ImageBlobs
+from utils.auth import ALGORITHM, SECRET_KEY
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Local images live here and are served under /uploads/images (see main.py)
+LOCAL_IMAGE_DIR = "uploads/images"
+LOCAL_IMAGE_URL_MARKER = "/uploads/images/"
+# S3 keys: content-addressed images, and multipart uploads waiting for their hash
+S3_IMAGE_PREFIX = "images/"
+S3_UPLOAD_PREFIX = "uploads-in-progress/"
+
+DIRECT_UPLOAD_PURPOSE = "direct-image-upload"
+SHA256_HEX = re.compile(r"[0-9a-f]{64}")
+
+# Bounded pool for blocking S3 and filesystem calls, shared by every request
+_io_executor = ThreadPoolExecutor(
+    max_workers=config['IMAGE_IO_WORKERS'],
+    thread_name_prefix="image-io"
+)
+
+
+def incoming_temp_path() -> str:
+    """
+    Private path for a file while it is written; it is renamed into the
+    public image directory only once complete (same filesystem required)
+    """
+    os.makedirs(config['IMAGE_INCOMING_DIR'], exist_ok=True)
+    return os.path.join(config['IMAGE_INCOMING_DIR'], f"{uuid.uuid4()}.part")
+
+
+class ImageTooLargeError(ValueError):
+    """Raised when an upload exceeds the configured maximum size"""
+
+
+class DirectUploadError(ValueError):
+    """Raised for invalid direct upload requests and uploads that fail verification"""
+
+
+class UploadStats:
+    """Aggregate upload throughput for the metrics endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.uploads = 0
+        self.rejected = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.deduplicated = 0
+        self.deduplicated_bytes = 0
+
+    def record(self, size: int, seconds: float, deduplicated: bool = False):
+        with self._lock:
+            self.uploads += 1
+            self.bytes += size
+            self.seconds += seconds
+            if deduplicated:
+                self.deduplicated += 1
+                self.deduplicated_bytes += size
+
+    def record_rejected(self):
+        with self._lock:
+            self.rejected += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "uploads": self.uploads,
+                "rejected": self.rejected,
+                "bytes": self.bytes,
+                "deduplicated": self.deduplicated,
+                "deduplicated_bytes": self.deduplicated_bytes,
+                "mb_per_second": round(self.bytes / self.seconds / 1_000_000, 3) if self.seconds else 0.0,
+            }
+
+
+upload_stats = UploadStats()
+
+
 class ImageService:
     def __init__(self):
         self.is_production = os.getenv("ENVIRONMENT") == "production"
+        self.max_upload_bytes = config['IMAGE_MAX_UPLOAD_BYTES']
+        self.chunk_size = config['IMAGE_UPLOAD_CHUNK_BYTES']
+        self.part_size = config['IMAGE_S3_PART_BYTES']
         if self.is_production:
             self.s3_client = boto3.client(
                 's3',
                 aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
                 aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-                region_name=os.getenv("AWS_REGION", "us-east-1")
+                region_name=os.getenv("AWS_REGION", "us-east-1"),
+                # Point at an S3-compatible server such as MinIO for local testing
+                endpoint_url=os.getenv("AWS_S3_ENDPOINT_URL") or None,
+                # Presigned PUTs carry a checksum header, which needs SigV4
+                config=Config(signature_version="s3v4")
             )
             self.bucket_name = os.getenv("AWS_S3_BUCKET")
+            self.s3_base_url = os.getenv("AWS_S3_PUBLIC_URL", f"https://{self.bucket_name}.s3.amazonaws.com").rstrip("/")
         else:
-            self.upload_dir = "uploads/images"
+            self.upload_dir = LOCAL_IMAGE_DIR
+            self.incoming_dir = config['IMAGE_INCOMING_DIR']
             os.makedirs(self.upload_dir, exist_ok=True)
+            os.makedirs(self.incoming_dir, exist_ok=True)
+
+    async def _run_blocking(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_io_executor, lambda: func(*args, **kwargs))
+
+    async def _read_chunk(self, file: UploadFile, received: int) -> bytes:
+        """
+        Read the next chunk, enforcing the size limit before the bytes are stored
 
-    async def upload_image(self, file: UploadFile, user_id: str) -> Optional[str]:
+        The request body itself is limited by BodySizeLimitMiddleware before
+        FastAPI spools it; this is the exact check on the image's size.
+        """
+        chunk = await file.read(self.chunk_size)
+        if received + len(chunk) > self.max_upload_bytes:
+            upload_stats.record_rejected()
+            raise ImageTooLargeError(
+                f"Image exceeds the maximum upload size of {self.max_upload_bytes} bytes"
+            )
+        return chunk
+
+    async def upload_image(self, file: UploadFile, db) -> Optional[str]:
+        """
+        Stream an upload to local disk or S3 without blocking the event loop.
+
+        Images are stored under the SHA-256 of their bytes, so uploading an
+        image that is already stored only adds a reference (see ImageBlobs).
+        Raises ImageTooLargeError if the upload exceeds the configured size;
+        returns None on any other failure.
+        """
         try:
-            # Generate unique filename
-            file_extension = os.path.splitext(file.filename)[1]
-            unique_filename = f"{uuid.uuid4()}{file_extension}"
+            file_extension = os.path.splitext(file.filename)[1].lower()
+            blobs = ImageBlobs(db)
+            started = time.monotonic()
 
             if self.is_production:
                 # Upload to S3
-                s3_key = f"users/{user_id}/products/{unique_filename}"
-                self.s3_client.upload_fileobj(
-                    file.file,
-                    self.bucket_name,
-                    s3_key,
-                    ExtraArgs={
-                        "ContentType": file.content_type,
-                        "ACL": "public-read"
-                    }
-                )
+                s3_key, size, reused = await self._upload_to_s3(file, file_extension, blobs)
                 # Generate public URL
-                url = f"https://{self.bucket_name}.s3.amazonaws.com/{s3_key}"
+                url = f"{self.s3_base_url}/{s3_key}"
             else:
                 # Save locally
-                file_path = os.path.join(self.upload_dir, unique_filename)
-                with open(file_path, "wb") as buffer:
-                    content = await file.read()
-                    buffer.write(content)
+                filename, size, reused = await self._save_locally(file, file_extension, blobs)
                 # Generate local URL
-                url = f"/uploads/images/{unique_filename}"
+                url = f"/uploads/images/{filename}"
 
+            elapsed = time.monotonic() - started
+            upload_stats.record(size, elapsed, reused)
+            logger.info(
+                f"Uploaded {size} bytes in {elapsed:.3f}s "
+                f"({size / elapsed / 1_000_000 if elapsed else 0:.2f} MB/s)"
+                f"{', already stored' if reused else ''}"
+            )
             return url
 
+        except ImageTooLargeError:
+            raise
         except Exception as e:
             logger.error(f"Error uploading image: {str(e)}")
             return None
 
-    def delete_image(self, image_url: str) -> bool:
+    async def create_direct_upload(
+        self, db, user_id: str, product_id: str, filename: str, content_type: str, size: int, sha256: str
+    ) -> dict:
+        """
+        Let the client send an image straight to storage instead of through the API.
+
+        Returns a presigned S3 PUT in production, or a signed URL on this
+        server in development. The upload is bound to the declared size and
+        SHA-256 and must be finished with complete_direct_upload. If the image
+        is already stored, no upload is needed (`upload_url` is None).
+        """
+        sha256 = sha256.lower()
+        if not content_type.startswith("image/"):
+            raise DirectUploadError("Only image uploads are allowed")
+        if not SHA256_HEX.fullmatch(sha256):
+            raise DirectUploadError("sha256 must be the hex SHA-256 of the image")
+        if size <= 0:
+            raise DirectUploadError("size must be positive")
+        if size > self.max_upload_bytes:
+            upload_stats.record_rejected()
+            raise ImageTooLargeError(
+                f"Image exceeds the maximum upload size of {self.max_upload_bytes} bytes"
+            )
+
+        extension = os.path.splitext(filename)[1].lower()
+        expires_in = config['IMAGE_DIRECT_UPLOAD_EXPIRES_SECONDS']
+        claims = {
+            "purpose": DIRECT_UPLOAD_PURPOSE,
+            "sub": user_id,
+            "pid": product_id,
+            "name": f"{uuid.uuid4()}{extension}",
+            "ext": extension,
+            "sha256": sha256,
+            "size": size,
+            "ct": content_type,
+            "exp": int(time.time()) + expires_in,
+        }
+        upload_id = jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM)
+        if await ImageBlobs(db).is_stored(self._direct_blob_key(claims)):
+            return {"upload_id": upload_id, "upload_url": None, "method": "PUT", "headers": {}, "expires_in": expires_in}
+
+        if self.is_production:
+            checksum = base64.b64encode(bytes.fromhex(sha256)).decode()
+            upload_url = await self._run_blocking(
+                self.s3_client.generate_presigned_url,
+                "put_object",
+                Params={
+                    "Bucket": self.bucket_name,
+                    "Key": f"{S3_UPLOAD_PREFIX}{claims['name']}",
+                    "ContentType": content_type,
+                    "ContentLength": size,
+                    # S3 rejects the PUT unless the body matches the declared hash
+                    "ChecksumSHA256": checksum,
+                },
+                ExpiresIn=expires_in
+            )
+            headers = {"Content-Type": content_type, "x-amz-checksum-sha256": checksum}
+        else:
+            upload_url = f"/api/uploads/direct/{upload_id}"
+            headers = {"Content-Type": content_type}
+        return {"upload_id": upload_id, "upload_url": upload_url, "method": "PUT", "headers": headers, "expires_in": expires_in}
+
+    def read_direct_upload(self, upload_id: str, user_id: Optional[str] = None, product_id: Optional[str] = None) -> dict:
+        """Decode a direct upload token, checking that it belongs to this user and product"""
+        try:
+            claims = jwt.decode(upload_id, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            raise DirectUploadError("Invalid or expired upload")
+        if claims.get("purpose") != DIRECT_UPLOAD_PURPOSE:
+            raise DirectUploadError("Invalid or expired upload")
+        if (user_id is not None and claims["sub"] != user_id) or (product_id is not None and claims["pid"] != product_id):
+            raise DirectUploadError("Upload belongs to a different product")
+        return claims
+
+    def _direct_blob_key(self, claims: dict) -> str:
+        filename = f"{claims['sha256']}{claims['ext']}"
+        return f"{S3_IMAGE_PREFIX}{filename}" if self.is_production else filename
+
+    async def receive_direct_upload(self, claims: dict, chunks: AsyncIterator[bytes]):
+        """Development stand-in for the presigned S3 PUT: store the body if it matches the token"""
+        temp_path = os.path.join(self.incoming_dir, claims["name"])
+        part_path = f"{temp_path}.part"
+        digest = hashlib.sha256()
+        buffer = await self._run_blocking(open, part_path, "wb")
+        received = 0
+        try:
+            async for chunk in chunks:
+                received += len(chunk)
+                if received > claims["size"]:
+                    raise DirectUploadError("Upload is larger than declared")
+                digest.update(chunk)
+                await self._run_blocking(buffer.write, chunk)
+            await self._run_blocking(buffer.close)
+            if received != claims["size"] or digest.hexdigest() != claims["sha256"]:
+                raise DirectUploadError("Upload does not match the declared size and SHA-256")
+            await self._run_blocking(os.replace, part_path, temp_path)
+        finally:
+            if not buffer.closed:
+                await self._run_blocking(buffer.close)
+            if await self._run_blocking(os.path.exists, part_path):
+                await self._run_blocking(os.remove, part_path)
+
+    async def complete_direct_upload(self, db, claims: dict) -> str:
+        """
+        Verify a finished direct upload and store it under its content hash,
+        the same way upload_image would. Returns the image URL.
+        """
+        blobs = ImageBlobs(db)
+        key = self._direct_blob_key(claims)
+        started = time.monotonic()
+        if self.is_production:
+            temp_key = f"{S3_UPLOAD_PREFIX}{claims['name']}"
+            try:
+                head = await self._run_blocking(
+                    self.s3_client.head_object, Bucket=self.bucket_name, Key=temp_key, ChecksumMode="ENABLED"
+                )
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchKey", "NotFound"):
+                    raise
+                head = None
+            if head is None:
+                reused = await self._acquire_stored(blobs, key)
+            else:
+                if head["ContentLength"] != claims["size"] or await self._s3_sha256(temp_key, head) != claims["sha256"]:
+                    await self._run_blocking(self.s3_client.delete_object, Bucket=self.bucket_name, Key=temp_key)
+                    raise DirectUploadError("Upload does not match the declared size and SHA-256")
+                reused = await self._claim_s3_object(temp_key, key, claims["size"], claims["ct"], blobs)
+            url = f"{self.s3_base_url}/{key}"
+        else:
+            temp_path = os.path.join(self.incoming_dir, claims["name"])
+            if await self._run_blocking(os.path.exists, temp_path):
+                # receive_direct_upload already checked the size and hash
+                try:
+                    reused = await self._claim_local_file(temp_path, key, claims["size"], claims["ct"], blobs)
+                finally:
+                    if await self._run_blocking(os.path.exists, temp_path):
+                        await self._run_blocking(os.remove, temp_path)
+            else:
+                reused = await self._acquire_stored(blobs, key)
+            url = f"/uploads/images/{key}"
+
+        upload_stats.record(claims["size"], time.monotonic() - started, reused)
+        return url
+
+    async def _s3_sha256(self, key: str, head: dict) -> str:
+        """The object's SHA-256 from its stored checksum, or by reading it back where the server keeps none (e.g. MinIO)"""
+        if head.get("ChecksumSHA256"):
+            return base64.b64decode(head["ChecksumSHA256"]).hex()
+        response = await self._run_blocking(self.s3_client.get_object, Bucket=self.bucket_name, Key=key)
+        digest = hashlib.sha256()
+        chunks = response["Body"].iter_chunks(self.chunk_size)
+        while chunk := await self._run_blocking(next, chunks, b""):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    async def _acquire_stored(self, blobs: ImageBlobs, key: str) -> bool:
+        # Nothing was uploaded, which is only fine if the image was already stored
+        if not await blobs.acquire_if_stored(key):
+            raise DirectUploadError("No upload found for this upload_id")
+        return True
+
+    async def _save_locally(self, file: UploadFile, extension: str, blobs: ImageBlobs) -> Tuple[str, int, bool]:
+        # Write to a temporary name while hashing; the final name is only known at the end
+        temp_path = incoming_temp_path()
+        digest = hashlib.sha256()
+        buffer = await self._run_blocking(open, temp_path, "wb")
+        received = 0
+        try:
+            while chunk := await self._read_chunk(file, received):
+                received += len(chunk)
+                digest.update(chunk)
+                await self._run_blocking(buffer.write, chunk)
+            await self._run_blocking(buffer.close)
+
+            filename = f"{digest.hexdigest()}{extension}"
+            reused = await self._claim_local_file(temp_path, filename, received, file.content_type, blobs)
+            return filename, received, reused
+        finally:
+            if not buffer.closed:
+                await self._run_blocking(buffer.close)
+            if await self._run_blocking(os.path.exists, temp_path):
+                await self._run_blocking(os.remove, temp_path)
+
+    async def _claim_local_file(self, temp_path: str, filename: str, size: int, content_type: Optional[str], blobs: ImageBlobs) -> bool:
+        """Move a verified temporary file under its content-addressed name, unless it is already stored"""
+        file_path = os.path.join(self.upload_dir, filename)
+        reused = await blobs.acquire(filename, size, content_type)
+        if reused and await self._run_blocking(os.path.exists, file_path):
+            return True
+        try:
+            await self._run_blocking(os.replace, temp_path, file_path)
+            await blobs.mark_stored(filename)
+        except BaseException:
+            await blobs.abandon(filename)
+            raise
+        return False
+
+    def _s3_extra_args(self, content_type: Optional[str]) -> dict:
+        return {
+            "ContentType": content_type,
+            "ACL": "public-read",
+            # Keys are content hashes, so an object's content never changes
+            "CacheControl": f"public, max-age={config['UPLOADS_CACHE_MAX_AGE_SECONDS']}, immutable"
+        }
+
+    async def _claim_s3_object(self, temp_key: str, s3_key: str, size: int, content_type: Optional[str], blobs: ImageBlobs) -> bool:
+        """Server-side copy a temporary object under its content-addressed key (unless already stored), then drop it"""
+        try:
+            reused = await blobs.acquire(s3_key, size, content_type)
+            if not reused:
+                try:
+                    await self._run_blocking(
+                        self.s3_client.copy_object,
+                        Bucket=self.bucket_name,
+                        Key=s3_key,
+                        CopySource={"Bucket": self.bucket_name, "Key": temp_key},
+                        MetadataDirective="REPLACE",
+                        **self._s3_extra_args(content_type)
+                    )
+                    await blobs.mark_stored(s3_key)
+                except BaseException:
+                    await blobs.abandon(s3_key)
+                    raise
+        finally:
+            await self._run_blocking(self.s3_client.delete_object, Bucket=self.bucket_name, Key=temp_key)
+        return reused
+
+    async def _upload_to_s3(self, file: UploadFile, extension: str, blobs: ImageBlobs) -> Tuple[str, int, bool]:
+        extra_args = self._s3_extra_args(file.content_type)
+        received = 0
+        pending = bytearray()
+        digest = hashlib.sha256()
+
+        # Buffer up to one part; small images go up in a single PUT
+        while len(pending) < self.part_size:
+            chunk = await self._read_chunk(file, received)
+            if not chunk:
+                break
+            received += len(chunk)
+            digest.update(chunk)
+            pending.extend(chunk)
+        if len(pending) < self.part_size:
+            # The whole image is in memory, so a duplicate costs no PUT at all
+            s3_key = f"{S3_IMAGE_PREFIX}{digest.hexdigest()}{extension}"
+            if await blobs.acquire(s3_key, received, file.content_type):
+                return s3_key, received, True
+            try:
+                await self._run_blocking(
+                    self.s3_client.put_object,
+                    Bucket=self.bucket_name,
+                    Key=s3_key,
+                    Body=bytes(pending),
+                    **extra_args
+                )
+                await blobs.mark_stored(s3_key)
+            except BaseException:
+                await blobs.abandon(s3_key)
+                raise
+            return s3_key, received, False
+
+        # Too large to hold: stream a multipart upload to a temporary key, then move it under its hash
+        temp_key = f"{S3_UPLOAD_PREFIX}{uuid.uuid4()}{extension}"
+        upload = await self._run_blocking(
+            self.s3_client.create_multipart_upload,
+            Bucket=self.bucket_name,
+            Key=temp_key,
+            **extra_args
+        )
+        upload_id = upload["UploadId"]
+        parts = []
+        try:
+            while True:
+                chunk = await self._read_chunk(file, received)
+                received += len(chunk)
+                digest.update(chunk)
+                pending.extend(chunk)
+                # Every part except the last must be at least part_size bytes
+                if len(pending) >= self.part_size or (not chunk and pending):
+                    part_number = len(parts) + 1
+                    response = await self._run_blocking(
+                        self.s3_client.upload_part,
+                        Bucket=self.bucket_name,
+                        Key=temp_key,
+                        UploadId=upload_id,
+                        PartNumber=part_number,
+                        Body=bytes(pending)
+                    )
+                    parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+                    pending = bytearray()
+                if not chunk:
+                    break
+            await self._run_blocking(
+                self.s3_client.complete_multipart_upload,
+                Bucket=self.bucket_name,
+                Key=temp_key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts}
+            )
+        except BaseException:
+            await self._run_blocking(
+                self.s3_client.abort_multipart_upload,
+                Bucket=self.bucket_name,
+                Key=temp_key,
+                UploadId=upload_id
+            )
+            raise
+
+        s3_key = f"{S3_IMAGE_PREFIX}{digest.hexdigest()}{extension}"
+        reused = await self._claim_s3_object(temp_key, s3_key, received, file.content_type, blobs)
+        return s3_key, received, reused
+
+    def _s3_key(self, image_url: str) -> Optional[str]:
+        prefix = f"{self.s3_base_url}/" if self.is_production else None
+        if prefix and image_url.startswith(prefix):
+            return image_url[len(prefix):]
+        return None
+
+    async def read_image(self, image_url: str) -> Optional[Union[str, bytes]]:
+        """
+        Locate a stored image for processing: a local file path, or the bytes
+        of an S3 object. Returns None for images stored anywhere else.
+        """
+        if LOCAL_IMAGE_URL_MARKER in image_url:
+            file_path = os.path.join(LOCAL_IMAGE_DIR, image_url.split(LOCAL_IMAGE_URL_MARKER)[1])
+            return file_path if await self._run_blocking(os.path.exists, file_path) else None
+        key = self._s3_key(image_url)
+        if key is None:
+            return None
+        response = await self._run_blocking(self.s3_client.get_object, Bucket=self.bucket_name, Key=key)
+        return await self._run_blocking(response["Body"].read)
+
+    async def store_alongside(self, image_url: str, filename: str, data: bytes, content_type: str) -> str:
+        """Store `data` next to an existing image under a new filename and return its URL"""
+        base_url = image_url.rsplit("/", 1)[0]
+        if LOCAL_IMAGE_URL_MARKER in image_url:
+            file_path = os.path.join(LOCAL_IMAGE_DIR, filename)
+            await self._run_blocking(self._write_file, file_path, data)
+        else:
+            key = f"{self._s3_key(image_url).rsplit('/', 1)[0]}/{filename}"
+            await self._run_blocking(
+                self.s3_client.put_object,
+                Bucket=self.bucket_name,
+                Key=key,
+                Body=data,
+                ContentType=content_type,
+                ACL="public-read",
+                CacheControl=f"public, max-age={config['UPLOADS_CACHE_MAX_AGE_SECONDS']}, immutable"
+            )
+        return f"{base_url}/{filename}"
+
+    @staticmethod
+    def _write_file(file_path: str, data: bytes):
+        temp_path = incoming_temp_path()
+        try:
+            with open(temp_path, "wb") as file:
+                file.write(data)
+            os.replace(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def _blob_key(self, image_url: str) -> Optional[str]:
+        if LOCAL_IMAGE_URL_MARKER in image_url:
+            filename = image_url.split(LOCAL_IMAGE_URL_MARKER)[1]
+            # Clients can send any image_url; only plain names inside the image directory are ours
+            return filename if filename and os.path.basename(filename) == filename and not filename.startswith(".") else None
+        return self._s3_key(image_url)
+
+    async def acquire_image(self, db, image_url: str) -> Optional[bool]:
+        """
+        Take a reference for a product that is pointed at an existing image.
+        Returns True if one was taken, None if the image is not reference
+        counted, and False if it is one of ours that is no longer stored.
+        """
+        key = self._blob_key(image_url) if image_url else None
+        if key is None:
+            return None
+        blobs = ImageBlobs(db)
+        if await blobs.acquire_if_stored(key):
+            return True
+        # Images stored before deduplication (and generated ones) have no reference count
+        if await blobs.is_tracked(key) or not await self._exists(key):
+            return False
+        return None
+
+    async def _exists(self, key: str) -> bool:
+        if not self.is_production:
+            return await self._run_blocking(os.path.exists, os.path.join(self.upload_dir, key))
+        try:
+            await self._run_blocking(self.s3_client.head_object, Bucket=self.bucket_name, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    async def release_image(self, db, image_url: str, variant_urls: Iterable[str] = ()) -> bool:
+        """
+        Drop a product's reference to an image, deleting the image and its
+        variants once no product uses it. Images without a reference count
+        are deleted once no product's image_url points at them any more.
+        """
+        key = self._blob_key(image_url)
+        blobs = ImageBlobs(db)
+        released = await blobs.release(key) if key is not None else None
+        if released is False:
+            return True
+        if released is None and await db.products.count_documents({"image_url": image_url}, limit=1):
+            return True
+        deleted = await self.delete_image(image_url)
+        for variant_url in variant_urls:
+            await self.delete_image(variant_url)
+        if released:
+            await blobs.finish_delete(key)
+        return deleted
+
+    async def delete_image(self, image_url: str) -> bool:
         try:
             if self.is_production:
                 # Extract key from S3 URL
-                key = image_url.split(f"https://{self.bucket_name}.s3.amazonaws.com/")[1]
-                self.s3_client.delete_object(
+                key = self._s3_key(image_url)
+                await self._run_blocking(
+                    self.s3_client.delete_object,
                     Bucket=self.bucket_name,
                     Key=key
                 )
             else:
                 # Delete local file
-                filename = image_url.split("/uploads/images/")[1]
+                filename = self._blob_key(image_url)
+                if filename is None:
+                    return False
                 file_path = os.path.join(self.upload_dir, filename)
                 if os.path.exists(file_path):
-                    os.remove(file_path)
+                    await self._run_blocking(os.remove, file_path)
             return True
         except Exception as e:
             logger.error(f"Error deleting image: {str(e)}")
-            return False 
\ No newline at end of file
+            return False
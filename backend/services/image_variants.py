@@ -0,0 +1,213 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
+
+from PIL import Image, ImageOps
+
+from config import config
+from models.product import versioned_update
+from services.image_service import ImageService
+
+logger = logging.getLogger(__name__)
+
+# format name -> (Pillow format, content type, file extension)
+VARIANT_FORMATS = {
+    "avif": ("AVIF", "image/avif", "avif"),
+    "webp": ("WEBP", "image/webp", "webp"),
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+}
+
+
+def variant_filename(filename: str, width: int, fmt: str) -> str:
+    """`abc.png` at 320px as WebP is stored as `abc.w320.webp`"""
+    return f"{os.path.splitext(filename)[0]}.w{width}.{VARIANT_FORMATS[fmt][2]}"
+
+
+def supported_formats(formats: List[str]) -> List[str]:
+    """
+    The requested formats this Pillow build can encode (AVIF needs Pillow >= 11.2),
+    best compression first
+    """
+    Image.init()
+    for fmt in formats:
+        if fmt not in VARIANT_FORMATS or VARIANT_FORMATS[fmt][0] not in Image.SAVE:
+            logger.warning(f"Image variant format '{fmt}' is not supported and will be skipped")
+    return [
+        fmt for fmt, (pillow_format, _, _) in VARIANT_FORMATS.items()
+        if fmt in formats and pillow_format in Image.SAVE
+    ]
+
+
+def render_variants(source: Union[str, bytes], widths: List[int], formats: List[str], quality: int) -> List[Tuple[int, str, bytes]]:
+    """
+    Decode an image once and encode it at every width up to the original's;
+    at the original width it is only re-encoded, which still shrinks PNGs a lot
+
+    Runs in a worker process. Returns (width, format, encoded bytes) tuples.
+    """
+    with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as original:
+        # Lets JPEG sources decode at a reduced scale when even the largest variant is much smaller
+        original.draft("RGB", (max(widths), max(widths)))
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+
+        rendered = []
+        for width in sorted(set(widths)):
+            if width > image.width:
+                break
+            resized = image if width == image.width else image.resize(
+                (width, max(1, round(image.height * width / image.width))), Image.LANCZOS, reducing_gap=3.0
+            )
+            for fmt in formats:
+                pillow_format = VARIANT_FORMATS[fmt][0]
+                output = resized
+                if pillow_format == "JPEG" and output.mode == "RGBA":
+                    # JPEG has no alpha channel; flatten onto white
+                    output = Image.new("RGB", resized.size, (255, 255, 255))
+                    output.paste(resized, mask=resized.getchannel("A"))
+                buffer = io.BytesIO()
+                output.save(buffer, pillow_format, quality=quality, **({"optimize": True} if pillow_format == "JPEG" else {}))
+                rendered.append((width, fmt, buffer.getvalue()))
+        return rendered
+
+
+class ImageVariantPipeline:
+    """
+    Produce resized variants of product images after upload or generation
+
+    Decoding and encoding run in a process pool so Pillow never holds the
+    event loop (or the GIL of the API process). Work is scheduled in the
+    background; the variants are recorded on the product once they exist.
+    """
+
+    def __init__(self, widths: List[int], formats: List[str], quality: int, workers: int):
+        self.widths = sorted(set(widths))
+        self.formats = supported_formats(formats)
+        self.quality = quality
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._tasks = set()
+        self._rendering: Dict[str, asyncio.Future] = {}
+        self.processed = 0
+        self.failed = 0
+        self.variants = 0
+        self.reused = 0
+        self.seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.widths and self.formats)
+
+    def start(self) -> ProcessPoolExecutor:
+        """
+        Create the worker pool; called at startup so importing this module never starts processes
+
+        Workers come from a forkserver (or spawn where that is unavailable):
+        forking the threaded API process could copy locks held by other threads.
+        """
+        if self._executor is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(method))
+        return self._executor
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # Scripts and jobs running outside the app never called start()
+        return self._executor or self.start()
+
+    async def render(self, source: Union[str, bytes]) -> List[Tuple[int, str, bytes]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool(), render_variants, source, self.widths, self.formats, self.quality)
+
+    async def create_variants(self, image_url: str, image_service: ImageService) -> Optional[dict]:
+        """Render and store the variants of one image; None if the image is not ours to process"""
+        source = await image_service.read_image(image_url)
+        if source is None:
+            return None
+        started = time.perf_counter()
+        rendered = await self.render(source)
+        filename = image_url.rsplit("/", 1)[1]
+        items = []
+        for width, fmt, data in rendered:
+            url = await image_service.store_alongside(
+                image_url, variant_filename(filename, width, fmt), data, VARIANT_FORMATS[fmt][1]
+            )
+            items.append({"width": width, "format": fmt, "url": url})
+        self.processed += 1
+        self.variants += len(items)
+        self.seconds += time.perf_counter() - started
+        return {"source": image_url, "items": items}
+
+    async def update_product(self, db, product_id, image_url: str):
+        # Identical uploads share one content-addressed URL, so another product may already have the variants
+        existing = await db.products.find_one({"image_variants.source": image_url}, {"image_variants": 1})
+        if existing is not None and existing["_id"] == product_id:
+            # e.g. a PUT that resends the same image_url
+            return
+        if existing is not None:
+            self.reused += 1
+            variants = existing["image_variants"]
+        else:
+            variants = await self._create_once(image_url)
+        if variants is None:
+            return
+        # Only record them if the product still shows this image
+        await db.products.update_one(
+            {"_id": product_id, "image_url": image_url},
+            versioned_update({"image_variants": variants})
+        )
+
+    async def _create_once(self, image_url: str) -> Optional[dict]:
+        # Identical images uploaded together share one render instead of each starting their own
+        future = self._rendering.get(image_url)
+        if future is None:
+            future = asyncio.ensure_future(self.create_variants(image_url, ImageService()))
+            self._rendering[image_url] = future
+            future.add_done_callback(lambda _: self._rendering.pop(image_url, None))
+        else:
+            self.reused += 1
+        return await asyncio.shield(future)
+
+    async def _update_safely(self, db, product_id, image_url: str):
+        try:
+            await self.update_product(db, product_id, image_url)
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Error creating image variants for {image_url}: {str(e)}")
+
+    def schedule(self, db, product_id, image_url: Optional[str]):
+        """Create variants for a product's new image_url in the background"""
+        if not image_url or not self.enabled:
+            return
+        task = asyncio.create_task(self._update_safely(db, product_id, image_url))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def stats(self) -> dict:
+        return {
+            "processed": self.processed,
+            "failed": self.failed,
+            "variants": self.variants,
+            "reused": self.reused,
+            "pending": len(self._tasks),
+            "avg_ms": round(self.seconds / self.processed * 1000, 1) if self.processed else 0.0,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Shared by every route and job in the process
+image_variants = ImageVariantPipeline(
+    widths=config['IMAGE_VARIANT_WIDTHS'],
+    formats=config['IMAGE_VARIANT_FORMATS'],
+    quality=config['IMAGE_VARIANT_QUALITY'],
+    workers=config['IMAGE_VARIANT_WORKERS']
+)
@@ -0,0 +1,382 @@
+import asyncio
+import logging
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+# Recorded on jobs whose worker died (OOM, crash) during their last allowed attempt
+ABANDONED_ERROR = "Job worker stopped responding on the last allowed attempt"
+
+
+class MongoJobStore:
+    """
+    Job storage backed by the `jobs` collection
+    """
+
+    def __init__(self, db):
+        self.collection = db.jobs
+
+    async def create_indexes(self):
+        await self.collection.create_index([("status", 1), ("available_at", 1)])
+        await self.collection.create_index([("status", 1), ("lease_expires_at", 1)])
+        await self.collection.create_index("user_id")
+
+    async def insert(self, job: dict) -> dict:
+        result = await self.collection.insert_one(job)
+        job["_id"] = result.inserted_id
+        return job
+
+    async def get(self, job_id: ObjectId) -> Optional[dict]:
+        return await self.collection.find_one({"_id": job_id})
+
+    async def fail_abandoned(self, now: datetime) -> List[dict]:
+        """Fail running jobs whose lease expired with no attempts left; returns the failed jobs"""
+        failed = []
+        while True:
+            # One at a time so exactly one worker sees (and finalizes) each job
+            job = await self.collection.find_one_and_update(
+                {
+                    "status": JOB_RUNNING,
+                    "lease_expires_at": {"$lt": now},
+                    "$expr": {"$gte": ["$attempts", "$max_attempts"]}
+                },
+                {
+                    "$set": {
+                        "status": JOB_FAILED,
+                        "current_step": JOB_FAILED,
+                        "error": ABANDONED_ERROR,
+                        "lease_owner": None,
+                        "updated_at": now
+                    },
+                    "$push": {"progress": {"message": JOB_FAILED, "at": now, "error": ABANDONED_ERROR}}
+                },
+                return_document=ReturnDocument.AFTER
+            )
+            if job is None:
+                return failed
+            failed.append(job)
+
+    async def claim(self, worker_id: str, lease_seconds: int) -> Optional[dict]:
+        """
+        Atomically lease the next runnable job, including jobs whose lease
+        expired while they still have attempts left
+        """
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": JOB_PENDING, "available_at": {"$lte": now}},
+                {
+                    "status": JOB_RUNNING,
+                    "lease_expires_at": {"$lt": now},
+                    "$expr": {"$lt": ["$attempts", "$max_attempts"]}
+                }
+            ]},
+            {
+                "$set": {
+                    "status": JOB_RUNNING,
+                    "lease_owner": worker_id,
+                    "lease_expires_at": now + timedelta(seconds=lease_seconds),
+                    "updated_at": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("available_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def update(self, job_id: ObjectId, worker_id: str, changes: dict, push_progress: Optional[dict] = None) -> bool:
+        """Update a job only while the worker still holds its lease"""
+        update = {"$set": {**changes, "updated_at": datetime.utcnow()}}
+        if push_progress:
+            update["$push"] = {"progress": push_progress}
+        result = await self.collection.update_one(
+            {"_id": job_id, "lease_owner": worker_id},
+            update
+        )
+        return result.matched_count == 1
+
+
+class InMemoryJobStore:
+    """
+    Process-local job storage for tests and single-process development
+    """
+
+    def __init__(self):
+        self.jobs: Dict[ObjectId, dict] = {}
+        self._lock = asyncio.Lock()
+
+    async def create_indexes(self):
+        pass
+
+    async def insert(self, job: dict) -> dict:
+        job["_id"] = ObjectId()
+        self.jobs[job["_id"]] = job
+        return dict(job)
+
+    async def get(self, job_id: ObjectId) -> Optional[dict]:
+        job = self.jobs.get(job_id)
+        return dict(job) if job else None
+
+    async def fail_abandoned(self, now: datetime) -> List[dict]:
+        async with self._lock:
+            abandoned = [
+                job for job in self.jobs.values()
+                if job["status"] == JOB_RUNNING and job["lease_expires_at"] < now
+                and job["attempts"] >= job["max_attempts"]
+            ]
+            for job in abandoned:
+                job.update({
+                    "status": JOB_FAILED,
+                    "current_step": JOB_FAILED,
+                    "error": ABANDONED_ERROR,
+                    "lease_owner": None,
+                    "updated_at": now,
+                    "progress": job["progress"] + [{"message": JOB_FAILED, "at": now, "error": ABANDONED_ERROR}]
+                })
+            return [dict(job) for job in abandoned]
+
+    async def claim(self, worker_id: str, lease_seconds: int) -> Optional[dict]:
+        now = datetime.utcnow()
+        async with self._lock:
+            runnable = [
+                job for job in self.jobs.values()
+                if (job["status"] == JOB_PENDING and job["available_at"] <= now)
+                or (job["status"] == JOB_RUNNING and job["lease_expires_at"] < now
+                    and job["attempts"] < job["max_attempts"])
+            ]
+            if not runnable:
+                return None
+            job = min(runnable, key=lambda j: j["available_at"])
+            job.update({
+                "status": JOB_RUNNING,
+                "lease_owner": worker_id,
+                "lease_expires_at": now + timedelta(seconds=lease_seconds),
+                "updated_at": now,
+                "attempts": job["attempts"] + 1
+            })
+            return dict(job)
+
+    async def update(self, job_id: ObjectId, worker_id: str, changes: dict, push_progress: Optional[dict] = None) -> bool:
+        async with self._lock:
+            job = self.jobs.get(job_id)
+            if not job or job.get("lease_owner") != worker_id:
+                return False
+            job.update(changes)
+            job["updated_at"] = datetime.utcnow()
+            if push_progress:
+                job["progress"] = job["progress"] + [push_progress]
+            return True
+
+
+class JobContext:
+    """
+    Handle passed to job handlers for reporting progress
+    """
+
+    def __init__(self, queue: "JobQueue", job: dict, worker_id: str):
+        self.queue = queue
+        self.db = queue.db
+        self.job = job
+        self.worker_id = worker_id
+
+    async def progress(self, message: str, **details):
+        """Record a progress step such as 'field features done'"""
+        entry = {"message": message, "at": datetime.utcnow(), **details}
+        await self.queue.store.update(
+            self.job["_id"],
+            self.worker_id,
+            {"current_step": message},
+            push_progress=entry
+        )
+
+
+JobHandler = Callable[[JobContext], Awaitable[Any]]
+# Called once with the job document when it completes or fails for good
+JobFinalizer = Callable[[dict], Awaitable[None]]
+
+
+class JobQueue:
+    """
+    Persistent job queue with a pool of async workers
+
+    Jobs are leased to a worker for `lease_seconds`; the lease is renewed
+    while the handler runs, and a job whose worker died becomes runnable
+    again once its lease expires, or fails if that was its last attempt.
+    Failed jobs are retried with exponential backoff up to `max_attempts`.
+    """
+
+    def __init__(self):
+        self.db = None
+        self.store = None
+        self.handlers: Dict[str, JobHandler] = {}
+        self.finalizers: Dict[str, JobFinalizer] = {}
+        self.num_workers = config['JOB_WORKERS']
+        self.lease_seconds = config['JOB_LEASE_SECONDS']
+        self.max_attempts = config['JOB_MAX_ATTEMPTS']
+        self.poll_interval = config['JOB_POLL_INTERVAL_SECONDS']
+        self._workers = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    def register(self, job_type: str, handler: JobHandler, on_finished: Optional[JobFinalizer] = None):
+        self.handlers[job_type] = handler
+        if on_finished is not None:
+            self.finalizers[job_type] = on_finished
+
+    async def start(self, db, store=None):
+        """Start the worker pool; the store defaults to the one selected by JOB_STORE"""
+        self.db = db
+        self.store = store or create_job_store(db)
+        await self.store.create_indexes()
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._workers = [
+            asyncio.create_task(self._worker(f"{uuid.uuid4().hex[:8]}-{index}"))
+            for index in range(self.num_workers)
+        ]
+        logger.info(f"Job queue started with {self.num_workers} workers")
+
+    async def stop(self):
+        """Stop the workers; running jobs are picked up again after their lease expires"""
+        self._stopping = True
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def enqueue(self, job_type: str, user_id: ObjectId, payload: dict, product_id: Optional[ObjectId] = None) -> dict:
+        if job_type not in self.handlers:
+            raise ValueError(f"Unknown job type '{job_type}'")
+        now = datetime.utcnow()
+        job = await self.store.insert({
+            "type": job_type,
+            "user_id": user_id,
+            "product_id": product_id,
+            "payload": payload,
+            "status": JOB_PENDING,
+            "current_step": JOB_PENDING,
+            "progress": [],
+            "attempts": 0,
+            "max_attempts": self.max_attempts,
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "available_at": now,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now
+        })
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def get(self, job_id: ObjectId) -> Optional[dict]:
+        return await self.store.get(job_id)
+
+    async def _worker(self, worker_id: str):
+        while not self._stopping:
+            try:
+                for abandoned in await self.store.fail_abandoned(datetime.utcnow()):
+                    logger.warning(f"Job {abandoned['_id']} ({abandoned['type']}) failed: {ABANDONED_ERROR}")
+                    await self._finish(abandoned)
+                job = await self.store.claim(worker_id, self.lease_seconds)
+            except Exception as e:
+                logger.error(f"Job worker {worker_id} failed to claim a job: {str(e)}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._run(job, worker_id)
+
+    async def _run(self, job: dict, worker_id: str):
+        context = JobContext(self, job, worker_id)
+        renewer = asyncio.create_task(self._renew_lease(job["_id"], worker_id))
+        try:
+            handler = self.handlers[job["type"]]
+            await context.progress(JOB_RUNNING, attempt=job["attempts"])
+            result = await handler(context)
+            if await self.store.update(
+                job["_id"],
+                worker_id,
+                {"status": JOB_COMPLETED, "current_step": JOB_COMPLETED, "result": result, "lease_owner": None},
+                push_progress={"message": JOB_COMPLETED, "at": datetime.utcnow()}
+            ):
+                await self._finish(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Job {job['_id']} ({job['type']}) failed: {str(e)}")
+            if job["attempts"] < job["max_attempts"]:
+                delay = min(2 ** job["attempts"], 60) + random.uniform(0, 1)
+                changes = {
+                    "status": JOB_PENDING,
+                    "current_step": "retrying",
+                    "error": str(e),
+                    "available_at": datetime.utcnow() + timedelta(seconds=delay),
+                    "lease_owner": None
+                }
+            else:
+                changes = {
+                    "status": JOB_FAILED,
+                    "current_step": JOB_FAILED,
+                    "error": str(e),
+                    "lease_owner": None
+                }
+            updated = await self.store.update(
+                job["_id"],
+                worker_id,
+                changes,
+                push_progress={"message": changes["current_step"], "at": datetime.utcnow(), "error": str(e)}
+            )
+            if updated and changes["status"] == JOB_FAILED:
+                await self._finish(job)
+        finally:
+            renewer.cancel()
+
+    async def _finish(self, job: dict):
+        finalizer = self.finalizers.get(job["type"])
+        if finalizer is None:
+            return
+        try:
+            await finalizer(job)
+        except Exception as e:
+            logger.error(f"Error finalizing job {job['_id']} ({job['type']}): {str(e)}")
+
+    async def _renew_lease(self, job_id: ObjectId, worker_id: str):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await self.store.update(
+                job_id,
+                worker_id,
+                {"lease_expires_at": datetime.utcnow() + timedelta(seconds=self.lease_seconds)}
+            )
+
+
+def create_job_store(db):
+    """Build the job store selected by JOB_STORE"""
+    if config['JOB_STORE'] == "memory":
+        return InMemoryJobStore()
+    return MongoJobStore(db)
+
+
+# Process-wide queue; workers are started on application startup
+job_queue = JobQueue()
@@ -1,10 +1,19 @@
 # services/llm_service.py
-from openai import OpenAI
-
-client = OpenAI(api_key=config['OPENAI_API_KEY'])
+from openai import AsyncOpenAI
 import json
 from typing import Dict, Any, List
 from config import config
+from services.prompt_budget import (
+    prompt_budgets, token_usage, field_completion_tokens, description_completion_tokens
+)
+from services.rate_limiter import openai_rate_limiter
+from utils.prompts import get_prompt_for_product_data_description
+
+# Retries are handled by the shared rate limiter, not the SDK
+client = AsyncOpenAI(api_key=config['OPENAI_API_KEY'], max_retries=0)
+
+# The images API default, named so its calls share that model's limits
+IMAGE_MODEL = "dall-e-2"
 
 class LLMService:
     """
@@ -18,8 +27,49 @@ class LLMService:
         self.model_name = config['MODEL_NAME']
         self.max_tokens = config['MAX_TOKENS']
         self.temperature = config['TEMPERATURE']
+        self.budget = prompt_budgets.for_model(self.model_name)
+
+    def _prompt(self, system_message: str, build, product_data: Dict[str, Any]) -> str:
+        """
+        Build a prompt from product data, trimming oversized fields to fit the prompt budget
+        """
+        return self.budget.fit(system_message, build, product_data)
 
-    def generate_product_description(self, product_data: Dict[str, Any], style: Dict[str, Any]) -> Dict[str, Any]:
+    async def _chat(self, system_message: str, prompt: str, kind: str = "completion", max_tokens: int = None) -> str:
+        """
+        Call the chat completions API under the rate limiter shared with OpenAIService
+
+        `max_tokens` (default MAX_TOKENS) is clamped to the room left in the context window.
+        """
+        prompt_tokens = self.budget.count_chat(system_message, prompt)
+        max_tokens = self.budget.completion_tokens(prompt_tokens, max_tokens or self.max_tokens)
+        raw = await openai_rate_limiter.call(
+            self.model_name,
+            prompt_tokens + max_tokens,
+            lambda: client.chat.completions.with_raw_response.create(
+                model=self.model_name,
+                messages=[
+                    {"role": "system", "content": system_message},
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=max_tokens,
+                temperature=self.temperature
+            )
+        )
+        response = raw.parse()
+        choice = response.choices[0]
+        usage = response.usage
+        token_usage.record(
+            self.model_name,
+            kind,
+            prompt_tokens,
+            usage.prompt_tokens if usage else None,
+            usage.completion_tokens if usage else self.budget.count(choice.message.content or ""),
+            truncated=choice.finish_reason == "length"
+        )
+        return choice.message.content
+
+    async def generate_product_description(self, product_data: Dict[str, Any], style: Dict[str, Any]) -> Dict[str, Any]:
         """
         Generate a compelling product description based on product data and style preferences
         
@@ -31,20 +81,15 @@ class LLMService:
         - dict: Generated product description content
         """
         # Create a prompt for the LLM
-        prompt = self._create_product_description_prompt(product_data, style)
+        system_message = "You are an expert eCommerce copywriter who creates compelling product descriptions."
+        prompt = self._prompt(system_message, lambda data: self._create_product_description_prompt(data, style), product_data)
 
         # Call the LLM API
         try:
-            response = client.chat.completions.create(model=self.model_name,
-            messages=[
-                {"role": "system", "content": "You are an expert eCommerce copywriter who creates compelling product descriptions."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=self.max_tokens,
-            temperature=self.temperature)
+            content = await self._chat(system_message, prompt, "product_description", description_completion_tokens(style))
 
             # Parse the LLM response to extract the generated description
-            description = response.choices[0].message.content.strip()
+            description = content.strip()
 
             return {
                 "detailed_description": description
@@ -55,7 +100,7 @@ class LLMService:
             print(f"Error calling LLM API: {str(e)}")
             raise Exception(f"Failed to generate product description: {str(e)}")
 
-    def generate_seo_content(self, product_data: Dict[str, Any], style: Dict[str, Any]) -> Dict[str, Any]:
+    async def generate_seo_content(self, product_data: Dict[str, Any], style: Dict[str, Any]) -> Dict[str, Any]:
         """
         Generate SEO-optimized title and meta description
         
@@ -67,26 +112,24 @@ class LLMService:
         - dict: Generated SEO content
         """
         # Create a prompt for the LLM
-        prompt = self._create_seo_content_prompt(product_data, style)
+        system_message = "You are an SEO expert who creates optimized product titles and meta descriptions."
+        prompt = self._prompt(system_message, lambda data: self._create_seo_content_prompt(data, style), product_data)
 
         # Call the LLM API
         try:
-            response = client.chat.completions.create(model=self.model_name,
-            messages=[
-                {"role": "system", "content": "You are an SEO expert who creates optimized product titles and meta descriptions."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=self.max_tokens,
-            temperature=self.temperature)
+            content = await self._chat(
+                system_message, prompt, "seo",
+                field_completion_tokens("seo_title") + field_completion_tokens("seo_description")
+            )
 
             # Parse the LLM response to extract SEO content
-            return self._parse_seo_response(response.choices[0].message.content)
+            return self._parse_seo_response(content)
 
         except Exception as e:
             print(f"Error calling LLM API: {str(e)}")
             raise Exception(f"Failed to generate SEO content: {str(e)}")
 
-    def generate_marketing_email(self, product_data: Dict[str, Any], style: Dict[str, Any]) -> Dict[str, Any]:
+    async def generate_marketing_email(self, product_data: Dict[str, Any], style: Dict[str, Any]) -> Dict[str, Any]:
         """
         Generate marketing email content for the product
         
@@ -98,20 +141,15 @@ class LLMService:
         - dict: Generated marketing email content
         """
         # Create a prompt for the LLM
-        prompt = self._create_marketing_email_prompt(product_data, style)
+        system_message = "You are an email marketing specialist who creates compelling product-focused emails."
+        prompt = self._prompt(system_message, lambda data: self._create_marketing_email_prompt(data, style), product_data)
 
         # Call the LLM API
         try:
-            response = client.chat.completions.create(model=self.model_name,
-            messages=[
-                {"role": "system", "content": "You are an email marketing specialist who creates compelling product-focused emails."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=self.max_tokens,
-            temperature=self.temperature)
+            content = await self._chat(system_message, prompt, "marketing_copy.email", field_completion_tokens("marketing_copy.email"))
 
             # Parse the LLM response to extract email content
-            email_content = response.choices[0].message.content.strip()
+            email_content = content.strip()
 
             return {
                 "subject": self._extract_email_subject(email_content),
@@ -122,7 +160,7 @@ class LLMService:
             print(f"Error calling LLM API: {str(e)}")
             raise Exception(f"Failed to generate marketing email: {str(e)}")
 
-    def generate_social_media_content(self, product_data: Dict[str, Any], style: Dict[str, Any], platforms: Dict[str, bool]) -> Dict[str, Any]:
+    async def generate_social_media_content(self, product_data: Dict[str, Any], style: Dict[str, Any], platforms: Dict[str, bool]) -> Dict[str, Any]:
         """
         Generate social media posts for different platforms
         
@@ -135,26 +173,24 @@ class LLMService:
         - dict: Generated social media content for each platform
         """
         # Create a prompt for the LLM
-        prompt = self._create_social_media_prompt(product_data, style, platforms)
+        system_message = "You are a social media manager who creates engaging product posts."
+        prompt = self._prompt(system_message, lambda data: self._create_social_media_prompt(data, style, platforms), product_data)
 
         # Call the LLM API
         try:
-            response = client.chat.completions.create(model=self.model_name,
-            messages=[
-                {"role": "system", "content": "You are a social media manager who creates engaging product posts."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=self.max_tokens,
-            temperature=self.temperature)
+            content = await self._chat(
+                system_message, prompt, "marketing_copy.social_media",
+                sum(field_completion_tokens(f"marketing_copy.social_media.{platform}") for platform, enabled in platforms.items() if enabled)
+            )
 
             # Parse the LLM response to extract social media content
-            return self._parse_social_media_response(response.choices[0].message.content, platforms)
+            return self._parse_social_media_response(content, platforms)
 
         except Exception as e:
             print(f"Error calling LLM API: {str(e)}")
             raise Exception(f"Failed to generate social media content: {str(e)}")
 
-    def generate_missing_fields(self, product_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def generate_missing_fields(self, product_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Generate missing fields for a product
         
@@ -165,26 +201,21 @@ class LLMService:
         - dict: Generated missing fields
         """
         # Create a prompt for the LLM
-        prompt = self._create_missing_fields_prompt(product_data)
+        system_message = "You are a product data specialist who completes missing product information accurately."
+        prompt = self._prompt(system_message, self._create_missing_fields_prompt, product_data)
 
         # Call the LLM API
         try:
-            response = client.chat.completions.create(model=self.model_name,
-            messages=[
-                {"role": "system", "content": "You are a product data specialist who completes missing product information accurately."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=self.max_tokens,
-            temperature=self.temperature)
+            content = await self._chat(system_message, prompt, "missing_fields")
 
             # Parse the LLM response to extract missing fields
-            return self._parse_missing_fields_response(response.choices[0].message.content, product_data)
+            return self._parse_missing_fields_response(content, product_data)
 
         except Exception as e:
             print(f"Error calling LLM API: {str(e)}")
             raise Exception(f"Failed to generate missing fields: {str(e)}")
 
-    def complete_product(self, product_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def complete_product(self, product_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Generate all content for a product including missing fields and content
         
@@ -195,25 +226,25 @@ class LLMService:
         - dict: Complete product with all generated content
         """
         # First, generate any missing basic fields
-        missing_fields = self.generate_missing_fields(product_data)
+        missing_fields = await self.generate_missing_fields(product_data)
 
         # Create a merged product with original data and generated missing fields
         merged_product = {**product_data, **missing_fields}
 
         # Then generate content fields if they're missing
         if not merged_product.get("detailed_description"):
-            description = self.generate_product_description(merged_product, {"tone": "professional", "length": "medium"})
+            description = await self.generate_product_description(merged_product, {"tone": "professional", "length": "medium"})
             merged_product["detailed_description"] = description.get("detailed_description", "")
 
         if not merged_product.get("seo_title") or not merged_product.get("seo_description"):
-            seo_content = self.generate_seo_content(merged_product, {"tone": "professional"})
+            seo_content = await self.generate_seo_content(merged_product, {"tone": "professional"})
             if not merged_product.get("seo_title"):
                 merged_product["seo_title"] = seo_content.get("title", "")
             if not merged_product.get("seo_description"):
                 merged_product["seo_description"] = seo_content.get("description", "")
 
         if not merged_product.get("marketing_copy", {}).get("email"):
-            email = self.generate_marketing_email(merged_product, {"tone": "enthusiastic", "length": "medium"})
+            email = await self.generate_marketing_email(merged_product, {"tone": "enthusiastic", "length": "medium"})
             if not merged_product.get("marketing_copy"):
                 merged_product["marketing_copy"] = {}
             merged_product["marketing_copy"]["email"] = {
@@ -222,7 +253,7 @@ class LLMService:
             }
 
         if not merged_product.get("marketing_copy", {}).get("social_media"):
-            social_media = self.generate_social_media_content(
+            social_media = await self.generate_social_media_content(
                 merged_product, 
                 {"tone": "casual", "length": "short"},
                 {"instagram": True, "facebook": True, "twitter": True}
@@ -233,7 +264,7 @@ class LLMService:
 
         return merged_product
 
-    def generate_product_image(self, product_data: Dict[str, Any], style: Dict[str, Any] = None) -> Dict[str, Any]:
+    async def generate_product_image(self, product_data: Dict[str, Any], style: Dict[str, Any] = None) -> Dict[str, Any]:
         """
         Generate a product image based on product attributes
         
@@ -249,9 +280,17 @@ class LLMService:
 
         try:
             # Call the OpenAI DALL-E API to generate the image
-            response = client.images.generate(prompt=prompt,
-            n=1,
-            size="1024x1024")
+            raw = await openai_rate_limiter.call(
+                IMAGE_MODEL,
+                0,
+                lambda: client.images.with_raw_response.generate(
+                    model=IMAGE_MODEL,
+                    prompt=prompt,
+                    n=1,
+                    size="1024x1024"
+                )
+            )
+            response = raw.parse()
 
             # Extract the URL from the response
             image_url = response.data[0].url
@@ -280,83 +319,7 @@ class LLMService:
         Returns:
         - str: Prompt for the LLM
         """
-        # Implementation example - detailed prompt crafting
-        prompt = f"Create a compelling product description for the following e-commerce product:\n\n"
-
-        # Essential product information
-        prompt += f"PRODUCT: {product_data.get('name', '')}\n"
-        prompt += f"BRAND: {product_data.get('brand', '')}\n"
-        prompt += f"PRICE: ${product_data.get('price', '')}\n"
-
-        # Add category information
-        if product_data.get('category'):
-            prompt += f"CATEGORY: {product_data['category']}"
-            if product_data.get('subcategory'):
-                prompt += f" > {product_data['subcategory']}"
-            prompt += "\n"
-
-        # Add product features with emphasis
-        if product_data.get('features'):
-            prompt += "\nKEY FEATURES:\n"
-            for feature in product_data['features']:
-                prompt += f"• {feature}\n"
-
-        # Add materials information
-        if product_data.get('materials') and len(product_data.get('materials', [])) > 0:
-            prompt += "\nMATERIALS:\n"
-            for material in product_data['materials']:
-                prompt += f"• {material}\n"
-
-        # Add color options
-        if product_data.get('colors') and len(product_data.get('colors', [])) > 0:
-            prompt += f"\nAVAILABLE COLORS: {', '.join(product_data['colors'])}\n"
-
-        # Add existing basic description if available
-        if product_data.get('basic_description'):
-            prompt += f"\nBASIC PRODUCT INFO: {product_data['basic_description']}\n"
-
-        # Add target keywords if available
-        if product_data.get('tags'):
-            prompt += f"\nTARGET KEYWORDS: {', '.join(product_data['tags'])}\n"
-
-        # Style and tone instructions
-        prompt += f"\n--- WRITING INSTRUCTIONS ---\n"
-        prompt += f"TONE: {style.get('tone', 'professional')}\n"
-
-        # Length guidance based on style preference
-        if style.get('length') == 'short':
-            prompt += "LENGTH: Concise, approximately 75-100 words\n"
-        elif style.get('length') == 'long':
-            prompt += "LENGTH: Detailed, approximately 200-250 words\n"
-        else:  # medium is default
-            prompt += "LENGTH: Balanced, approximately 150-175 words\n"
-
-        # Target audience customization
-        prompt += f"TARGET AUDIENCE: {style.get('audience', 'general consumers')}\n"
-
-        # Structure guidance
-        prompt += "\nSTRUCTURE:\n"
-        prompt += "1. Start with an attention-grabbing opening that highlights a key benefit\n"
-        prompt += "2. Describe what the product is and its primary use cases\n"
-        prompt += "3. Highlight 3-4 key features and their benefits to the user\n"
-        prompt += "4. Include relevant details about quality, materials, or design\n"
-        prompt += "5. End with a concise call-to-action or value proposition\n"
-
-        # Additional writing guidance
-        prompt += "\nADDITIONAL GUIDELINES:\n"
-        prompt += "• Use active voice and present tense\n"
-        prompt += "• Focus on benefits, not just features\n"
-        prompt += "• Create vivid, sensory language where appropriate\n"
-        prompt += "• Avoid clichés and generic marketing language\n"
-
-        # Keyword integration
-        if style.get('keywords'):
-            prompt += f"\nPlease naturally incorporate these keywords: {', '.join(style['keywords'])}\n"
-
-        # Final output formatting instructions
-        prompt += "\nProvide the product description as a cohesive, ready-to-use text without headings or bullet points unless they enhance readability. Don't include any disclaimers or explanations about the content."
-
-        return prompt
+        return get_prompt_for_product_data_description(product_data, style)
 
     def _create_seo_content_prompt(self, product_data: Dict[str, Any], style: Dict[str, Any]) -> str:
         """
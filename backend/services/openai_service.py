@@ -1,31 +1,182 @@
 from openai import AsyncOpenAI
 from models.product import Product
 import os
-from typing import Dict, Any
-from utils.prompts import get_prompt_for_field, get_prompt_for_basic_product, get_prompt_for_product_description, get_prompt_for_image_generation
+from typing import Dict, Any, Awaitable, Callable, List, Optional
+from pydantic import TypeAdapter, ValidationError
+from utils.prompts import get_prompt_for_field, get_prompt_for_basic_product, get_prompt_for_product_description, get_prompt_for_image_generation, get_prompt_for_missing_fields, MISSING_FIELD_INSTRUCTIONS
 import logging
 from pymongo.database import Database
 from utils.converter import convert_objectid_to_str, remove_invalid_unicode
+from services.completion_cache import completion_cache, make_cache_key
+from services.concurrency import generation_limiter
+from services.image_service import ImageService, incoming_temp_path
+from services.product_writes import save_generated_fields
+from services.rate_limiter import openai_rate_limiter
+from services.prompt_budget import (
+    prompt_budgets, token_usage, field_completion_tokens, missing_fields_completion_tokens,
+    description_completion_tokens, BASIC_PRODUCT_COMPLETION_TOKENS
+)
+from config import config
 import re
-import requests
 import uuid
 import asyncio
-from openai import OpenAI
-from openai import OpenAI
+import base64
+import json
+import aiofiles
+import httpx
 
-client = OpenAI()
+logger = logging.getLogger(__name__)
 
-client = OpenAI()
+# Fields that can be generated, in the order they are requested from the model
+GENERATABLE_FIELDS = list(MISSING_FIELD_INSTRUCTIONS.keys())
+LIST_FIELDS = {"features", "materials", "colors", "tags"}
+
+CHAT_MODEL = "gpt-4o-mini-2024-07-18"
+
+FIELD_SYSTEM_MESSAGE = "You are a product content generation expert."
+MISSING_FIELDS_SYSTEM_MESSAGE = "You are a product content generation expert. You always respond with valid JSON."
+BASIC_PRODUCT_SYSTEM_MESSAGE = "You are a professional product content writer and SEO expert."
+DESCRIPTION_SYSTEM_MESSAGE = "You are a professional product description writer."
+
+# Fields parsed out of the single basic product completion
+BASIC_PRODUCT_FIELDS = ["seo_title", "seo_description", "features", "materials", "colors", "tags", "basic_description"]
+
+_download_client: Optional[httpx.AsyncClient] = None
 
-logger = logging.getLogger(__name__)
+
+def get_download_client() -> httpx.AsyncClient:
+    """Pooled HTTP client for fetching generated images, shared across requests"""
+    global _download_client
+    if _download_client is None or _download_client.is_closed:
+        _download_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(config['IMAGE_DOWNLOAD_TIMEOUT_SECONDS'], connect=10.0),
+            limits=httpx.Limits(max_connections=config['IMAGE_DOWNLOAD_MAX_CONNECTIONS']),
+            follow_redirects=True
+        )
+    return _download_client
+
+
+async def close_download_client():
+    global _download_client
+    if _download_client is not None:
+        await _download_client.aclose()
+        _download_client = None
 
 class OpenAIService:
     def __init__(self):
-        self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.model = "gpt-4o-mini-2024-07-18"
+        # Retries are handled by the shared rate limiter, not the SDK
+        self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+        self.model = CHAT_MODEL
         self.image_model = os.getenv("IMAGE_GEN_MODEL", "dall-e-3")
+        self.image_response_format = config['IMAGE_RESPONSE_FORMAT']
         self.upload_folder = os.path.join(os.getcwd(), "uploads", "images")
         self.base_url = os.getenv("BASE_URL", "http://localhost:8000")
+        self.cache = completion_cache
+        self.limiter = generation_limiter
+        self.rate_limiter = openai_rate_limiter
+        self.budget = prompt_budgets.for_model(self.model)
+
+    async def _complete(self, system_message: str, prompt: str, temperature: float, max_tokens: int, use_cache: bool = True, response_format: Optional[dict] = None, kind: str = "completion") -> str:
+        """
+        Run a chat completion, serving byte-identical requests from the completion cache.
+
+        `max_tokens` is the allowance for this kind of call; it is clamped to
+        the configured cap and the room left in the context window.
+        """
+        prompt_tokens = self.budget.count_chat(system_message, prompt)
+        max_tokens = self.budget.completion_tokens(prompt_tokens, max_tokens)
+        key = make_cache_key(self.model, system_message, prompt, temperature, max_tokens, response_format)
+        if use_cache:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                token_usage.record_cached(self.model, kind)
+                return cached
+
+        request = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+        if response_format:
+            request["response_format"] = response_format
+        raw = await self.rate_limiter.call(
+            self.model,
+            prompt_tokens + max_tokens,
+            lambda: self.client.chat.completions.with_raw_response.create(**request)
+        )
+        response = raw.parse()
+        choice = response.choices[0]
+        content = choice.message.content
+        self._record_usage(kind, prompt_tokens, response.usage, content, choice.finish_reason)
+
+        # Bypassed requests still refresh the cache with the newest completion
+        await self.cache.set(key, content)
+        return content
+
+    def _record_usage(self, kind: str, prompt_tokens: int, usage, content: Optional[str], finish_reason: Optional[str]):
+        token_usage.record(
+            self.model,
+            kind,
+            prompt_tokens,
+            usage.prompt_tokens if usage else None,
+            usage.completion_tokens if usage else self.budget.count(content or ""),
+            truncated=finish_reason == "length"
+        )
+
+    async def _stream_complete(self, system_message: str, prompt: str, temperature: float, max_tokens: int, use_cache: bool = True, kind: str = "completion"):
+        """Stream a chat completion as text deltas; the full text is cached once the stream finishes."""
+        prompt_tokens = self.budget.count_chat(system_message, prompt)
+        max_tokens = self.budget.completion_tokens(prompt_tokens, max_tokens)
+        key = make_cache_key(self.model, system_message, prompt, temperature, max_tokens)
+        if use_cache:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                token_usage.record_cached(self.model, kind)
+                yield cached
+                return
+
+        raw = await self.rate_limiter.call(
+            self.model,
+            prompt_tokens + max_tokens,
+            lambda: self.client.chat.completions.with_raw_response.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": system_message},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                # The last chunk then carries the token usage of the whole stream
+                stream_options={"include_usage": True}
+            )
+        )
+        stream = raw.parse()
+        chunks = []
+        usage = None
+        finish_reason = None
+        try:
+            async for chunk in stream:
+                if chunk.usage:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    chunks.append(delta)
+                    yield delta
+        finally:
+            # Closing early (client disconnect) releases the upstream HTTP connection
+            await stream.close()
+
+        content = "".join(chunks)
+        self._record_usage(kind, prompt_tokens, usage, content, finish_reason)
+        await self.cache.set(key, content)
 
     def _parse_list(self, section: str) -> list:
         """Parse a section into a clean list of items."""
@@ -35,49 +186,63 @@ class OpenAIService:
         section = re.sub(r"\*\*.*?\*\*", "", section).strip()
         return [item.strip() for item in section.split(",") if item.strip()]
 
-    async def generate_content(self, product: Product, db, product_id: str, description_options: dict, image_options: dict) -> Dict[str, Any]:
+    async def generate_content(self, product: Product, db, product_id: str, description_options: dict, image_options: dict, use_cache: bool = True, on_progress: Optional[Callable[[List[str]], Awaitable[None]]] = None) -> Dict[str, Any]:
+        """
+        Generate SEO and marketing content for a product.
+
+        `on_progress` is awaited with the fields each completion produces as
+        soon as that completion returns.
+        """
+        async def reporting(task, fields: List[str]):
+            result = await task
+            if on_progress is not None:
+                await on_progress(fields)
+            return result
+
         try:
-            """Generate SEO and marketing content for a product."""
-            basic_prompt = get_prompt_for_basic_product(product)
-            description_prompt = get_prompt_for_product_description(product, style={"tone": description_options["tone"], "length": description_options["length"], "audience": description_options["audience"]})
+            basic_prompt = self.budget.fit(BASIC_PRODUCT_SYSTEM_MESSAGE, get_prompt_for_basic_product, product)
+            description_style = {"tone": description_options["tone"], "length": description_options["length"], "audience": description_options["audience"]}
+            description_prompt = self.budget.fit(
+                DESCRIPTION_SYSTEM_MESSAGE,
+                lambda trimmed: get_prompt_for_product_description(trimmed, style=description_style),
+                product
+            )
             if os.getenv("GEN_PROD_IMAGE_ALONG_WITH_DESC", "false").lower() == "true":
                 image_generation_prompt = get_prompt_for_image_generation(product, style={"background": image_options["background"], "lighting": image_options["lighting"], "angle": image_options["angle"]})
 
             logger.info(f"Detailed description prompt: {description_prompt}")
-            general_task = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a professional product content writer and SEO expert."},
-                    {"role": "user", "content": basic_prompt}
-                ],
+            general_task = reporting(self._complete(
+                BASIC_PRODUCT_SYSTEM_MESSAGE,
+                basic_prompt,
                 temperature=0.7,
-                max_tokens=2000
-            )
+                max_tokens=BASIC_PRODUCT_COMPLETION_TOKENS,
+                use_cache=use_cache,
+                kind="basic_product"
+            ), BASIC_PRODUCT_FIELDS)
 
-            description_task = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a professional product description writer."},
-                    {"role": "user", "content": description_prompt}
-                ],
+            description_task = reporting(self._complete(
+                DESCRIPTION_SYSTEM_MESSAGE,
+                description_prompt,
                 temperature=0.7,
-                max_tokens=1000
-            )
+                max_tokens=description_completion_tokens(description_style),
+                use_cache=use_cache,
+                kind="product_description"
+            ), ["detailed_description"])
 
             if os.getenv("GEN_PROD_IMAGE_ALONG_WITH_DESC", "false").lower() == "true":
-                product_image_task = asyncio.to_thread(self.generate_image, image_generation_prompt)
+                product_image_task = reporting(self.generate_image(image_generation_prompt), ["image_url"])
                 general_response, description_response, product_image_response = await asyncio.gather(general_task, description_task, product_image_task)
             else:
                 general_response, description_response = await asyncio.gather(general_task, description_task)
-                product_image_response = ""
+                product_image_response = None
 
-            general_content = general_response.choices[0].message.content
+            general_content = general_response
             general_content = re.sub(r"\*\*\d+\.\*\*", "", general_content).strip()
             sections = general_content.split("\n\n")
 
 
             # Parse the product description response
-            product_description = description_response.choices[0].message.content.strip()
+            product_description = description_response.strip()
 
             # Map the parsed content to product fields
             generated_data = {
@@ -89,14 +254,13 @@ class OpenAIService:
                 "tags": self._parse_list(sections[5]) if len(sections) > 5 else [],
                 "basic_description": sections[6].strip() if len(sections) > 6 else "",
                 "detailed_description": product_description,
-                "image_url": product_image_response,
             }
+            # Without a generated image the product keeps the one it has
+            if product_image_response:
+                generated_data["image_url"] = product_image_response
 
             # Update the product in the database
-            await db.products.update_one(
-                {"_id": product_id},
-                {"$set": generated_data}
-            )
+            await save_generated_fields(db, ImageService(), product_id, generated_data)
 
             logger.info(f"Generated content stored successfully for product: {product.name}")
             return generated_data
@@ -104,13 +268,166 @@ class OpenAIService:
             logger.error(f"Error generating content for product: {str(e)}")
             raise ValueError(f"Error generating content: {str(e)}")
 
+    def get_missing_fields(self, product: Product) -> List[str]:
+        """Return the generatable fields that are empty on the product."""
+        missing = []
+        for field in GENERATABLE_FIELDS:
+            if field == "marketing_copy.email":
+                value = product.marketing_copy.email
+            elif field.startswith("marketing_copy.social_media."):
+                value = product.marketing_copy.social_media.get(field.rsplit(".", 1)[1])
+            else:
+                value = getattr(product, field)
+            if not value:
+                missing.append(field)
+        return missing
+
+    def _validate_field(self, field: str, value: Any) -> Any:
+        """Validate a generated value against the Product model's type for the field."""
+        if field.startswith("marketing_copy."):
+            annotation = str
+        else:
+            annotation = Product.model_fields[field].annotation
+        validated = TypeAdapter(annotation).validate_python(value, strict=True)
+        if field in LIST_FIELDS:
+            validated = [item.strip() for item in validated if item.strip()]
+        elif isinstance(validated, str):
+            validated = validated.strip()
+        if not validated:
+            raise ValueError(f"Generated value for '{field}' is empty")
+        return validated
+
+    def coerce_field_value(self, field: str, content: str) -> Any:
+        """Convert a free-text completion for a single field into the stored type."""
+        if field in LIST_FIELDS:
+            separator = "\n" if "\n" in content else ","
+            return [
+                re.sub(r"^\s*(?:[-*•]|\d+[.)])\s*", "", item).strip()
+                for item in content.split(separator) if item.strip()
+            ]
+        if field == "marketing_copy.email":
+            return remove_invalid_unicode(content)
+        return content
+
+    async def generate_all_missing_fields(self, product: Product, fields: Optional[List[str]] = None, use_cache: bool = True) -> Dict[str, Any]:
+        """
+        Generate every missing field with a single structured-output call.
+
+        Returns a dict keyed by (dotted) field path, ready to be used in a
+        Mongo ``$set``. Keys the model omitted or returned with the wrong type
+        are regenerated individually.
+        """
+        generated, errors = await self.complete_missing_fields(product, fields, use_cache=use_cache)
+        if errors:
+            raise ValueError(f"Error generating fields: {errors}")
+        return generated
+
+    async def complete_missing_fields(self, product: Product, fields: Optional[List[str]] = None, use_cache: bool = True, user_id: Optional[str] = None, on_progress: Optional[Callable[[List[str]], Awaitable[None]]] = None):
+        """
+        The work of generate_all_missing_fields, keeping partial results.
+
+        Returns ``(generated, errors)`` like generate_fields. `on_progress` is
+        awaited with the fields the structured call produced, then with each
+        field the per-field fallback produces as it finishes.
+        """
+        fields = fields if fields is not None else self.get_missing_fields(product)
+        if not fields:
+            return {}, {}
+
+        generated = {}
+        try:
+            prompt = self.budget.fit(
+                MISSING_FIELDS_SYSTEM_MESSAGE,
+                lambda trimmed: get_prompt_for_missing_fields(trimmed, fields),
+                product
+            )
+            response = await self._complete(
+                MISSING_FIELDS_SYSTEM_MESSAGE,
+                prompt,
+                temperature=0.7,
+                max_tokens=missing_fields_completion_tokens(fields),
+                use_cache=use_cache,
+                response_format={"type": "json_object"},
+                kind="missing_fields"
+            )
+            data = json.loads(response)
+            if not isinstance(data, dict):
+                raise ValueError("Expected a JSON object")
+        except (ValueError, json.JSONDecodeError) as e:
+            logger.warning(f"Structured generation failed, falling back to per-field generation: {str(e)}")
+            data = {}
+
+        failed = []
+        for field in fields:
+            try:
+                generated[field] = self._validate_field(field, data.get(field))
+            except (ValidationError, ValueError):
+                failed.append(field)
+        if generated and on_progress is not None:
+            await on_progress(list(generated))
+
+        errors = {}
+        if failed:
+            logger.info(f"Falling back to per-field generation for: {failed}")
+            async for field, value, error in self.iter_fields(product, failed, user_id=user_id, use_cache=use_cache):
+                if error is None:
+                    generated[field] = value
+                    if on_progress is not None:
+                        await on_progress([field])
+                else:
+                    errors[field] = error
+
+        return generated, errors
+
+    async def _generate_field_task(self, product: Product, field: str, image_options: dict, user_id: Optional[str], use_cache: bool):
+        try:
+            async with self.limiter.slot(user_id):
+                content = await self.generate_missing_field(product, field, image_options, use_cache=use_cache)
+            return field, self.coerce_field_value(field, content), None
+        except Exception as e:
+            logger.error(f"Error generating field '{field}': {str(e)}")
+            return field, None, str(e)
+
+    async def iter_fields(self, product: Product, fields: List[str], image_options: Optional[dict] = None, user_id: Optional[str] = None, use_cache: bool = True):
+        """
+        Generate independent fields concurrently, yielding ``(field, value, error)``
+        as each one completes.
+        """
+        tasks = [
+            asyncio.create_task(self._generate_field_task(product, field, image_options or {}, user_id, use_cache))
+            for field in fields
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Abandoned iteration (e.g. client disconnect) must not leak running calls
+            for task in tasks:
+                task.cancel()
+
+    async def generate_fields(self, product: Product, fields: List[str], image_options: Optional[dict] = None, user_id: Optional[str] = None, use_cache: bool = True):
+        """
+        Generate independent fields concurrently under the global and per-user limits.
+
+        Returns ``(generated, errors)`` where ``generated`` maps each successful
+        field to its value and ``errors`` maps each failed field to a message.
+        """
+        generated = {}
+        errors = {}
+        async for field, value, error in self.iter_fields(product, fields, image_options, user_id, use_cache):
+            if error is None:
+                generated[field] = value
+            else:
+                errors[field] = error
+        return generated, errors
+
     async def generate_missing_fields(self, product: Product, field: str) -> Dict[str, Any]:
         """Generate missing fields for a product."""
         # This method can be similar to complete_product or can be customized
 
         return await self.complete_product(product)
 
-    async def generate_missing_field(self, product: Product, field: str, imageOptions: dict) -> Any:
+    async def generate_missing_field(self, product: Product, field: str, imageOptions: dict, use_cache: bool = True) -> Any:
         """Generate content for a specific field of a product."""
         try:
             if field == "image_url":
@@ -118,21 +435,20 @@ class OpenAIService:
                 return await self.generate_image(prompt)
             # Get the appropriate prompt for the field
             logger.info(f"Generating content for field: {field}")
-            prompt = get_prompt_for_field(product, field)
+            prompt = self.budget.fit(FIELD_SYSTEM_MESSAGE, lambda trimmed: get_prompt_for_field(trimmed, field), product)
 
             # Call the OpenAI API with the prompt
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a product content generation expert."},
-                    {"role": "user", "content": prompt}
-                ],
+            response = await self._complete(
+                FIELD_SYSTEM_MESSAGE,
+                prompt,
                 temperature=0.7,
-                max_tokens=500
+                max_tokens=field_completion_tokens(field),
+                use_cache=use_cache,
+                kind=field
             )
 
             # Extract and return the generated content
-            content = response.choices[0].message.content.strip()
+            content = response.strip()
             if field == "marketing_copy.email":
                 if isinstance(content, str):
                     generate_content = remove_invalid_unicode(content)
@@ -141,13 +457,29 @@ class OpenAIService:
         except Exception as e:
             raise ValueError(f"Error generating content for field '{field}': {str(e)}")
 
-    async def generate_basic_data(self, product: dict, db : Database, product_id : str, description_options: dict, image_options: dict) -> Dict[str, Any]:
+    async def stream_missing_field(self, product: Product, field: str, user_id: Optional[str] = None, use_cache: bool = True):
+        """Stream generated content for a single text field as it is produced."""
+        if field == "image_url":
+            raise ValueError("Field 'image_url' cannot be streamed")
+        prompt = self.budget.fit(FIELD_SYSTEM_MESSAGE, lambda trimmed: get_prompt_for_field(trimmed, field), product)
+        async with self.limiter.slot(user_id):
+            async for delta in self._stream_complete(
+                FIELD_SYSTEM_MESSAGE,
+                prompt,
+                temperature=0.7,
+                max_tokens=field_completion_tokens(field),
+                use_cache=use_cache,
+                kind=field
+            ):
+                yield delta
+
+    async def generate_basic_data(self, product: dict, db : Database, product_id : str, description_options: dict, image_options: dict, use_cache: bool = True, on_progress: Optional[Callable[[List[str]], Awaitable[None]]] = None) -> Dict[str, Any]:
         """Generate basic data for a product and generate product image."""
         try:
             # Convert the product dictionary to a Product object
             product = convert_objectid_to_str(product)
             product_obj = Product(**product)
-            return await self.generate_content(product_obj, db, product_id, description_options, image_options)
+            return await self.generate_content(product_obj, db, product_id, description_options, image_options, use_cache=use_cache, on_progress=on_progress)
         except Exception as e:
             logger.error(f"Error generating basic data: {str(e)}")
             raise ValueError(f"Error generating basic data: {str(e)}")
@@ -156,30 +488,34 @@ class OpenAIService:
         """
         Generate an image based on the given prompt, save it to the uploads/images folder,
         and return the URL for accessing the image.
+
+        With IMAGE_RESPONSE_FORMAT=b64_json the image bytes come back in the API
+        response, skipping the download. Cancelling the caller removes any partial file.
         """
         try:
             # Call OpenAI's image generation API
-            response =  client.images.generate(model=self.image_model,
-            prompt=prompt,
-            n=1,  # Generate one image
-            size="1024x1024")
-
-            # Extract the image URL from the response
-            image_url = response.data[0].url
-
-            # Download the image
-            image_response = requests.get(image_url, stream=True)
-            if image_response.status_code != 200:
-                raise ValueError(f"Failed to download the generated image: {image_response.status_code}")
+            raw = await self.rate_limiter.call(
+                self.image_model,
+                0,
+                lambda: self.client.images.with_raw_response.generate(
+                    model=self.image_model,
+                    prompt=prompt,
+                    n=1,  # Generate one image
+                    size="1024x1024",
+                    response_format=self.image_response_format
+                )
+            )
+            image = raw.parse().data[0]
 
             # Generate a unique filename for the image
             filename = f"{uuid.uuid4().hex}.png"
             file_path = os.path.join(self.upload_folder, filename)
 
             # Save the image to the uploads/images folder
-            with open(file_path, "wb") as image_file:
-                for chunk in image_response.iter_content(1024):
-                    image_file.write(chunk)
+            if self.image_response_format == "b64_json":
+                await self._write_b64_image(image.b64_json, file_path)
+            else:
+                await self._download_image(image.url, file_path)
 
             # Return the URL for accessing the image
             image_access_url = f"{self.base_url}/uploads/images/{filename}"
@@ -187,4 +523,32 @@ class OpenAIService:
 
         except Exception as e:
             logger.error(f"Error generating image: {str(e)}")
-            raise ValueError(f"Error generating image: {str(e)}")
\ No newline at end of file
+            raise ValueError(f"Error generating image: {str(e)}")
+
+    async def _download_image(self, image_url: str, file_path: str):
+        """Stream the generated image to disk; a partial file never becomes visible"""
+        temp_path = incoming_temp_path()
+        try:
+            async with get_download_client().stream("GET", image_url) as image_response:
+                if image_response.status_code != 200:
+                    raise ValueError(f"Failed to download the generated image: {image_response.status_code}")
+                async with aiofiles.open(temp_path, "wb") as image_file:
+                    async for chunk in image_response.aiter_bytes(64 * 1024):
+                        await image_file.write(chunk)
+            os.replace(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    async def _write_b64_image(self, b64_data: str, file_path: str):
+        temp_path = incoming_temp_path()
+        try:
+            image_bytes = await asyncio.to_thread(base64.b64decode, b64_data)
+            async with aiofiles.open(temp_path, "wb") as image_file:
+                await image_file.write(image_bytes)
+            os.replace(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordHasherBusyError(RuntimeError):
+    """Raised when too many hash/verify calls are already queued"""
+
+
+class PasswordHasher:
+    """
+    Run bcrypt hashing and verification on a bounded thread pool
+
+    bcrypt releases the GIL while it works, so threads give real parallelism
+    without pinning the event loop. Calls beyond `workers + max_queue` are
+    rejected instead of piling up behind a login burst.
+    """
+
+    def __init__(self, context: CryptContext, workers: int, max_queue: int):
+        self.context = context
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self.pending = 0
+        self.hashed = 0
+        self.verified = 0
+        self.rehashed = 0
+        self.rejected = 0
+        self.seconds = 0.0
+
+    async def _run(self, func, *args):
+        if self.pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            logger.warning("Password hashing queue full, rejecting call")
+            raise PasswordHasherBusyError("Password hashing queue is full")
+        self.pending += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self.pending -= 1
+            self.seconds += time.perf_counter() - started
+
+    async def hash(self, password: str) -> str:
+        hashed = await self._run(self.context.hash, password)
+        self.hashed += 1
+        return hashed
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verify a password; the second value is a replacement hash when the
+        stored one was made with a different cost than the configured one
+        """
+        valid, new_hash = await self._run(self.context.verify_and_update, password, hashed_password)
+        self.verified += 1
+        if new_hash is not None:
+            self.rehashed += 1
+        return valid, new_hash
+
+    def stats(self) -> dict:
+        calls = self.hashed + self.verified
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "pending": self.pending,
+            "hashed": self.hashed,
+            "verified": self.verified,
+            "rehashed": self.rehashed,
+            "rejected": self.rejected,
+            "avg_ms": round(self.seconds / calls * 1000, 1) if calls else 0.0,
+            "rounds": self.context.to_dict().get("bcrypt__rounds"),
+        }
@@ -0,0 +1,157 @@
+import logging
+from datetime import datetime
+from typing import List, Optional
+
+from bson import ObjectId, errors as bson_errors
+from pydantic import ValidationError
+from pymongo import DeleteOne, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from models.product import BulkProductOperation, Product, ProductCreate, ProductUpdate, versioned_update
+from services.image_service import ImageService
+from services.image_variants import image_variants
+
+logger = logging.getLogger(__name__)
+
+STATUS_BY_OP = {"create": "created", "update": "updated", "delete": "deleted"}
+
+
+def _validate(operation: BulkProductOperation, user_id: ObjectId, now: datetime):
+    """
+    Turn one operation into (product id, write model, image_url it sets),
+    or raise ValueError describing why it is invalid
+    """
+    if operation.op == "create":
+        if operation.product is None:
+            raise ValueError("'product' is required for create")
+        product = Product(user_id=str(user_id), **ProductCreate(**operation.product).model_dump())
+        document = product.to_dict()
+        document["_id"] = ObjectId()
+        document["created_at"] = now
+        document["updated_at"] = now
+        return document["_id"], InsertOne(document), None
+
+    if not operation.id:
+        raise ValueError(f"'id' is required for {operation.op}")
+    try:
+        product_id = ObjectId(operation.id)
+    except bson_errors.InvalidId:
+        raise ValueError("Invalid product ID")
+    ownership = {"_id": product_id, "user_id": user_id}
+    if operation.op == "delete":
+        return product_id, DeleteOne(ownership), None
+
+    if operation.product is None:
+        raise ValueError("'product' is required for update")
+    changes = ProductUpdate(**operation.product).model_dump(exclude_unset=True, exclude_none=True)
+    if not changes:
+        raise ValueError("No fields to update")
+    return product_id, UpdateOne(ownership, versioned_update(changes)), changes.get("image_url")
+
+
+async def execute_bulk(db, user_id: ObjectId, operations: List[BulkProductOperation], ordered: bool = False, image_service: Optional[ImageService] = None) -> List[dict]:
+    """
+    Run a batch of product creates, updates and deletes in one bulk_write
+
+    Every operation is validated up front and scoped to `user_id`. One query
+    finds which of the referenced products the user owns, so updates and
+    deletes of other products are reported as `not_found` without being sent.
+    With `ordered`, execution stops at the first failure and later
+    operations are reported as `skipped`, matching Mongo's ordered semantics.
+    Images are reference counted like in the single-product routes: a new
+    image_url is acquired up front, and replaced or deleted images are
+    released once the writes are done.
+    """
+    image_service = image_service or ImageService()
+    now = datetime.utcnow()
+    results = [{"index": index, "op": operation.op, "id": operation.id} for index, operation in enumerate(operations)]
+    prepared = []
+    image_urls = {}
+    for index, operation in enumerate(operations):
+        try:
+            product_id, write, image_url = _validate(operation, user_id, now)
+        except (ValidationError, ValueError) as e:
+            results[index].update({"status": "invalid", "error": str(e)})
+            continue
+        results[index]["id"] = str(product_id)
+        prepared.append((index, product_id, write))
+        if image_url is not None:
+            image_urls[index] = image_url
+
+    referenced = [product_id for index, product_id, write in prepared if not isinstance(write, InsertOne)]
+    current = {}
+    if referenced:
+        cursor = db.products.find({"_id": {"$in": referenced}, "user_id": user_id}, {"image_url": 1, "image_variants": 1})
+        current = {document["_id"]: document async for document in cursor}
+    owned = set(current)
+
+    writes = []
+    write_indexes = []
+    acquired = set()
+    for index, product_id, write in prepared:
+        if not isinstance(write, InsertOne) and product_id not in owned:
+            results[index].update({"status": "not_found", "error": "Product not found"})
+            continue
+        if index in image_urls:
+            reference = await image_service.acquire_image(db, image_urls[index])
+            if reference is False:
+                results[index].update({"status": "invalid", "error": "image_url refers to an image that no longer exists"})
+                continue
+            if reference:
+                acquired.add(index)
+        if isinstance(write, DeleteOne):
+            # Later operations in the batch cannot touch a product deleted earlier in it
+            owned.discard(product_id)
+        writes.append(write)
+        write_indexes.append(index)
+
+    if ordered:
+        # Stop before the first operation that already failed
+        first_failure = next((result["index"] for result in results if "status" in result), len(results))
+        kept = [position for position, index in enumerate(write_indexes) if index < first_failure]
+        writes = [writes[position] for position in kept]
+        write_indexes = [write_indexes[position] for position in kept]
+
+    failed = {}
+    if writes:
+        try:
+            await db.products.bulk_write(writes, ordered=ordered)
+        except BulkWriteError as e:
+            for error in e.details["writeErrors"]:
+                failed[write_indexes[error["index"]]] = error["errmsg"]
+            logger.error(f"Bulk product write had {len(failed)} errors")
+
+    stop_at = None
+    for position, index in enumerate(write_indexes):
+        if index in failed:
+            results[index].update({"status": "failed", "error": failed[index]})
+            if ordered:
+                stop_at = position
+                break
+        else:
+            results[index]["status"] = STATUS_BY_OP[results[index]["op"]]
+    if stop_at is not None:
+        for index in write_indexes[stop_at + 1:]:
+            results[index]["status"] = "skipped"
+
+    for result in results:
+        result.setdefault("status", "skipped")
+
+    # In operation order, so a product updated twice releases each image it replaced
+    for index, product_id, write in prepared:
+        status = results[index]["status"]
+        if isinstance(write, DeleteOne) and status == "deleted":
+            await _release(db, image_service, current.pop(product_id))
+        elif index in image_urls and status == "updated":
+            await _release(db, image_service, current[product_id])
+            current[product_id] = {"image_url": image_urls[index]}
+            image_variants.schedule(db, product_id, image_urls[index])
+        elif index in acquired:
+            await image_service.release_image(db, image_urls[index])
+    return results
+
+
+async def _release(db, image_service: ImageService, product: dict):
+    if product.get("image_url"):
+        variants = (product.get("image_variants") or {}).get("items", [])
+        await image_service.release_image(db, product["image_url"], [variant["url"] for variant in variants])
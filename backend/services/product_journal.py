@@ -0,0 +1,184 @@
+import atexit
+import json
+import logging
+import os
+import shutil
+import threading
+from typing import Callable, Iterable, Iterator, Optional
+
+from services.product_loader import is_jsonl
+
+logger = logging.getLogger(__name__)
+
+OP_PUT = "put"
+OP_DELETE = "delete"
+
+
+class ProductJournal:
+    """
+    Append-only write-ahead log next to a JSON snapshot of the products
+
+    Each mutation appends one compact JSON line (`put` with the full record,
+    or `delete` with the id), so a write costs the size of the change. Lines
+    are fsynced in batches every `fsync_interval` seconds (0 syncs every
+    append). After `compact_after` entries the log is rotated and the
+    snapshot rewritten in a background thread via write-to-temp-and-rename.
+    On startup the snapshot is loaded and any rotated and current logs are
+    replayed on top; replaying an entry twice is harmless.
+    """
+
+    def __init__(
+        self,
+        snapshot_path: str,
+        lock: threading.RLock,
+        snapshot_source: Callable[[], Iterable[dict]],
+        fsync_interval: float = 1.0,
+        compact_after: int = 10000
+    ):
+        self.snapshot_path = snapshot_path
+        self.wal_path = f"{snapshot_path}.wal"
+        self.compacting_path = f"{snapshot_path}.wal.compacting"
+        # Shared with the owning service so a rotation sees a consistent state
+        self._lock = lock
+        self.snapshot_source = snapshot_source
+        self.fsync_interval = fsync_interval
+        self.compact_after = compact_after
+        self.entries = 0
+        self._file = None
+        self._dirty = False
+        self._compacting = False
+        self._compaction_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sync_thread: Optional[threading.Thread] = None
+
+    def replay(self) -> Iterator[dict]:
+        """Yield logged entries oldest first; a torn final line is skipped"""
+        for path in (self.compacting_path, self.wal_path):
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", encoding="utf-8") as file:
+                for line_number, line in enumerate(file, start=1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning(f"Skipping unreadable journal line {line_number} in {path}")
+                        continue
+                    self.entries += 1
+                    yield entry
+
+    def open(self):
+        self._file = open(self.wal_path, "a", encoding="utf-8")
+        if self._file.tell() and not self._ends_with_newline():
+            # Terminate a torn final line so the next entry starts on its own line
+            self._file.write("\n")
+        if self.fsync_interval > 0:
+            self._sync_thread = threading.Thread(target=self._sync_loop, name="product-wal-sync", daemon=True)
+            self._sync_thread.start()
+        atexit.register(self.close)
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.wal_path, "rb") as file:
+            file.seek(-1, os.SEEK_END)
+            return file.read(1) == b"\n"
+
+    def put(self, product: dict):
+        self._append({"op": OP_PUT, "product": product})
+
+    def delete(self, product_id: str):
+        self._append({"op": OP_DELETE, "id": product_id})
+
+    def _append(self, entry: dict):
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self.entries += 1
+            if self.fsync_interval > 0:
+                self._dirty = True
+            else:
+                self._sync_locked()
+            start_compaction = self.entries >= self.compact_after and not self._compacting
+            if start_compaction:
+                self._compacting = True
+        if start_compaction:
+            threading.Thread(target=self.compact, name="product-wal-compact", daemon=True).start()
+
+    def _sync_locked(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._dirty = False
+
+    def _sync_loop(self):
+        while not self._stop.wait(self.fsync_interval):
+            with self._lock:
+                if self._dirty and self._file is not None:
+                    self._sync_locked()
+
+    def compact(self):
+        """Fold the log into a fresh snapshot"""
+        with self._compaction_lock:
+            self._compact()
+
+    def _compact(self):
+        try:
+            with self._lock:
+                self._compacting = True
+                self._sync_locked()
+                if os.path.exists(self.compacting_path):
+                    # A previous compaction did not finish; keep its entries until the new snapshot is in place
+                    self._file.close()
+                    with open(self.compacting_path, "ab") as target, open(self.wal_path, "rb") as source:
+                        shutil.copyfileobj(source, target)
+                        target.flush()
+                        os.fsync(target.fileno())
+                    self._file = open(self.wal_path, "w", encoding="utf-8")
+                else:
+                    self._file.close()
+                    os.replace(self.wal_path, self.compacting_path)
+                    self._file = open(self.wal_path, "a", encoding="utf-8")
+                records = list(self.snapshot_source())
+                self.entries = 0
+
+            # Serialising the snapshot happens outside the lock; writers only wait for the rotation
+            write_snapshot(self.snapshot_path, records)
+            os.remove(self.compacting_path)
+            logger.info(f"Compacted product journal into {len(records)} records")
+        except Exception as e:
+            logger.error(f"Error compacting product journal: {str(e)}")
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            if self._file is not None and not self._file.closed:
+                self._sync_locked()
+                self._file.close()
+
+
+def write_snapshot(path: str, records: list, indent: Optional[int] = None):
+    """Atomically replace the snapshot file; a crash leaves either the old or the new file"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        if is_jsonl(path):
+            for record in records:
+                file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        elif indent is None:
+            json.dump(records, file, separators=(",", ":"))
+        else:
+            json.dump(records, file, indent=indent)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+    try:
+        directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+    except OSError:
+        # Not every platform can fsync a directory
+        pass
@@ -0,0 +1,151 @@
+import json
+import mmap
+import os
+from collections.abc import MutableMapping
+from typing import Iterator, TextIO
+
+JSONL_SUFFIX = ".jsonl"
+READ_CHUNK_SIZE = 1 << 16
+
+
+def is_jsonl(path: str) -> bool:
+    return path.lower().endswith(JSONL_SUFFIX)
+
+
+def iter_json_array(file: TextIO, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[dict]:
+    """
+    Incrementally parse a top-level JSON array of objects
+
+    Only one chunk plus the record being decoded is held in memory, instead
+    of the whole file text and the fully parsed list at the same time.
+    """
+    # One raw_decode per record loses json's per-document key memo; share one across records
+    keys = {}
+    decoder = json.JSONDecoder(object_pairs_hook=lambda pairs: {keys.setdefault(key, key): value for key, value in pairs})
+    buffer = ""
+    position = 0
+    started = False
+    eof = False
+    while True:
+        # Skip whitespace and separators between elements
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position < len(buffer):
+            if not started:
+                if buffer[position] != "[":
+                    raise ValueError("Product data must be a JSON array")
+                started = True
+                position += 1
+                continue
+            if buffer[position] == "]":
+                return
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                yield record
+                position = end
+                continue
+        elif eof:
+            if started:
+                raise ValueError("Product data ended before the closing bracket")
+            return
+        chunk = file.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+def iter_jsonl(file: TextIO) -> Iterator[dict]:
+    for line in file:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_products(path: str) -> Iterator[dict]:
+    """Stream product records from a JSON array or JSONL file"""
+    with open(path, "r", encoding="utf-8") as file:
+        if is_jsonl(path):
+            yield from iter_jsonl(file)
+        else:
+            yield from iter_json_array(file)
+
+
+def ensure_jsonl(path: str) -> str:
+    """
+    Return a JSONL form of the product file, converting a JSON array into
+    a `<path>.jsonl` sidecar when it is missing or older than the source
+    """
+    if is_jsonl(path):
+        return path
+    sidecar = f"{path}{JSONL_SUFFIX}"
+    if os.path.exists(sidecar) and os.path.getmtime(sidecar) >= os.path.getmtime(path):
+        return sidecar
+    temp_path = f"{sidecar}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        for record in iter_products(path):
+            file.write(json.dumps(record, separators=(",", ":")) + "\n")
+    os.replace(temp_path, sidecar)
+    return sidecar
+
+
+class MappedRecords(MutableMapping):
+    """
+    id -> record mapping backed by a memory-mapped JSONL file
+
+    Only the byte offsets of each line are kept on the heap; a record is
+    decoded from the mapping each time it is read. The mapping is read-only
+    and shared, so several worker processes reuse the same page cache
+    instead of each holding a private copy of the catalogue. Records added
+    or changed after loading live in an in-memory overlay.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        # id -> (start, end) in the mapping, or None once the record is in the overlay
+        self._offsets = {}
+        self._overlay = {}
+
+    def scan(self) -> Iterator[dict]:
+        """Index every line, yielding each decoded record once so callers can build indexes"""
+        start = 0
+        size = len(self._map)
+        while start < size:
+            end = self._map.find(b"\n", start)
+            if end == -1:
+                end = size
+            if end > start:
+                record = json.loads(self._map[start:end])
+                self._offsets[record["id"]] = (start, end)
+                yield record
+            start = end + 1
+
+    def __getitem__(self, product_id):
+        span = self._offsets[product_id]
+        if span is None:
+            return self._overlay[product_id]
+        return json.loads(self._map[span[0]:span[1]])
+
+    def __setitem__(self, product_id, record):
+        # Assigning to an existing key keeps the record's position
+        self._offsets[product_id] = None
+        self._overlay[product_id] = record
+
+    def __delitem__(self, product_id):
+        del self._offsets[product_id]
+        self._overlay.pop(product_id, None)
+
+    def __iter__(self):
+        return iter(self._offsets)
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __contains__(self, product_id):
+        return product_id in self._offsets
@@ -0,0 +1,139 @@
+import base64
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId, json_util
+
+from config import config
+from models.product import Product
+
+# Sort keys accepted by GET /products; each is backed by a (user_id, field, _id) index
+SORT_FIELDS = ("created_at", "updated_at", "name", "price")
+PRODUCT_FIELDS = set(Product.model_fields) - {"id"}
+
+
+class InvalidQueryError(ValueError):
+    """Raised for malformed sort, fields or cursor parameters"""
+
+
+def parse_sort(sort: str) -> Tuple[str, int]:
+    """Parse `field` or `-field` into (field, direction)"""
+    direction = -1 if sort.startswith("-") else 1
+    field = sort.lstrip("-")
+    if field not in SORT_FIELDS:
+        raise InvalidQueryError(f"Cannot sort by '{field}'; expected one of {', '.join(SORT_FIELDS)}")
+    return field, direction
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Parse a comma-separated `fields=` value; None means the full document"""
+    if not fields:
+        return None
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in PRODUCT_FIELDS]
+    if unknown:
+        raise InvalidQueryError(f"Unknown fields: {', '.join(unknown)}")
+    return requested
+
+
+def build_projection(fields: Optional[List[str]], sort_field: str) -> Optional[Dict[str, int]]:
+    if fields is None:
+        return None
+    # The sort field builds the next cursor and the version builds the page ETag
+    return {field: 1 for field in {*fields, sort_field, "version"}}
+
+
+def encode_cursor(document: dict, sort_field: str) -> str:
+    """Opaque cursor holding the last row's sort value and _id"""
+    payload = json_util.dumps([document.get(sort_field), document["_id"]])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, ObjectId]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, last_id = json_util.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        if not isinstance(last_id, ObjectId):
+            raise ValueError("cursor has no _id")
+        return value, last_id
+    except Exception:
+        raise InvalidQueryError("Invalid cursor")
+
+
+def keyset_filter(sort_field: str, direction: int, value: Any, last_id: ObjectId) -> dict:
+    """
+    Match rows strictly after (value, last_id) in (sort_field, _id) order
+
+    Missing or null sort values sort before every other value, so they are
+    handled explicitly rather than relying on type bracketing.
+    """
+    op = "$gt" if direction == 1 else "$lt"
+    if value is None:
+        if direction == 1:
+            return {"$or": [
+                {sort_field: None, "_id": {"$gt": last_id}},
+                {sort_field: {"$ne": None}}
+            ]}
+        return {sort_field: None, "_id": {"$lt": last_id}}
+    after = [
+        {sort_field: {op: value}},
+        {sort_field: value, "_id": {op: last_id}}
+    ]
+    if direction == -1:
+        after.append({sort_field: None})
+    return {"$or": after}
+
+
+async def list_summary(db, user_id: ObjectId) -> dict:
+    """
+    Count, newest updated_at and version total of a user's products
+
+    Every product write bumps updated_at and version and inserts and deletes
+    change the count, so the summary changes whenever any list page could.
+    """
+    summary = await db.products.aggregate([
+        {"$match": {"user_id": user_id}},
+        {"$group": {
+            "_id": None,
+            "count": {"$sum": 1},
+            "updated_at": {"$max": "$updated_at"},
+            "versions": {"$sum": "$version"}
+        }}
+    ]).to_list(length=1)
+    if not summary:
+        return {"count": 0, "updated_at": None, "versions": 0}
+    summary[0].pop("_id")
+    return summary[0]
+
+
+class ProductCountCache:
+    """
+    Short-lived per-user product counts for the `count=true` list mode
+
+    Counting a user's products walks their index entries, which for large
+    catalogues is the most expensive part of a list request; the result is
+    reused for `ttl_seconds` and dropped when the user's products change.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._counts: Dict[ObjectId, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    async def get(self, db, user_id: ObjectId) -> int:
+        with self._lock:
+            cached = self._counts.get(user_id)
+        if cached and time.monotonic() - cached[0] < self.ttl_seconds:
+            return cached[1]
+        count = await db.products.count_documents({"user_id": user_id})
+        with self._lock:
+            self._counts[user_id] = (time.monotonic(), count)
+        return count
+
+    def invalidate(self, user_id: ObjectId):
+        with self._lock:
+            self._counts.pop(user_id, None)
+
+
+product_counts = ProductCountCache(config['PRODUCTS_COUNT_CACHE_TTL_SECONDS'])
@@ -1,113 +1,285 @@
 import json
+import re
+import threading
+from bisect import bisect_left, bisect_right
 from config import config
+from services.product_journal import ProductJournal, OP_PUT, OP_DELETE, write_snapshot
+from services.product_loader import MappedRecords, ensure_jsonl, is_jsonl, iter_products
+
+# Fields with an exact-match hash index
+INDEXED_FIELDS = ('category', 'brand', 'subcategory')
+ID_PATTERN = re.compile(r'^prod(\d+)$')
 
 class ProductService:
     """
     Service to handle product data operations
+
+    Products are held in an id -> record dict with hash indexes on
+    category, brand and subcategory and a sorted price index, so lookups
+    never scan the whole catalogue. Every mutation keeps the indexes in step.
+
+    With PRODUCT_STORE_MODE=journal, mutations are appended to a
+    write-ahead log instead of rewriting DATA_PATH; see ProductJournal.
+
+    PRODUCT_LOAD_MODE picks how DATA_PATH (a JSON array, or JSONL when it
+    ends in .jsonl) is read: `eager` parses it in one go, `stream` parses
+    it record by record, and `mmap` memory-maps a JSONL form and decodes
+    records on demand, keeping only the indexes on the heap.
     """
-    
+
     def __init__(self):
         """
         Initialize the product service with data path from config
         """
         self.data_path = config['DATA_PATH']
-        self.products = self._load_products()
-    
+        self.storage_mode = config['PRODUCT_STORE_MODE']
+        self.load_mode = config['PRODUCT_LOAD_MODE']
+        self._lock = threading.RLock()
+        self.journal = None
+        self.products = {}
+        # field -> value -> {product_id: None}, an insertion-ordered set
+        self._indexes = {field: {} for field in INDEXED_FIELDS}
+        # Parallel sorted lists: prices and the product id at each position
+        self._prices = []
+        self._price_ids = []
+        # id -> price for records indexed during loading, sorted once afterwards
+        self._loaded_prices = {}
+        self._next_id = 1
+        if self.load_mode == 'mmap':
+            self._load_mapped()
+        else:
+            for product in self._load_products():
+                self._insert(product, index_price=False)
+        if self.storage_mode == 'journal':
+            self.journal = ProductJournal(
+                self.data_path,
+                self._lock,
+                self.get_all_products,
+                fsync_interval=config['PRODUCT_WAL_FSYNC_INTERVAL_SECONDS'],
+                compact_after=config['PRODUCT_WAL_COMPACT_AFTER']
+            )
+            for entry in self.journal.replay():
+                self._apply(entry)
+            self.journal.open()
+        self._rebuild_price_index()
+
     def _load_products(self):
         """
         Load products from the JSON data file
         """
+        if self.load_mode == 'stream' or is_jsonl(self.data_path):
+            return self._stream_products()
         try:
             with open(self.data_path, 'r') as file:
                 return json.load(file)
         except Exception as e:
             print(f"Error loading product data: {str(e)}")
             return []
-    
+
+    def _stream_products(self):
+        """
+        Yield products one at a time without materialising the whole file
+        """
+        try:
+            yield from iter_products(self.data_path)
+        except Exception as e:
+            print(f"Error loading product data: {str(e)}")
+
+    def _load_mapped(self):
+        """
+        Index a memory-mapped JSONL copy of the data file; records stay on disk
+        """
+        try:
+            self.products = MappedRecords(ensure_jsonl(self.data_path))
+            for product in self.products.scan():
+                self._index_record(product, index_price=False)
+        except Exception as e:
+            print(f"Error loading product data: {str(e)}")
+
+    def _apply(self, entry):
+        """
+        Apply a replayed journal entry during startup
+        """
+        if entry.get('op') == OP_PUT:
+            self._insert(entry['product'], index_price=False)
+        elif entry.get('op') == OP_DELETE:
+            product = self.products.pop(entry['id'], None)
+            if product is not None:
+                self._unindex(product, index_price=False)
+
     def _save_products(self):
         """
         Save products back to the JSON data file
         """
         try:
-            with open(self.data_path, 'w') as file:
-                json.dump(self.products, file, indent=2)
+            write_snapshot(self.data_path, list(self.products.values()), indent=2)
         except Exception as e:
             print(f"Error saving product data: {str(e)}")
-    
+
+    def _persist_put(self, product):
+        if self.journal:
+            self.journal.put(product)
+        else:
+            self._save_products()
+
+    def _persist_delete(self, product_id):
+        if self.journal:
+            self.journal.delete(product_id)
+        else:
+            self._save_products()
+
+    def close(self):
+        """
+        Flush any journaled writes that have not been synced yet
+        """
+        if self.journal:
+            self.journal.close()
+
+    @staticmethod
+    def _price(product):
+        price = product.get('price', 0)
+        return price if isinstance(price, (int, float)) else 0
+
+    def _insert(self, product, index_price=True):
+        """
+        Add or replace a record and keep every index in step
+        """
+        product_id = product['id']
+        existing = self.products.get(product_id)
+        if existing is not None:
+            self._unindex(existing, index_price)
+        # Assigning to an existing key keeps the record's position
+        self.products[product_id] = product
+        self._index_record(product, index_price)
+
+    def _index_record(self, product, index_price=True):
+        """
+        Add a record's index entries
+        """
+        product_id = product['id']
+        for field in INDEXED_FIELDS:
+            value = product.get(field)
+            if value is not None:
+                self._indexes[field].setdefault(value, {})[product_id] = None
+        if index_price:
+            price = self._price(product)
+            position = bisect_right(self._prices, price)
+            self._prices.insert(position, price)
+            self._price_ids.insert(position, product_id)
+        else:
+            self._loaded_prices[product_id] = self._price(product)
+        match = ID_PATTERN.match(str(product_id))
+        if match:
+            self._next_id = max(self._next_id, int(match.group(1)) + 1)
+
+    def _unindex(self, product, index_price=True):
+        """
+        Remove a record's index entries
+        """
+        product_id = product['id']
+        for field in INDEXED_FIELDS:
+            value = product.get(field)
+            bucket = self._indexes[field].get(value)
+            if bucket is not None:
+                bucket.pop(product_id, None)
+                if not bucket:
+                    del self._indexes[field][value]
+        if not index_price:
+            self._loaded_prices.pop(product_id, None)
+            return
+        price = self._price(product)
+        position = bisect_left(self._prices, price)
+        while self._price_ids[position] != product_id:
+            position += 1
+        del self._prices[position]
+        del self._price_ids[position]
+
+    def _rebuild_price_index(self):
+        """
+        Build the price index in one sort instead of one insert per record
+        """
+        ordered = sorted(self._loaded_prices.items(), key=lambda item: item[1])
+        self._prices = [price for _, price in ordered]
+        self._price_ids = [product_id for product_id, _ in ordered]
+        self._loaded_prices = {}
+
+    def _by_index(self, field, value):
+        return [self.products[product_id] for product_id in self._indexes[field].get(value, ())]
+
     def get_all_products(self):
         """
         Return all products
         """
-        return self.products
-    
+        return list(self.products.values())
+
     def get_product_by_id(self, product_id):
         """
         Get a specific product by ID
         """
-        for product in self.products:
-            if product['id'] == product_id:
-                return product
-        return None
-    
+        return self.products.get(product_id)
+
     def update_product(self, product_id, updated_data):
         """
         Update a product with new data
         """
-        for i, product in enumerate(self.products):
-            if product['id'] == product_id:
-                # Merge the updated data with the existing product
-                self.products[i] = {**product, **updated_data}
-                self._save_products()
-                return self.products[i]
-        return None
-    
+        with self._lock:
+            product = self.products.get(product_id)
+            if product is None:
+                return None
+            # Merge the updated data with the existing product; the id is immutable
+            updated = {**product, **updated_data, 'id': product_id}
+            self._insert(updated)
+            self._persist_put(updated)
+            return updated
+
     def add_product(self, product_data):
         """
         Add a new product
         """
-        # Generate a new product ID if not provided
-        if 'id' not in product_data:
-            max_id = 0
-            for product in self.products:
-                try:
-                    prod_id = int(product['id'].replace('prod', ''))
-                    max_id = max(max_id, prod_id)
-                except:
-                    pass
-            product_data['id'] = f"prod{max_id + 1:03d}"
-        
-        self.products.append(product_data)
-        self._save_products()
-        return product_data
-    
+        with self._lock:
+            # Generate a new product ID if not provided; the counter never goes back
+            if 'id' not in product_data:
+                product_data['id'] = f"prod{self._next_id:03d}"
+
+            self._insert(product_data)
+            self._persist_put(product_data)
+            return product_data
+
     def delete_product(self, product_id):
         """
         Delete a product by ID
         """
-        for i, product in enumerate(self.products):
-            if product['id'] == product_id:
-                deleted_product = self.products.pop(i)
-                self._save_products()
-                return deleted_product
-        return None
-    
+        with self._lock:
+            if product_id not in self.products:
+                return None
+
+            deleted_product = self.products.pop(product_id)
+            self._unindex(deleted_product)
+            self._persist_delete(product_id)
+            return deleted_product
+
     def get_products_by_category(self, category):
         """
         Get products filtered by category
         """
-        return [p for p in self.products if p.get('category') == category]
-    
+        return self._by_index('category', category)
+
     def get_products_by_brand(self, brand):
         """
         Get products filtered by brand
         """
-        return [p for p in self.products if p.get('brand') == brand]
-    
+        return self._by_index('brand', brand)
+
+    def get_products_by_subcategory(self, subcategory):
+        """
+        Get products filtered by subcategory
+        """
+        return self._by_index('subcategory', subcategory)
+
     def get_products_by_price_range(self, min_price, max_price):
         """
         Get products filtered by price range
         """
-        if max_price:
-            return [p for p in self.products if min_price <= p.get('price', 0) <= max_price]
-        else:
-            return [p for p in self.products if p.get('price', 0) >= min_price]
\ No newline at end of file
+        start = bisect_left(self._prices, min_price)
+        end = bisect_right(self._prices, max_price) if max_price else len(self._prices)
+        return [self.products[product_id] for product_id in self._price_ids[start:end]]
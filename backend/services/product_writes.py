@@ -0,0 +1,77 @@
+from typing import Optional
+
+from pymongo import ReturnDocument
+
+from models.product import versioned_update
+from services.image_service import ImageService
+from services.image_variants import image_variants
+
+
+class MissingImageError(ValueError):
+    """Raised when a write points a product at one of our images that is no longer stored"""
+
+
+def version_filter(version: Optional[int]):
+    # Products written before versioning have no version field and count as version 0
+    return version if version else {"$in": [None, 0]}
+
+
+def variant_urls(product: dict) -> list:
+    return [variant["url"] for variant in (product.get("image_variants") or {}).get("items", [])]
+
+
+async def write_product_fields(db, image_service: ImageService, current: dict, changes: dict, image_acquired: bool = False) -> Optional[dict]:
+    """
+    $set `changes` on `current` if nobody updated the product since it was read
+
+    A new image_url takes a reference on the image before the write and the
+    replaced image is released after it, so every image_url write keeps the
+    reference counts right; with `image_acquired` the caller already holds
+    that reference (a fresh upload) and keeps it if the write does not apply.
+    Returns the updated document, or None if the product changed (or went)
+    in between; nothing is left acquired by this call then.
+    """
+    new_image = changes.get("image_url") if changes.get("image_url") != current.get("image_url") else None
+    acquired = None
+    if new_image and not image_acquired:
+        acquired = await image_service.acquire_image(db, new_image)
+    if acquired is False:
+        raise MissingImageError("image_url refers to an image that no longer exists")
+
+    updated = await db.products.find_one_and_update(
+        {"_id": current["_id"], "version": version_filter(current.get("version"))},
+        versioned_update(changes),
+        return_document=ReturnDocument.AFTER
+    )
+    if updated is None:
+        if acquired:
+            await image_service.release_image(db, new_image)
+        return None
+
+    if "image_url" in changes and changes["image_url"] != current.get("image_url"):
+        image_variants.schedule(db, current["_id"], new_image)
+        # The old image and its variants go once no product uses them
+        if current.get("image_url"):
+            await image_service.release_image(db, current["image_url"], variant_urls(current))
+    elif image_acquired:
+        # Re-uploading the image the product already shows took a second reference
+        await image_service.release_image(db, changes["image_url"])
+    return updated
+
+
+async def save_generated_fields(db, image_service: ImageService, product_id, generated: dict) -> dict:
+    """
+    Store generated fields on a product, retrying if another write lands first
+
+    A generated image is deleted again when its product is gone, since no
+    product would ever reference it.
+    """
+    while True:
+        current = await db.products.find_one({"_id": product_id})
+        if current is None:
+            if generated.get("image_url"):
+                await image_service.release_image(db, generated["image_url"])
+            raise ValueError("Product not found")
+        updated = await write_product_fields(db, image_service, current, generated)
+        if updated is not None:
+            return updated
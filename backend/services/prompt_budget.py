@@ -0,0 +1,337 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from config import config
+
+try:
+    import tiktoken
+except ImportError:  # Optional: without it token counts fall back to a character estimate
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Context window per model family; the longest matching prefix wins
+MODEL_CONTEXT_TOKENS = {
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+}
+DEFAULT_CONTEXT_TOKENS = 8192
+
+# Tokens the chat format adds around each message, and to prime the reply
+TOKENS_PER_MESSAGE = 3
+REPLY_PRIMING_TOKENS = 3
+
+# Completion allowance per generated field, roughly twice the length each prompt asks for
+COMPLETION_TOKENS = {
+    "seo_title": 60,
+    "seo_description": 120,
+    "features": 200,
+    "materials": 200,
+    "colors": 150,
+    "tags": 150,
+    "description": 300,
+    "detailed_description": 800,
+    "marketing_copy.email": 800,
+    "marketing_copy.social_media.instagram": 400,
+    "marketing_copy.social_media.facebook": 400,
+    "marketing_copy.social_media.linkedin": 500,
+    "marketing_copy.social_media.twitter": 150,
+}
+DEFAULT_COMPLETION_TOKENS = 500
+BASIC_PRODUCT_COMPLETION_TOKENS = 800
+DESCRIPTION_COMPLETION_TOKENS = {"short": 300, "medium": 500, "long": 700}
+# Keys, quotes and braces around each value of a JSON object response
+JSON_TOKENS_PER_FIELD = 20
+
+# Product fields trimmed when a prompt is over budget, least important first
+TRIM_PRIORITY = ("tags", "colors", "materials", "features", "basic_description")
+MIN_LIST_ITEMS = 3
+MIN_TEXT_TOKENS = 64
+CHARS_PER_TOKEN = 4
+
+
+class PromptBudgetError(ValueError):
+    """Raised when a prompt cannot fit the model's context window even after trimming"""
+
+
+# model -> encoding (None when it cannot be loaded); filled by load_encoding
+_encodings: Dict[str, Any] = {}
+_encoding_lock = threading.Lock()
+_pending: Set[str] = set()
+_pending_lock = threading.Lock()
+# Loading a BPE file can mean a download; it never happens on a caller's thread
+_loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tokenizer-load")
+
+
+def _load(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"No tokenizer for {model}, estimating tokens from characters: {str(e)}")
+        return None
+
+
+def load_encoding(model: str):
+    """
+    The tiktoken encoding for a model, loaded once per model; blocks until
+    it is. None when tiktoken is not installed or its BPE file cannot be loaded.
+    """
+    with _encoding_lock:
+        if model not in _encodings:
+            _encodings[model] = _load(model)
+        return _encodings[model]
+
+
+def get_encoding(model: str):
+    """
+    The encoding for a model if it is loaded, without blocking. The first
+    call starts loading it in the background and returns None, so callers
+    estimate from characters until it is ready.
+    """
+    if model in _encodings:
+        return _encodings[model]
+    preload_encodings([model])
+    return None
+
+
+def preload_encodings(models: Iterable[str]):
+    """Start loading tokenizers in the background, ahead of the first request"""
+    for model in set(models):
+        with _pending_lock:
+            if model in _pending or model in _encodings:
+                continue
+            _pending.add(model)
+        _loader.submit(load_encoding, model)
+
+
+def count_tokens(text: str, model: str) -> int:
+    encoding = get_encoding(model)
+    if encoding is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, tokens: int, model: str) -> str:
+    """The first `tokens` tokens of `text`, marked with an ellipsis when cut"""
+    encoding = get_encoding(model)
+    if encoding is None:
+        limit = tokens * CHARS_PER_TOKEN
+        return text if len(text) <= limit else text[:limit].rstrip() + "…"
+    encoded = encoding.encode(text, disallowed_special=())
+    if len(encoded) <= tokens:
+        return text
+    return encoding.decode(encoded[:tokens]).rstrip() + "…"
+
+
+def context_tokens_for(model: str) -> int:
+    if config['LLM_CONTEXT_TOKENS']:
+        return config['LLM_CONTEXT_TOKENS']
+    for prefix in sorted(MODEL_CONTEXT_TOKENS, key=len, reverse=True):
+        if model.startswith(prefix):
+            return MODEL_CONTEXT_TOKENS[prefix]
+    return DEFAULT_CONTEXT_TOKENS
+
+
+def field_completion_tokens(field: str) -> int:
+    return COMPLETION_TOKENS.get(field, DEFAULT_COMPLETION_TOKENS)
+
+
+def missing_fields_completion_tokens(fields: Iterable[str]) -> int:
+    """Allowance for one JSON object holding every field"""
+    return sum(field_completion_tokens(field) + JSON_TOKENS_PER_FIELD for field in fields)
+
+
+def description_completion_tokens(style: Optional[dict]) -> int:
+    return DESCRIPTION_COMPLETION_TOKENS.get((style or {}).get("length"), DESCRIPTION_COMPLETION_TOKENS["medium"])
+
+
+class PromptBudgeter:
+    """
+    Count prompt tokens for one model and keep requests within budget
+
+    Prompts over `max_prompt_tokens` have their product fields trimmed in
+    TRIM_PRIORITY order (list fields lose trailing items, text is cut);
+    max_tokens is clamped to what is left of the context window.
+    """
+
+    def __init__(self, model: str, max_prompt_tokens: int, max_completion_tokens: int, context_tokens: int):
+        self.model = model
+        self.max_prompt_tokens = max_prompt_tokens
+        self.max_completion_tokens = max_completion_tokens
+        self.context_tokens = context_tokens
+
+    def count(self, text: str) -> int:
+        return count_tokens(text, self.model)
+
+    def count_chat(self, system_message: str, prompt: str) -> int:
+        return (
+            2 * TOKENS_PER_MESSAGE + REPLY_PRIMING_TOKENS
+            + self.count(system_message) + self.count(prompt)
+        )
+
+    def fit(self, system_message: str, build: Callable[[Any], str], product: Any) -> str:
+        """Render `build(product)`, trimming product fields until the prompt fits the budget"""
+        prompt = build(product)
+        tokens = self.count_chat(system_message, prompt)
+        if tokens <= self.max_prompt_tokens:
+            return prompt
+        original = tokens
+        trimmed = []
+        for field in TRIM_PRIORITY:
+            # Token counts of separate pieces only approximate the rendered prompt, so trim until it fits
+            while tokens > self.max_prompt_tokens:
+                value = self._get(product, field)
+                if not value:
+                    break
+                shorter = self._trim(value, tokens - self.max_prompt_tokens)
+                if shorter == value:
+                    break
+                product = self._replace(product, field, shorter)
+                if field not in trimmed:
+                    trimmed.append(field)
+                prompt = build(product)
+                tokens = self.count_chat(system_message, prompt)
+            if tokens <= self.max_prompt_tokens:
+                break
+        token_usage.record_trimmed(self.model)
+        logger.warning(
+            f"Prompt for {self.model} over budget ({original} > {self.max_prompt_tokens} tokens), "
+            f"trimmed {trimmed or 'nothing'} to {tokens} tokens"
+        )
+        return prompt
+
+    def _trim(self, value, excess: int):
+        if isinstance(value, str):
+            return truncate_tokens(value, max(MIN_TEXT_TOKENS, self.count(value) - excess), self.model)
+        items = list(value)
+        removed = 0
+        while len(items) > MIN_LIST_ITEMS and removed < excess:
+            # Each item also costs its ", " or "• " separator
+            removed += self.count(items.pop()) + 1
+        if removed < excess:
+            # A few very long items: shorten each of them too
+            items = [truncate_tokens(item, MIN_TEXT_TOKENS, self.model) for item in items]
+        return items
+
+    @staticmethod
+    def _get(product, field: str):
+        return product.get(field) if isinstance(product, dict) else getattr(product, field, None)
+
+    @staticmethod
+    def _replace(product, field: str, value):
+        if isinstance(product, dict):
+            return {**product, field: value}
+        return product.model_copy(update={field: value})
+
+    def completion_tokens(self, prompt_tokens: int, wanted: int) -> int:
+        """max_tokens for a request: the allowance, capped by config and the room left in the context"""
+        available = self.context_tokens - prompt_tokens
+        if available <= 0:
+            raise PromptBudgetError(
+                f"Prompt of {prompt_tokens} tokens does not fit the {self.context_tokens}-token context of {self.model}"
+            )
+        return max(1, min(wanted, self.max_completion_tokens, available))
+
+
+class TokenUsage:
+    """Prompt and completion tokens per model and kind of call, for cost dashboards"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._usage: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self._trimmed: Dict[str, int] = {}
+
+    def _entry(self, model: str, kind: str) -> Dict[str, int]:
+        key = (model, kind)
+        if key not in self._usage:
+            self._usage[key] = {
+                "calls": 0,
+                "cached": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "estimated_prompt_tokens": 0,
+                "truncated": 0,
+            }
+        return self._usage[key]
+
+    def record(
+        self,
+        model: str,
+        kind: str,
+        estimated_prompt_tokens: int,
+        prompt_tokens: Optional[int],
+        completion_tokens: int,
+        truncated: bool = False
+    ):
+        """
+        One completed call. `prompt_tokens` comes from the API's usage when it
+        reports one; otherwise the local count is used.
+        """
+        prompt_tokens = prompt_tokens if prompt_tokens is not None else estimated_prompt_tokens
+        with self._lock:
+            entry = self._entry(model, kind)
+            entry["calls"] += 1
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+            entry["estimated_prompt_tokens"] += estimated_prompt_tokens
+            if truncated:
+                entry["truncated"] += 1
+        logger.info(
+            f"LLM call {kind} on {model}: {prompt_tokens} prompt + {completion_tokens} completion tokens"
+            f"{' (hit max_tokens)' if truncated else ''}"
+        )
+
+    def record_cached(self, model: str, kind: str):
+        with self._lock:
+            self._entry(model, kind)["cached"] += 1
+
+    def record_trimmed(self, model: str):
+        with self._lock:
+            self._trimmed[model] = self._trimmed.get(model, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            models: Dict[str, dict] = {}
+            for (model, kind), entry in self._usage.items():
+                summary = models.setdefault(model, {
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    "trimmed_prompts": self._trimmed.get(model, 0),
+                    "kinds": {}
+                })
+                summary["prompt_tokens"] += entry["prompt_tokens"]
+                summary["completion_tokens"] += entry["completion_tokens"]
+                summary["kinds"][kind] = dict(entry)
+            return models
+
+
+class PromptBudgets:
+    """One PromptBudgeter per model, sharing the configured limits"""
+
+    def __init__(self):
+        self.max_prompt_tokens = config['LLM_MAX_PROMPT_TOKENS']
+        self.max_completion_tokens = config['LLM_MAX_COMPLETION_TOKENS']
+        self._models: Dict[str, PromptBudgeter] = {}
+        self._lock = threading.Lock()
+
+    def for_model(self, model: str) -> PromptBudgeter:
+        with self._lock:
+            if model not in self._models:
+                self._models[model] = PromptBudgeter(
+                    model, self.max_prompt_tokens, self.max_completion_tokens, context_tokens_for(model)
+                )
+            return self._models[model]
+
+
+# Shared by every LLM caller in the process
+prompt_budgets = PromptBudgets()
+token_usage = TokenUsage()
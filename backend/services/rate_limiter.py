@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import openai
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+
+class ModelRateLimiter:
+    """
+    Client-side request and token buckets for one model
+
+    Callers reserve capacity up front and the buckets are allowed to go into
+    debt; each caller then sleeps until its share of the debt has refilled.
+    This queues callers in arrival order instead of failing them. A caller
+    cancelled while it waits refunds its reservation.
+    """
+
+    def __init__(self, model: str, requests_per_minute: int, tokens_per_minute: int):
+        self.model = model
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+        self.queue_depth = 0
+        self.waits = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.retries = 0
+        self.rate_limited = 0
+        self.cancelled = 0
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def reserve(self, tokens: int) -> float:
+        """Reserve one request and `tokens` tokens; returns the seconds to wait before sending"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._requests -= 1
+            self._tokens -= min(tokens, self.tokens_per_minute)
+            wait = max(
+                0.0,
+                -self._requests * 60 / self.requests_per_minute,
+                -self._tokens * 60 / self.tokens_per_minute
+            )
+            if wait > 0:
+                self.waits += 1
+                self.total_wait_seconds += wait
+                self.max_wait_seconds = max(self.max_wait_seconds, wait)
+            return wait
+
+    def refund(self, tokens: int):
+        """Return a reservation whose request was never sent"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._requests = min(self.requests_per_minute, self._requests + 1)
+            self._tokens = min(self.tokens_per_minute, self._tokens + min(tokens, self.tokens_per_minute))
+            self.cancelled += 1
+
+    async def acquire(self, tokens: int):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            with self._lock:
+                self.queue_depth += 1
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                # e.g. the SSE client disconnected while queued
+                self.refund(tokens)
+                raise
+            finally:
+                with self._lock:
+                    self.queue_depth -= 1
+
+    def calibrate(self, headers):
+        """Adopt the server's view of our limits from `x-ratelimit-*` response headers"""
+        if not headers:
+            return
+        try:
+            with self._lock:
+                self._refill(time.monotonic())
+                limit_requests = headers.get("x-ratelimit-limit-requests")
+                limit_tokens = headers.get("x-ratelimit-limit-tokens")
+                remaining_requests = headers.get("x-ratelimit-remaining-requests")
+                remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+                if limit_requests:
+                    self.requests_per_minute = int(limit_requests)
+                if limit_tokens:
+                    self.tokens_per_minute = int(limit_tokens)
+                if remaining_requests is not None:
+                    self._requests = min(self._requests, float(remaining_requests))
+                if remaining_tokens is not None:
+                    self._tokens = min(self._tokens, float(remaining_tokens))
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Ignoring malformed rate limit headers: {str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            "requests_per_minute": self.requests_per_minute,
+            "tokens_per_minute": self.tokens_per_minute,
+            "queue_depth": self.queue_depth,
+            "waits": self.waits,
+            "total_wait_seconds": round(self.total_wait_seconds, 3),
+            "max_wait_seconds": round(self.max_wait_seconds, 3),
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "cancelled": self.cancelled,
+        }
+
+
+class OpenAIRateLimiter:
+    """
+    Per-model limiters plus retry with exponential backoff and jitter
+    """
+
+    def __init__(self):
+        self.requests_per_minute = config['OPENAI_REQUESTS_PER_MINUTE']
+        self.tokens_per_minute = config['OPENAI_TOKENS_PER_MINUTE']
+        self.max_retries = config['OPENAI_MAX_RETRIES']
+        self.backoff_base = config['OPENAI_BACKOFF_BASE_SECONDS']
+        self.backoff_max = config['OPENAI_BACKOFF_MAX_SECONDS']
+        self._models: Dict[str, ModelRateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def for_model(self, model: str) -> ModelRateLimiter:
+        with self._lock:
+            if model not in self._models:
+                self._models[model] = ModelRateLimiter(model, self.requests_per_minute, self.tokens_per_minute)
+            return self._models[model]
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None) or {}
+        retry_after = headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        delay = min(self.backoff_base * (2 ** attempt), self.backoff_max)
+        # Full jitter spreads out callers that failed together
+        return random.uniform(0, delay)
+
+    def _on_error(self, limiter: ModelRateLimiter, error: Exception, attempt: int) -> Optional[float]:
+        """Return the backoff delay if the error should be retried"""
+        if not isinstance(error, RETRYABLE_ERRORS) or attempt >= self.max_retries:
+            return None
+        if isinstance(error, openai.RateLimitError):
+            limiter.rate_limited += 1
+            limiter.calibrate(getattr(getattr(error, "response", None), "headers", None))
+        limiter.retries += 1
+        delay = self._backoff(attempt, error)
+        logger.warning(f"OpenAI call for {limiter.model} failed ({type(error).__name__}), retrying in {delay:.2f}s")
+        return delay
+
+    async def call(self, model: str, tokens: int, request: Callable[[], Awaitable[Any]]) -> Any:
+        """Run an async raw-response request under the limits, retrying transient failures"""
+        limiter = self.for_model(model)
+        attempt = 0
+        while True:
+            await limiter.acquire(tokens)
+            try:
+                raw = await request()
+            except Exception as e:
+                delay = self._on_error(limiter, e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            limiter.calibrate(getattr(raw, "headers", None))
+            return raw
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {model: limiter.stats() for model, limiter in self._models.items()}
+
+
+# Shared by every OpenAI caller in the process
+openai_rate_limiter = OpenAIRateLimiter()
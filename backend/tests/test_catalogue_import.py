@@ -0,0 +1,116 @@
+import json
+
+import pytest
+from bson import ObjectId
+
+from services import generation_jobs
+from services.catalogue_import import CatalogueImport, checkpoint_path_for, iter_rows
+
+pytestmark = pytest.mark.anyio
+
+
+def write_rows(path, count):
+    with open(path, "w") as file:
+        for index in range(1, count + 1):
+            file.write(json.dumps({"name": f"Product {index}", "price": index, "basic_description": "d"}) + "\n")
+        file.write("{not json\n")
+
+
+def read_results(path):
+    with open(path) as file:
+        return [json.loads(line) for line in file]
+
+
+async def test_iter_rows_parses_csv_lists(tmp_path):
+    path = tmp_path / "catalogue.csv"
+    path.write_text("name,price,basic_description,tags,colors\nMug,5,A mug,kitchen| gift ,\n")
+    assert list(iter_rows(str(path))) == [
+        (1, {"name": "Mug", "price": "5", "basic_description": "A mug", "tags": ["kitchen", "gift"], "colors": []})
+    ]
+
+
+async def test_import_writes_one_result_per_row(tmp_path, mongo_db):
+    input_path = tmp_path / "catalogue.jsonl"
+    write_rows(input_path, 3)
+    catalogue_import = CatalogueImport(
+        mongo_db, ObjectId(), str(input_path), str(tmp_path / "results.jsonl"), generate=False, batch_size=2
+    )
+    counts = await catalogue_import.run()
+
+    assert counts == {"inserted": 3, "generated": 0, "invalid": 1, "failed": 0}
+    assert [result["status"] for result in read_results(tmp_path / "results.jsonl")] == ["inserted"] * 3 + ["invalid"]
+    assert await mongo_db.products.count_documents({}) == 3
+
+
+async def test_resume_after_crash_does_not_duplicate_results(tmp_path, mongo_db, monkeypatch):
+    input_path = tmp_path / "catalogue.jsonl"
+    results_path = tmp_path / "results.jsonl"
+    write_rows(input_path, 5)
+    user_id = ObjectId()
+
+    def make_import():
+        return CatalogueImport(mongo_db, user_id, str(input_path), str(results_path), generate=False, batch_size=2)
+
+    # Crash after the second batch's results are written but before its checkpoint
+    save_checkpoint = CatalogueImport._save_checkpoint
+    saved = []
+
+    def crashing_save(self, last_row, results_size):
+        if saved:
+            raise RuntimeError("crash")
+        saved.append(last_row)
+        save_checkpoint(self, last_row, results_size)
+
+    monkeypatch.setattr(CatalogueImport, "_save_checkpoint", crashing_save)
+    with pytest.raises(RuntimeError):
+        await make_import().run()
+    assert len(read_results(results_path)) == 4
+
+    monkeypatch.setattr(CatalogueImport, "_save_checkpoint", save_checkpoint)
+    counts = await make_import().run()
+
+    assert [result["row"] for result in read_results(results_path)] == [1, 2, 3, 4, 5, 6]
+    assert counts["inserted"] == 5
+    assert await mongo_db.products.count_documents({}) == 5
+
+
+async def test_file_io_stays_off_the_event_loop(tmp_path, mongo_db, monkeypatch):
+    import os
+    import threading
+
+    from services import catalogue_import
+
+    fsync = os.fsync
+    fsync_threads = []
+
+    def recording_fsync(fd):
+        fsync_threads.append(threading.current_thread())
+        fsync(fd)
+
+    monkeypatch.setattr(catalogue_import.os, "fsync", recording_fsync)
+    input_path = tmp_path / "catalogue.jsonl"
+    write_rows(input_path, 3)
+    await CatalogueImport(
+        mongo_db, ObjectId(), str(input_path), str(tmp_path / "results.jsonl"), generate=False, batch_size=2
+    ).run()
+
+    # Results and checkpoint, for each of the two batches
+    assert len(fsync_threads) == 4
+    assert threading.main_thread() not in fsync_threads
+
+
+async def test_finished_import_job_removes_its_input(tmp_path, monkeypatch):
+    monkeypatch.setitem(generation_jobs.config, "IMPORT_DIR", str(tmp_path))
+    job_id = ObjectId()
+    input_path = tmp_path / "upload.jsonl"
+    input_path.write_text("{}\n")
+    results_path = generation_jobs.import_results_path(job_id)
+    open(results_path, "w").close()
+    open(checkpoint_path_for(results_path), "w").close()
+
+    job = {"_id": job_id, "payload": {"input_path": str(input_path)}}
+    await generation_jobs.cleanup_import_job(job)
+    # Already removed files are fine, e.g. when a retry finalizes the same job again
+    await generation_jobs.cleanup_import_job(job)
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == [f"{job_id}.results.jsonl"]
@@ -0,0 +1,94 @@
+import pytest
+
+from services import completion_cache as cc
+from services.completion_cache import CompletionCache, MemoryCacheTier, SQLiteCacheTier, make_cache_key
+
+
+def test_cache_key_covers_every_request_parameter():
+    key = make_cache_key("gpt-4o-mini", "sys", "prompt", 0.7, 100)
+    assert key == make_cache_key("gpt-4o-mini", "sys", "prompt", 0.7, 100)
+    assert key != make_cache_key("gpt-4o-mini", "sys", "prompt", 0.7, 101)
+    assert key != make_cache_key("gpt-4o-mini", "sys", "prompt", 0.2, 100)
+    assert key != make_cache_key("gpt-4o", "sys", "prompt", 0.7, 100)
+    assert key != make_cache_key("gpt-4o-mini", "sys", "prompt", 0.7, 100, {"type": "json_object"})
+
+
+def test_memory_tier_evicts_least_recently_used():
+    tier = MemoryCacheTier(max_entries=2, ttl_seconds=60)
+    tier.set("a", "1")
+    tier.set("b", "2")
+    assert tier.get("a") == "1"
+    tier.set("c", "3")
+    assert tier.get("b") is None
+    assert tier.get("a") == "1" and tier.get("c") == "3"
+
+
+def test_memory_tier_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cc.time, "time", lambda: now[0])
+    tier = MemoryCacheTier(max_entries=10, ttl_seconds=60)
+    tier.set("a", "1")
+    now[0] += 59
+    assert tier.get("a") == "1"
+    now[0] += 2
+    assert tier.get("a") is None
+    assert len(tier) == 0
+
+
+def test_sqlite_tier_keeps_most_recently_accessed(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cc.time, "time", lambda: now[0])
+    tier = SQLiteCacheTier(str(tmp_path / "cache" / "completions.db"), max_entries=2, ttl_seconds=60)
+    for key in ("a", "b"):
+        now[0] += 1
+        tier.set(key, key.upper())
+    now[0] += 1
+    assert tier.get("a") == "A"
+    now[0] += 1
+    tier.set("c", "C")
+    assert tier.get("b") is None
+    assert len(tier) == 2
+    now[0] += 120
+    assert tier.get("a") is None
+
+
+@pytest.mark.anyio
+async def test_hit_in_a_slower_tier_is_promoted(tmp_path):
+    memory = MemoryCacheTier(max_entries=10, ttl_seconds=60)
+    disk = SQLiteCacheTier(str(tmp_path / "completions.db"), max_entries=10, ttl_seconds=60)
+    cache = CompletionCache([memory, disk])
+
+    assert await cache.get("k") is None
+    disk.set("k", "cached")
+    assert await cache.get("k") == "cached"
+    assert memory.get("k") == "cached"
+    assert await cache.get("k") == "cached"
+    assert cache.stats()["hits_by_tier"] == {"memory": 1, "sqlite": 1}
+    assert cache.stats()["misses"] == 1
+
+
+@pytest.mark.anyio
+async def test_failing_tier_is_skipped():
+    class Broken:
+        name = "broken"
+
+        def get(self, key):
+            raise OSError("disk full")
+
+        def set(self, key, value):
+            raise OSError("disk full")
+
+    memory = MemoryCacheTier(max_entries=10, ttl_seconds=60)
+    cache = CompletionCache([Broken(), memory])
+    await cache.set("k", "v")
+    assert memory.get("k") == "v"
+    assert await cache.get("k") == "v"
+
+
+@pytest.mark.anyio
+async def test_disabled_cache_stores_nothing():
+    memory = MemoryCacheTier(max_entries=10, ttl_seconds=60)
+    cache = CompletionCache([memory], enabled=False)
+    await cache.set("k", "v")
+    assert await cache.get("k") is None
+    assert len(memory) == 0
@@ -0,0 +1,73 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from routes import content
+from services.image_service import ImageService
+from services.openai_service import OpenAIService
+
+pytestmark = pytest.mark.anyio
+
+
+def create(api_client, name):
+    response = api_client.post("/api/products", json={"name": name, "price": 1.0, "basic_description": "A product"})
+    return response.json()["id"]
+
+
+def parse_event(chunk):
+    event, data = chunk.strip().split("\n")
+    return event[len("event: "):], json.loads(data[len("data: "):])
+
+
+async def test_stream_fields_sends_each_field_as_it_finishes(mongo_db, api_user, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    release_tags = asyncio.Event()
+
+    async def generate_missing_field(self, product, field, image_options, use_cache=True):
+        if field == "tags":
+            await release_tags.wait()
+            return "kitchen, gift"
+        if field == "colors":
+            raise ValueError("no colors")
+        return "A great mug"
+
+    async def is_disconnected():
+        return False
+
+    monkeypatch.setattr(OpenAIService, "generate_missing_field", generate_missing_field)
+    product_id = (await mongo_db.products.insert_one({
+        "user_id": api_user.id, "name": "Mug", "price": 5.0, "basic_description": "A mug"
+    })).inserted_id
+
+    response = await content.stream_fields(
+        str(product_id),
+        {"fields": ["seo_title", "colors", "tags"]},
+        SimpleNamespace(is_disconnected=is_disconnected),
+        current_user=api_user,
+        db=mongo_db,
+        openai_service=OpenAIService(),
+        image_service=ImageService()
+    )
+    events = response.body_iterator
+    first = sorted([parse_event(await asyncio.wait_for(events.__anext__(), 5)) for _ in range(2)], key=lambda event: event[0])
+    # Both arrive while tags is still being generated
+    assert first == [
+        ("error", {"field": "colors", "detail": "no colors"}),
+        ("field", {"field": "seo_title", "generated_content": "A great mug"}),
+    ]
+    release_tags.set()
+    rest = [parse_event(chunk) async for chunk in events]
+
+    assert rest == [
+        ("field", {"field": "tags", "generated_content": ["kitchen", "gift"]}),
+        ("done", {"generated_content": {"seo_title": "A great mug", "tags": ["kitchen", "gift"]}, "errors": {"colors": "no colors"}}),
+    ]
+    product = await mongo_db.products.find_one({"_id": product_id})
+    assert (product["seo_title"], product["tags"], product["version"]) == ("A great mug", ["kitchen", "gift"], 1)
+
+
+def test_stream_fields_requires_fields(api_client):
+    product_id = create(api_client, "Mug")
+    assert api_client.post(f"/api/products/{product_id}/generate-fields/stream", json={}).status_code == 400
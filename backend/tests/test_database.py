@@ -0,0 +1,56 @@
+import database
+from dependencies.database import with_read_preference
+
+
+def test_connect_to_mongo_reuses_one_client():
+    database.close_mongo_connection()
+    try:
+        client = database.connect_to_mongo()
+        assert database.connect_to_mongo() is client
+        assert database.get_database() is database.db
+        assert database.db.client is client
+    finally:
+        database.close_mongo_connection()
+    assert database.client is None and database.db is None
+
+
+def test_get_database_creates_the_client_on_first_use():
+    database.close_mongo_connection()
+    try:
+        db = database.get_database()
+        assert database.client is not None
+        assert database.get_database() is db
+    finally:
+        database.close_mongo_connection()
+
+
+def test_read_preference_handle_follows_a_recreated_client():
+    get_secondary = with_read_preference("secondaryPreferred")
+    database.close_mongo_connection()
+    try:
+        first = get_secondary()
+        assert get_secondary() is first
+        assert first.read_preference.mongos_mode == "secondaryPreferred"
+        database.close_mongo_connection()
+        assert get_secondary() is not first
+    finally:
+        database.close_mongo_connection()
+
+
+def test_pool_stats_track_checkouts():
+    listener = database.PoolStatsListener()
+    listener.connection_created(None)
+    listener.connection_check_out_started(None)
+    listener.connection_checked_out(None)
+    assert listener.snapshot()["checked_out"] == 1
+    listener.connection_checked_in(None)
+    listener.connection_check_out_started(None)
+    listener.connection_check_out_failed(None)
+    assert listener.snapshot() == {
+        "checked_out": 0,
+        "waiting": 0,
+        "created": 1,
+        "closed": 0,
+        "open": 1,
+        "checkout_failed": 1,
+    }
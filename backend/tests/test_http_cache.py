@@ -0,0 +1,79 @@
+import hashlib
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from utils.http_cache import ImmutableStaticFiles, etag_matches, list_etag
+
+
+def create(api_client, name):
+    response = api_client.post("/api/products", json={"name": name, "price": 1.0, "basic_description": "A product"})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_etag_matches():
+    assert etag_matches('W/"1", "2"', '"2"')
+    assert etag_matches("*", '"2"')
+    assert not etag_matches(None, '"2"')
+    assert not etag_matches('"1"', '"2"')
+
+
+def test_list_etag_depends_on_query_and_summary():
+    summary = {"count": 2, "updated_at": None, "versions": 3}
+    assert list_etag("a", summary) == list_etag("a", dict(summary))
+    assert list_etag("a", summary) != list_etag("b", summary)
+    assert list_etag("a", summary) != list_etag("a", {**summary, "versions": 4})
+
+
+def test_list_revalidation_skips_the_page_query(api_client, mongo_db, monkeypatch):
+    lamp = create(api_client, "Lamp")
+    create(api_client, "Chair")
+    response = api_client.get("/api/products")
+    etag = response.headers["ETag"]
+
+    # An unchanged list is answered without reading the page
+    from motor.motor_asyncio import AsyncIOMotorCollection
+    finds = []
+    find = AsyncIOMotorCollection.find
+    monkeypatch.setattr(AsyncIOMotorCollection, "find", lambda self, *args, **kwargs: finds.append(args) or find(self, *args, **kwargs))
+    response = api_client.get("/api/products", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert finds == []
+    monkeypatch.setattr(AsyncIOMotorCollection, "find", find)
+
+    # Updates, creates and deletes all change the ETag
+    etags = {etag}
+    api_client.patch(f"/api/products/{lamp['id']}", json={"price": 2.0})
+    etags.add(api_client.get("/api/products").headers["ETag"])
+    create(api_client, "Desk")
+    etags.add(api_client.get("/api/products").headers["ETag"])
+    api_client.delete(f"/api/products/{lamp['id']}")
+    etags.add(api_client.get("/api/products").headers["ETag"])
+    assert len(etags) == 4
+    assert api_client.get("/api/products", headers={"If-None-Match": etag}).status_code == 200
+
+    assert api_client.get("/api/products", params={"limit": 1}).headers["ETag"] not in etags
+
+
+def test_list_revalidation_still_rejects_bad_cursors(api_client):
+    assert api_client.get("/api/products", params={"cursor": "garbage"}, headers={"If-None-Match": "*"}).status_code == 400
+
+
+@pytest.fixture
+def static_client(tmp_path):
+    digest = hashlib.sha256(b"image").hexdigest()
+    for name in (f"{digest}.png", f"{digest}.w320.webp", "logo.png"):
+        (tmp_path / name).write_bytes(b"image")
+    app = FastAPI()
+    app.mount("/uploads", ImmutableStaticFiles(directory=tmp_path))
+    return TestClient(app), digest
+
+
+def test_only_content_addressed_uploads_are_immutable(static_client):
+    client, digest = static_client
+    assert "immutable" in client.get(f"/uploads/{digest}.png").headers["Cache-Control"]
+    assert "immutable" in client.get(f"/uploads/{digest}.w320.webp").headers["Cache-Control"]
+    assert client.get("/uploads/logo.png").headers["Cache-Control"] == "public, no-cache"
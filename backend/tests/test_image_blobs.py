@@ -0,0 +1,260 @@
+import asyncio
+import hashlib
+import io
+import os
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+from services.image_blobs import ImageBlobs
+from services.image_service import ImageService
+
+KEY = "a" * 64 + ".png"
+
+
+@pytest.fixture
+def blobs(mongo_db):
+    return ImageBlobs(mongo_db)
+
+
+async def stored_blob(blobs, refs=1):
+    for _ in range(refs):
+        await blobs.acquire(KEY, 10, "image/png")
+    await blobs.mark_stored(KEY)
+
+
+@pytest.mark.anyio
+async def test_release_keeps_shared_blobs(blobs):
+    await stored_blob(blobs, refs=2)
+    assert await blobs.release(KEY) is False
+    assert await blobs.is_stored(KEY)
+    assert await blobs.release(KEY) is True
+    assert not await blobs.is_stored(KEY)
+    await blobs.finish_delete(KEY)
+    assert not await blobs.is_tracked(KEY)
+    assert await blobs.release(KEY) is None
+
+
+@pytest.mark.anyio
+async def test_acquire_during_a_delete_waits_and_stores_again(blobs, mongo_db):
+    await stored_blob(blobs)
+    assert await blobs.release(KEY) is True
+
+    # The storage delete is in flight: the upload must not skip its write or race it
+    waiter = asyncio.create_task(blobs.acquire(KEY, 10, "image/png"))
+    await asyncio.sleep(0.2)
+    assert not waiter.done()
+    assert not await blobs.acquire_if_stored(KEY)
+
+    await blobs.finish_delete(KEY)
+    assert await waiter is False
+    blob = await mongo_db.image_blobs.find_one({"_id": KEY})
+    assert (blob["refs"], blob["stored"], blob["deleting"]) == (1, False, False)
+
+    await blobs.mark_stored(KEY)
+    assert await blobs.acquire(KEY, 10, "image/png") is True
+
+
+@pytest.mark.anyio
+async def test_second_release_does_not_delete_twice(blobs):
+    await stored_blob(blobs)
+    assert await blobs.release(KEY) is True
+    assert await blobs.release(KEY) is False
+
+
+@pytest.mark.anyio
+async def test_acquire_takes_over_an_abandoned_delete(blobs, mongo_db):
+    await mongo_db.image_blobs.insert_one({
+        "_id": KEY, "refs": 0, "stored": False, "deleting": True,
+        "deleting_at": datetime.utcnow() - timedelta(minutes=5)
+    })
+    assert await asyncio.wait_for(blobs.acquire(KEY, 10, "image/png"), 1) is False
+    assert (await mongo_db.image_blobs.find_one({"_id": KEY}))["deleting"] is False
+
+
+class FakeS3:
+    """The calls the small-image S3 path makes; delete_object blocks until released"""
+
+    def __init__(self):
+        self.objects = {}
+        self.puts = 0
+        self.allow_delete = threading.Event()
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.puts += 1
+        self.objects[Key] = Body
+
+    def delete_object(self, Bucket, Key):
+        self.allow_delete.wait(5)
+        self.objects.pop(Key, None)
+
+
+def upload_file(data: bytes) -> UploadFile:
+    return UploadFile(io.BytesIO(data), filename="photo.png", headers=Headers({"content-type": "image/png"}))
+
+
+@pytest.mark.anyio
+async def test_s3_upload_during_delete_puts_the_object_again(mongo_db, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    service = ImageService()
+    service.is_production = True
+    service.s3_client = FakeS3()
+    service.bucket_name = "bucket"
+    service.s3_base_url = "https://cdn.example.com"
+
+    data = b"image bytes"
+    url = await service.upload_image(upload_file(data), mongo_db)
+    key = f"images/{hashlib.sha256(data).hexdigest()}.png"
+    assert url == f"https://cdn.example.com/{key}" and service.s3_client.puts == 1
+
+    release = asyncio.create_task(service.release_image(mongo_db, url))
+    while not (await mongo_db.image_blobs.find_one({"_id": key})).get("deleting"):
+        await asyncio.sleep(0.01)
+    upload = asyncio.create_task(service.upload_image(upload_file(data), mongo_db))
+    await asyncio.sleep(0.2)
+    assert service.s3_client.puts == 1
+
+    service.s3_client.allow_delete.set()
+    await release
+    assert await upload == url
+    assert service.s3_client.objects[key] == data
+    assert service.s3_client.puts == 2
+    assert await ImageBlobs(mongo_db).is_stored(key)
+
+
+def create(api_client, name):
+    response = api_client.post("/api/products", json={"name": name, "price": 1.0, "basic_description": "A product"})
+    return response.json()["id"]
+
+
+def upload(api_client, product_id, data):
+    response = api_client.post(f"/api/products/{product_id}/image", files={"file": ("photo.png", data, "image/png")})
+    assert response.status_code == 200
+    return response.json()["image_url"]
+
+
+def image_path(url):
+    return os.path.join("uploads/images", url.rsplit("/", 1)[1])
+
+
+@pytest.mark.parametrize("method", ["patch", "put", "bulk"])
+def test_shared_image_url_survives_deleting_the_uploader(api_client, method):
+    first, second = create(api_client, "Lamp"), create(api_client, "Chair")
+    url = upload(api_client, first, b"lamp photo")
+
+    if method == "patch":
+        response = api_client.patch(f"/api/products/{second}", json={"image_url": url})
+    elif method == "put":
+        product = api_client.get(f"/api/products/{second}").json()
+        response = api_client.put(f"/api/products/{second}", json={**product, "image_url": url})
+    else:
+        response = api_client.post("/api/products:bulk", json={"operations": [{"op": "update", "id": second, "product": {"image_url": url}}]})
+        assert response.json()["counts"] == {"updated": 1}
+    assert response.status_code == 200
+
+    assert api_client.delete(f"/api/products/{first}").status_code == 200
+    assert os.path.exists(image_path(url))
+
+    assert api_client.delete(f"/api/products/{second}").status_code == 200
+    assert not os.path.exists(image_path(url))
+
+
+def test_replacing_a_shared_image_releases_it(api_client, mongo_db):
+    first, second = create(api_client, "Lamp"), create(api_client, "Chair")
+    url = upload(api_client, first, b"lamp photo")
+    api_client.patch(f"/api/products/{second}", json={"image_url": url})
+
+    other = upload(api_client, first, b"other photo")
+    assert os.path.exists(image_path(url))
+    response = api_client.post("/api/products:bulk", json={"operations": [
+        {"op": "update", "id": second, "product": {"image_url": other}},
+        {"op": "delete", "id": first},
+    ]})
+    assert response.json()["counts"] == {"updated": 1, "deleted": 1}
+    assert not os.path.exists(image_path(url))
+    assert os.path.exists(image_path(other))
+
+
+def test_image_url_of_a_deleted_image_is_rejected(api_client):
+    first, second = create(api_client, "Lamp"), create(api_client, "Chair")
+    url = upload(api_client, first, b"lamp photo")
+    api_client.delete(f"/api/products/{first}")
+
+    assert api_client.patch(f"/api/products/{second}", json={"image_url": url}).status_code == 400
+    response = api_client.post("/api/products:bulk", json={"operations": [{"op": "update", "id": second, "product": {"image_url": url}}]})
+    assert response.json()["counts"] == {"invalid": 1}
+
+
+def test_untracked_images_are_kept_while_referenced(api_client):
+    # e.g. generated images, which are not reference counted
+    first, second = create(api_client, "Lamp"), create(api_client, "Chair")
+    url = "/uploads/images/generated.png"
+    with open(image_path(url), "wb") as file:
+        file.write(b"generated")
+    for product_id in (first, second):
+        assert api_client.patch(f"/api/products/{product_id}", json={"image_url": url}).status_code == 200
+
+    api_client.delete(f"/api/products/{first}")
+    assert os.path.exists(image_path(url))
+    api_client.delete(f"/api/products/{second}")
+    assert not os.path.exists(image_path(url))
+
+
+def test_image_urls_outside_the_image_directory_are_never_deleted(api_client):
+    product_id = create(api_client, "Lamp")
+    with open("secret.txt", "w") as file:
+        file.write("secret")
+    api_client.patch(f"/api/products/{product_id}", json={"image_url": "/uploads/images/../../secret.txt"})
+    api_client.delete(f"/api/products/{product_id}")
+    assert os.path.exists("secret.txt")
+
+
+@pytest.mark.anyio
+async def test_failed_upload_does_not_leave_a_delete_behind(blobs):
+    await blobs.acquire(KEY, 10, "image/png")
+    await blobs.abandon(KEY)
+    assert not await blobs.is_tracked(KEY)
+    assert await asyncio.wait_for(blobs.acquire(KEY, 10, "image/png"), 1) is False
+
+
+def test_generating_an_image_releases_the_uploaded_one(api_client, mongo_db, monkeypatch):
+    from services.openai_service import OpenAIService
+
+    async def generate_image(self, prompt):
+        with open("uploads/images/generated.png", "wb") as file:
+            file.write(b"generated")
+        return "http://localhost:8000/uploads/images/generated.png"
+
+    monkeypatch.setattr(OpenAIService, "generate_image", generate_image)
+    product_id = create(api_client, "Lamp")
+    url = upload(api_client, product_id, b"lamp photo")
+
+    response = api_client.post(f"/api/products/{product_id}/generate-field", params={"field": "image_url"}, json={})
+    assert response.status_code == 200
+    assert not os.path.exists(image_path(url))
+    assert asyncio.run(mongo_db.image_blobs.count_documents({})) == 0
+    assert api_client.get(f"/api/products/{product_id}").json()["image_url"].endswith("/generated.png")
+
+
+def test_content_generation_without_an_image_keeps_the_product_image(api_client, mongo_db, monkeypatch):
+    from bson import ObjectId
+
+    from services.openai_service import OpenAIService
+
+    async def complete(self, system_message, prompt, **kwargs):
+        return "Title\n\nDescription"
+
+    monkeypatch.setattr(OpenAIService, "_complete", complete)
+    monkeypatch.setenv("GEN_PROD_IMAGE_ALONG_WITH_DESC", "false")
+    product_id = create(api_client, "Lamp")
+    url = upload(api_client, product_id, b"lamp photo")
+    product = api_client.get(f"/api/products/{product_id}").json()
+
+    options = {"tone": "friendly", "length": "short", "audience": "everyone"}
+    generated = asyncio.run(OpenAIService().generate_basic_data(product, mongo_db, ObjectId(product_id), options, {}))
+    assert "image_url" not in generated
+    assert api_client.get(f"/api/products/{product_id}").json()["image_url"] == url
+    assert os.path.exists(image_path(url))
@@ -0,0 +1,86 @@
+import hashlib
+import io
+import os
+
+import pytest
+from fastapi import FastAPI, File, Request, UploadFile
+from fastapi.testclient import TestClient
+from starlette.datastructures import Headers
+
+from services.image_service import ImageService, ImageTooLargeError
+from utils.body_limit import BodySizeLimitMiddleware
+
+
+@pytest.fixture
+def limited_client():
+    app = FastAPI()
+    app.add_middleware(BodySizeLimitMiddleware, max_bytes=1000, paths=r"/api/products/[^/]+/image")
+
+    @app.post("/api/products/{product_id}/image")
+    async def upload(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    @app.post("/api/other")
+    async def other(request: Request):
+        return {"size": len(await request.body())}
+
+    return TestClient(app)
+
+
+def test_body_limit_rejects_large_content_length(limited_client):
+    response = limited_client.post("/api/products/1/image", files={"file": ("a.png", b"x" * 2000, "image/png")})
+    assert response.status_code == 413
+
+
+def test_body_limit_cuts_off_chunked_bodies(limited_client):
+    chunks = (b"x" * 400 for _ in range(5))
+    response = limited_client.post("/api/products/1/image", content=chunks, headers={"Content-Type": "multipart/form-data; boundary=b"})
+    assert response.status_code == 413
+
+
+def test_body_limit_passes_small_bodies_and_other_paths(limited_client):
+    response = limited_client.post("/api/products/1/image", files={"file": ("a.png", b"x" * 100, "image/png")})
+    assert response.json() == {"size": 100}
+    assert limited_client.post("/api/other", content=b"x" * 2000).json() == {"size": 2000}
+
+
+def upload_file(data: bytes) -> UploadFile:
+    return UploadFile(io.BytesIO(data), filename="photo.PNG", headers=Headers({"content-type": "image/png"}))
+
+
+@pytest.fixture
+def local_images(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("ENVIRONMENT", raising=False)
+    service = ImageService()
+    service.max_upload_bytes = 1000
+    service.chunk_size = 100
+    return service
+
+
+@pytest.mark.anyio
+async def test_local_upload_is_written_outside_the_public_directory(local_images, mongo_db, monkeypatch):
+    temp_paths = []
+    claim = ImageService._claim_local_file
+
+    async def spy(self, temp_path, *args):
+        temp_paths.append(temp_path)
+        return await claim(self, temp_path, *args)
+
+    monkeypatch.setattr(ImageService, "_claim_local_file", spy)
+    data = b"image bytes" * 50
+    url = await local_images.upload_image(upload_file(data), mongo_db)
+
+    assert url == f"/uploads/images/{hashlib.sha256(data).hexdigest()}.png"
+    assert os.path.dirname(temp_paths[0]) == local_images.incoming_dir
+    assert os.listdir(local_images.upload_dir) == [url.rsplit("/", 1)[1]]
+    assert os.listdir(local_images.incoming_dir) == []
+
+
+@pytest.mark.anyio
+async def test_oversized_local_upload_leaves_no_files(local_images, mongo_db):
+    with pytest.raises(ImageTooLargeError):
+        await local_images.upload_image(upload_file(b"x" * 1001), mongo_db)
+    assert os.listdir(local_images.upload_dir) == []
+    assert os.listdir(local_images.incoming_dir) == []
+    assert await mongo_db.image_blobs.count_documents({}) == 0
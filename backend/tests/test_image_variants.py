@@ -0,0 +1,40 @@
+import io
+
+import pytest
+from PIL import Image
+
+from services.image_variants import ImageVariantPipeline, variant_filename
+
+
+def png(width: int, height: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def test_variant_filename():
+    assert variant_filename("abc.png", 320, "webp") == "abc.w320.webp"
+    assert variant_filename("abc.png", 640, "jpeg") == "abc.w640.jpg"
+
+
+@pytest.fixture
+def pipeline():
+    pipeline = ImageVariantPipeline(widths=[16, 32, 128], formats=["jpeg"], quality=80, workers=1)
+    yield pipeline
+    pipeline.shutdown()
+
+
+def test_workers_are_not_forked(pipeline):
+    # Forking the threaded API process can copy locks held by other threads
+    assert pipeline.start()._mp_context.get_start_method() in ("forkserver", "spawn")
+    assert pipeline.start() is pipeline.start()
+
+
+@pytest.mark.anyio
+async def test_render_in_the_pool(pipeline):
+    pipeline.start()
+    rendered = await pipeline.render(png(64, 32))
+    # Widths above the original are skipped
+    assert [(width, fmt) for width, fmt, _ in rendered] == [(16, "jpeg"), (32, "jpeg")]
+    with Image.open(io.BytesIO(rendered[0][2])) as image:
+        assert image.size == (16, 8)
@@ -0,0 +1,259 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from services.job_queue import (
+    ABANDONED_ERROR, JOB_COMPLETED, JOB_FAILED, JOB_PENDING, JOB_RUNNING, InMemoryJobStore, JobQueue
+)
+
+pytestmark = pytest.mark.anyio
+
+
+async def make_queue(handler, max_attempts=3):
+    queue = JobQueue()
+    queue.max_attempts = max_attempts
+    queue.store = InMemoryJobStore()
+    queue.register("test", handler)
+    job = await queue.enqueue("test", ObjectId(), {"n": 1})
+    return queue, job
+
+
+def expire_lease(queue, job_id):
+    queue.store.jobs[job_id]["lease_expires_at"] = datetime.utcnow() - timedelta(seconds=1)
+
+
+async def test_claim_leases_each_job_to_one_worker():
+    queue, job = await make_queue(lambda context: None)
+    claimed = await queue.store.claim("w1", lease_seconds=60)
+    assert claimed["_id"] == job["_id"]
+    assert claimed["status"] == JOB_RUNNING
+    assert claimed["lease_owner"] == "w1"
+    assert claimed["attempts"] == 1
+    assert await queue.store.claim("w2", lease_seconds=60) is None
+
+
+async def test_claim_skips_jobs_waiting_for_backoff():
+    queue, job = await make_queue(lambda context: None)
+    queue.store.jobs[job["_id"]]["available_at"] = datetime.utcnow() + timedelta(seconds=30)
+    assert await queue.store.claim("w1", lease_seconds=60) is None
+
+
+async def test_expired_lease_is_taken_over_and_fences_the_old_worker():
+    queue, job = await make_queue(lambda context: None)
+    await queue.store.claim("w1", lease_seconds=60)
+    expire_lease(queue, job["_id"])
+
+    claimed = await queue.store.claim("w2", lease_seconds=60)
+    assert claimed["lease_owner"] == "w2"
+    assert claimed["attempts"] == 2
+    assert not await queue.store.update(job["_id"], "w1", {"result": "stale"})
+    assert await queue.store.update(job["_id"], "w2", {"result": "fresh"})
+
+
+async def test_expired_lease_on_the_last_attempt_fails_the_job():
+    queue, job = await make_queue(lambda context: None, max_attempts=2)
+    for worker in ("w1", "w2"):
+        assert await queue.store.claim(worker, lease_seconds=60) is not None
+        expire_lease(queue, job["_id"])
+
+    assert await queue.store.claim("w3", lease_seconds=60) is None
+    assert [failed["_id"] for failed in await queue.store.fail_abandoned(datetime.utcnow())] == [job["_id"]]
+    failed = await queue.get(job["_id"])
+    assert failed["status"] == JOB_FAILED
+    assert failed["error"] == ABANDONED_ERROR
+    assert failed["attempts"] == 2
+    assert await queue.store.fail_abandoned(datetime.utcnow()) == []
+
+
+async def test_live_lease_is_not_failed():
+    queue, job = await make_queue(lambda context: None, max_attempts=1)
+    await queue.store.claim("w1", lease_seconds=60)
+    assert await queue.store.fail_abandoned(datetime.utcnow()) == []
+    assert (await queue.get(job["_id"]))["status"] == JOB_RUNNING
+
+
+async def test_successful_run_records_result_and_progress():
+    async def handler(context):
+        await context.progress("halfway", step=1)
+        return {"done": True}
+
+    queue, job = await make_queue(handler)
+    claimed = await queue.store.claim("w1", lease_seconds=60)
+    await queue._run(claimed, "w1")
+
+    finished = await queue.get(job["_id"])
+    assert finished["status"] == JOB_COMPLETED
+    assert finished["result"] == {"done": True}
+    assert finished["lease_owner"] is None
+    assert [entry["message"] for entry in finished["progress"]] == [JOB_RUNNING, "halfway", JOB_COMPLETED]
+
+
+async def test_failed_run_is_retried_with_backoff_then_fails():
+    async def handler(context):
+        raise RuntimeError("boom")
+
+    queue, job = await make_queue(handler, max_attempts=2)
+    claimed = await queue.store.claim("w1", lease_seconds=60)
+    started = datetime.utcnow()
+    await queue._run(claimed, "w1")
+
+    retrying = await queue.get(job["_id"])
+    assert retrying["status"] == JOB_PENDING
+    assert retrying["error"] == "boom"
+    # 2 ** attempts seconds plus up to a second of jitter
+    assert started + timedelta(seconds=2) <= retrying["available_at"] <= datetime.utcnow() + timedelta(seconds=3)
+    assert await queue.store.claim("w1", lease_seconds=60) is None
+
+    queue.store.jobs[job["_id"]]["available_at"] = datetime.utcnow()
+    claimed = await queue.store.claim("w2", lease_seconds=60)
+    assert claimed["attempts"] == 2
+    await queue._run(claimed, "w2")
+
+    failed = await queue.get(job["_id"])
+    assert failed["status"] == JOB_FAILED
+    assert failed["error"] == "boom"
+    assert await queue.store.claim("w3", lease_seconds=60) is None
+
+
+async def test_enqueue_rejects_unknown_job_types():
+    queue, _ = await make_queue(lambda context: None)
+    with pytest.raises(ValueError):
+        await queue.enqueue("missing", ObjectId(), {})
+
+
+async def test_mongo_store_bounds_expired_lease_retries(mongo_db):
+    from services.job_queue import MongoJobStore
+
+    store = MongoJobStore(mongo_db)
+    now = datetime.utcnow()
+    job = await store.insert({
+        "status": JOB_PENDING, "attempts": 0, "max_attempts": 1, "progress": [],
+        "available_at": now, "lease_expires_at": None, "lease_owner": None
+    })
+    assert (await store.claim("w1", lease_seconds=60))["attempts"] == 1
+    await mongo_db.jobs.update_one({"_id": job["_id"]}, {"$set": {"lease_expires_at": now - timedelta(seconds=1)}})
+
+    assert await store.claim("w2", lease_seconds=60) is None
+    assert len(await store.fail_abandoned(datetime.utcnow())) == 1
+    assert await store.fail_abandoned(datetime.utcnow()) == []
+    failed = await store.get(job["_id"])
+    assert failed["status"] == JOB_FAILED
+    assert failed["progress"][-1]["error"] == ABANDONED_ERROR
+
+
+async def test_basic_data_job_reports_fields_as_each_completion_returns(mongo_db, tmp_path, monkeypatch):
+    import asyncio
+
+    from services import generation_jobs
+    from services.job_queue import JobContext
+    from services.openai_service import BASIC_PRODUCT_FIELDS, OpenAIService
+
+    description_released = asyncio.Event()
+
+    async def fake_complete(self, system_message, prompt, temperature, max_tokens, use_cache=True, response_format=None, kind="completion"):
+        if kind == "product_description":
+            await description_released.wait()
+            return "A long description"
+        return "Title\n\nMeta\n\nf1, f2\n\ncotton\n\nred\n\nt1\n\nShort"
+
+    monkeypatch.setattr(OpenAIService, "_complete", fake_complete)
+    # Saving the result sets up local image storage
+    monkeypatch.chdir(tmp_path)
+    user_id = ObjectId()
+    product_id = (await mongo_db.products.insert_one({
+        "user_id": user_id, "name": "Mug", "price": 5.0, "basic_description": "A mug"
+    })).inserted_id
+
+    queue = JobQueue()
+    queue.db = mongo_db
+    queue.store = InMemoryJobStore()
+    queue.register(generation_jobs.GENERATE_BASIC_DATA, generation_jobs.generate_basic_data_job)
+    job = await queue.enqueue(generation_jobs.GENERATE_BASIC_DATA, user_id, {
+        "descriptionOptions": {"tone": "warm", "length": "short", "audience": "everyone"}
+    }, product_id=product_id)
+    claimed = await queue.store.claim("w1", lease_seconds=60)
+    running = asyncio.create_task(generation_jobs.generate_basic_data_job(JobContext(queue, claimed, "w1")))
+
+    for _ in range(100):
+        progress = (await queue.get(job["_id"]))["progress"]
+        if len(progress) == len(BASIC_PRODUCT_FIELDS):
+            break
+        await asyncio.sleep(0.01)
+    # The basic fields are reported while the description is still being generated
+    assert [entry["field"] for entry in progress] == BASIC_PRODUCT_FIELDS
+    assert not running.done()
+
+    description_released.set()
+    result = await running
+    assert result["detailed_description"] == "A long description"
+    assert (await queue.get(job["_id"]))["progress"][-1]["field"] == "detailed_description"
+
+
+async def test_finalizer_runs_once_when_a_job_ends():
+    finished = []
+
+    async def on_finished(job):
+        finished.append((job["_id"], job["attempts"]))
+
+    async def handler(context):
+        raise RuntimeError("boom")
+
+    queue, job = await make_queue(handler, max_attempts=2)
+    queue.finalizers["test"] = on_finished
+    await queue._run(await queue.store.claim("w1", lease_seconds=60), "w1")
+    assert finished == []
+
+    queue.store.jobs[job["_id"]]["available_at"] = datetime.utcnow()
+    await queue._run(await queue.store.claim("w1", lease_seconds=60), "w1")
+    assert finished == [(job["_id"], 2)]
+
+
+@pytest.mark.parametrize("omitted", [None, "tags"])
+async def test_complete_job_makes_one_structured_call(mongo_db, tmp_path, monkeypatch, omitted):
+    import json
+    from types import SimpleNamespace
+
+    from services import generation_jobs, openai_service
+    from services.job_queue import JobContext
+    from services.openai_service import GENERATABLE_FIELDS, LIST_FIELDS
+
+    requests = []
+
+    async def create(**request):
+        requests.append(request)
+        if "response_format" in request:
+            data = {field: ["one", "two"] if field in LIST_FIELDS else f"{field} text" for field in GENERATABLE_FIELDS}
+            data.pop(omitted, None)
+            content = json.dumps(data)
+        else:
+            content = "t1, t2"
+        message = SimpleNamespace(content=content)
+        completion = SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")], usage=None)
+        return SimpleNamespace(headers={}, parse=lambda: completion)
+
+    chat = SimpleNamespace(completions=SimpleNamespace(with_raw_response=SimpleNamespace(create=create)))
+    monkeypatch.setattr(openai_service, "AsyncOpenAI", lambda **kwargs: SimpleNamespace(chat=chat))
+    monkeypatch.chdir(tmp_path)
+    user_id = ObjectId()
+    product_id = (await mongo_db.products.insert_one({
+        "user_id": user_id, "name": "Mug", "price": 5.0, "basic_description": "A mug"
+    })).inserted_id
+
+    queue = JobQueue()
+    queue.db = mongo_db
+    queue.store = InMemoryJobStore()
+    queue.register(generation_jobs.COMPLETE_PRODUCT, generation_jobs.complete_product_job)
+    job = await queue.enqueue(generation_jobs.COMPLETE_PRODUCT, user_id, {"bypassCache": True}, product_id=product_id)
+    claimed = await queue.store.claim("w1", lease_seconds=60)
+    result = await generation_jobs.complete_product_job(JobContext(queue, claimed, "w1"))
+
+    # Only a key the structured call missed costs a call of its own
+    assert len(requests) == (1 if omitted is None else 2)
+    assert set(result) == set(GENERATABLE_FIELDS)
+    progress = [entry["field"] for entry in (await queue.get(job["_id"]))["progress"]]
+    assert sorted(progress) == sorted(GENERATABLE_FIELDS)
+    if omitted:
+        assert progress[-1] == omitted and result[omitted] == ["t1", "t2"]
+    product = await mongo_db.products.find_one({"_id": product_id})
+    assert product["marketing_copy"]["social_media"]["twitter"] == "marketing_copy.social_media.twitter text"
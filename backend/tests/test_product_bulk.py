@@ -0,0 +1,148 @@
+import os
+
+import pytest
+from bson import ObjectId
+
+from models.product import BulkProductOperation
+from services.product_bulk import execute_bulk
+
+pytestmark = pytest.mark.anyio
+
+USER_ID = ObjectId()
+OTHER_USER_ID = ObjectId()
+
+
+def new_product(name: str) -> dict:
+    return {"name": name, "price": 10.0, "basic_description": "A product"}
+
+
+def op(op: str, id=None, product=None) -> BulkProductOperation:
+    return BulkProductOperation(op=op, id=str(id) if id else None, product=product)
+
+
+@pytest.fixture(autouse=True)
+def local_storage(tmp_path, monkeypatch):
+    # ImageService creates its local directories in the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("ENVIRONMENT", raising=False)
+
+
+@pytest.fixture
+async def products(mongo_db):
+    """Two products owned by USER_ID and one by another user"""
+    ids = [ObjectId(), ObjectId(), ObjectId()]
+    await mongo_db.products.insert_many([
+        {"_id": ids[0], "user_id": USER_ID, "name": "Lamp", "version": 0},
+        {"_id": ids[1], "user_id": USER_ID, "name": "Chair", "version": 0},
+        {"_id": ids[2], "user_id": OTHER_USER_ID, "name": "Desk", "version": 0},
+    ])
+    # A unique name makes a create fail inside bulk_write rather than in validation
+    await mongo_db.products.create_index([("user_id", 1), ("name", 1)], unique=True)
+    return ids
+
+
+def statuses(results):
+    return [result["status"] for result in results]
+
+
+async def test_mixed_operations(mongo_db, products):
+    results = await execute_bulk(mongo_db, USER_ID, [
+        op("create", product=new_product("Sofa")),
+        op("update", products[0], {"price": 25.0}),
+        op("delete", products[1]),
+    ])
+
+    assert statuses(results) == ["created", "updated", "deleted"]
+    created = await mongo_db.products.find_one({"_id": ObjectId(results[0]["id"])})
+    assert created["user_id"] == USER_ID and created["name"] == "Sofa"
+    updated = await mongo_db.products.find_one({"_id": products[0]})
+    assert updated["price"] == 25.0 and updated["version"] == 1
+    assert await mongo_db.products.find_one({"_id": products[1]}) is None
+
+
+async def test_invalid_and_foreign_operations_are_not_sent(mongo_db, products):
+    results = await execute_bulk(mongo_db, USER_ID, [
+        op("update", products[2], {"price": 1.0}),
+        op("delete", ObjectId()),
+        op("update", "not-an-id", {"price": 1.0}),
+        op("update", products[0], {}),
+        op("create", product={"name": "No description"}),
+        op("update", products[0], {"user_id": str(OTHER_USER_ID)}),
+    ])
+
+    assert statuses(results) == ["not_found", "not_found", "invalid", "invalid", "invalid", "invalid"]
+    assert (await mongo_db.products.find_one({"_id": products[2]}))["version"] == 0
+    assert (await mongo_db.products.find_one({"_id": products[0]}))["user_id"] == USER_ID
+
+
+async def test_update_after_delete_in_the_same_batch(mongo_db, products):
+    results = await execute_bulk(mongo_db, USER_ID, [
+        op("delete", products[0]),
+        op("update", products[0], {"price": 1.0}),
+    ])
+    assert statuses(results) == ["deleted", "not_found"]
+
+
+async def test_unordered_runs_past_failures(mongo_db, products):
+    results = await execute_bulk(mongo_db, USER_ID, [
+        op("create", product=new_product("Lamp")),
+        op("update", ObjectId(), {"price": 1.0}),
+        op("create", product=new_product("Sofa")),
+        op("update", products[0], {"price": 5.0}),
+    ], ordered=False)
+
+    assert statuses(results) == ["failed", "not_found", "created", "updated"]
+    assert "Duplicate" in results[0]["error"]
+    assert await mongo_db.products.count_documents({"user_id": USER_ID}) == 3
+
+
+async def test_ordered_stops_at_a_validation_failure(mongo_db, products):
+    results = await execute_bulk(mongo_db, USER_ID, [
+        op("update", products[0], {"price": 5.0}),
+        op("update", products[2], {"price": 1.0}),
+        op("create", product=new_product("Sofa")),
+    ], ordered=True)
+
+    assert statuses(results) == ["updated", "not_found", "skipped"]
+    assert await mongo_db.products.find_one({"name": "Sofa"}) is None
+
+
+async def test_ordered_stops_at_a_write_failure(mongo_db, products):
+    results = await execute_bulk(mongo_db, USER_ID, [
+        op("create", product=new_product("Sofa")),
+        op("create", product=new_product("Lamp")),
+        op("delete", products[1]),
+    ], ordered=True)
+
+    assert statuses(results) == ["created", "failed", "skipped"]
+    assert await mongo_db.products.find_one({"_id": products[1]}) is not None
+
+
+def test_bulk_route_limits_the_batch_size(api_client, monkeypatch):
+    from routes import products as product_routes
+    monkeypatch.setitem(product_routes.config, "PRODUCTS_BULK_MAX_OPERATIONS", 2)
+
+    operations = [{"op": "create", "product": new_product(f"Product {index}")} for index in range(3)]
+    assert api_client.post("/api/products:bulk", json={"operations": operations}).status_code == 413
+
+    response = api_client.post("/api/products:bulk", json={"operations": operations[:2], "ordered": True})
+    assert response.status_code == 200
+    assert response.json()["counts"] == {"created": 2}
+
+
+async def test_image_url_writes_schedule_variants(mongo_db, products, monkeypatch):
+    from services import product_bulk
+    scheduled = []
+    monkeypatch.setattr(product_bulk.image_variants, "schedule", lambda db, product_id, image_url: scheduled.append((product_id, image_url)))
+    os.makedirs("uploads/images")
+    with open("uploads/images/a.png", "wb") as file:
+        file.write(b"image")
+
+    results = await execute_bulk(mongo_db, USER_ID, [
+        op("update", products[0], {"image_url": "/uploads/images/a.png"}),
+        op("update", products[1], {"price": 2.0}),
+        op("update", products[2], {"image_url": "/uploads/images/c.png"}),
+    ])
+
+    assert statuses(results) == ["updated", "updated", "not_found"]
+    assert scheduled == [(products[0], "/uploads/images/a.png")]
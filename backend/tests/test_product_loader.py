@@ -0,0 +1,76 @@
+import io
+import json
+import os
+
+import pytest
+
+from services.product_loader import MappedRecords, ensure_jsonl, iter_json_array, iter_products
+
+PRODUCTS = [
+    {"id": "prod001", "name": "Runner", "price": 89.99, "tags": ["running", "road"]},
+    {"id": "prod002", "name": "Headphones", "price": 199.99, "marketing_copy": {"email": "Hi \"there\" ]"}},
+    {"id": "prod003", "name": "Trail [waterproof]", "price": 120.0},
+    {"id": "prod007", "name": "Speaker, portable", "price": 89.99},
+]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 16])
+def test_json_array_is_parsed_across_chunk_boundaries(chunk_size):
+    text = json.dumps(PRODUCTS, indent=2)
+    assert list(iter_json_array(io.StringIO(text), chunk_size=chunk_size)) == PRODUCTS
+
+
+def test_json_array_edge_cases():
+    assert list(iter_json_array(io.StringIO(" [ ] "))) == []
+    assert list(iter_json_array(io.StringIO(""))) == []
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO('{"id": "prod001"}')))
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO('[{"id": "prod001"}, '), chunk_size=4))
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_array(io.StringIO('[{"id": ]'), chunk_size=4))
+
+
+def test_jsonl_skips_blank_lines(tmp_path):
+    path = tmp_path / "products.jsonl"
+    path.write_text("\n".join(json.dumps(product) for product in PRODUCTS[:2]) + "\n\n")
+    assert list(iter_products(str(path))) == PRODUCTS[:2]
+
+
+def test_jsonl_sidecar_is_reused_until_the_source_changes(tmp_path):
+    source = tmp_path / "products.json"
+    source.write_text(json.dumps(PRODUCTS[:2]))
+    sidecar = ensure_jsonl(str(source))
+    assert sidecar == f"{source}.jsonl"
+    assert list(iter_products(sidecar)) == PRODUCTS[:2]
+    assert ensure_jsonl(sidecar) == sidecar
+
+    mtime = os.path.getmtime(sidecar)
+    assert ensure_jsonl(str(source)) == sidecar and os.path.getmtime(sidecar) == mtime
+    source.write_text(json.dumps(PRODUCTS))
+    os.utime(source, (mtime + 10, mtime + 10))
+    assert list(iter_products(ensure_jsonl(str(source)))) == PRODUCTS
+
+
+def test_mapped_records_decode_on_access_with_an_overlay(tmp_path):
+    path = tmp_path / "products.jsonl"
+    path.write_text("".join(json.dumps(product) + "\n" for product in PRODUCTS))
+    records = MappedRecords(str(path))
+    assert list(records.scan()) == PRODUCTS
+    assert records["prod002"] == PRODUCTS[1]
+    # Decoded per access: mutating a returned record does not change the store
+    records["prod002"]["name"] = "changed"
+    assert records["prod002"]["name"] == "Headphones"
+
+    records["prod001"] = {**PRODUCTS[0], "price": 1}
+    records["prod999"] = {"id": "prod999"}
+    del records["prod003"]
+    assert list(records) == ["prod001", "prod002", "prod007", "prod999"]
+    assert records["prod001"]["price"] == 1
+    assert "prod003" not in records and len(records) == 4
+
+
+def test_empty_file_can_be_mapped(tmp_path):
+    path = tmp_path / "products.jsonl"
+    path.write_text("")
+    assert list(MappedRecords(str(path)).scan()) == []
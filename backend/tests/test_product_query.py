@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from services.product_query import (
+    InvalidQueryError,
+    build_projection,
+    decode_cursor,
+    encode_cursor,
+    keyset_filter,
+    parse_fields,
+    parse_sort,
+)
+
+
+def test_parse_sort():
+    assert parse_sort("price") == ("price", 1)
+    assert parse_sort("-created_at") == ("created_at", -1)
+    with pytest.raises(InvalidQueryError):
+        parse_sort("-user_id")
+
+
+def test_parse_fields():
+    assert parse_fields(None) is None
+    assert parse_fields("name, price,,") == ["name", "price"]
+    with pytest.raises(InvalidQueryError):
+        parse_fields("name,password")
+
+
+def test_projection_keeps_the_sort_field_and_version():
+    assert build_projection(None, "price") is None
+    assert build_projection(["name"], "price") == {"name": 1, "price": 1, "version": 1}
+
+
+@pytest.mark.parametrize("value", [None, "Lamp", 19.5, datetime(2024, 5, 1, 12, 30)])
+def test_cursor_roundtrip(value):
+    document = {"_id": ObjectId(), "price": value}
+    cursor = encode_cursor(document, "price")
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (value, document["_id"])
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", encode_cursor({"_id": "abc"}, "price")])
+def test_invalid_cursor(cursor):
+    with pytest.raises(InvalidQueryError):
+        decode_cursor(cursor)
+
+
+async def page_through(collection, sort_field, direction, limit):
+    """Follow cursors the way GET /products does and return the _ids in page order"""
+    seen, cursor = [], None
+    while True:
+        query = {}
+        if cursor:
+            query.update(keyset_filter(sort_field, direction, *decode_cursor(cursor)))
+        page = await collection.find(query).sort([(sort_field, direction), ("_id", direction)]).limit(limit).to_list(length=limit)
+        if not page:
+            return seen
+        seen.extend(document["_id"] for document in page)
+        cursor = encode_cursor(page[-1], sort_field)
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("direction", [1, -1])
+@pytest.mark.parametrize("limit", [1, 2, 3])
+async def test_keyset_pages_cover_every_row_once(mongo_db, direction, limit):
+    # Duplicate, null and missing sort values all have to be stepped over by _id
+    prices = [5.0, None, 5.0, 3.0, None, 9.0, 3.0, "missing"]
+    documents = []
+    for price in prices:
+        document = {"_id": ObjectId()}
+        if price != "missing":
+            document["price"] = price
+        documents.append(document)
+    await mongo_db.products.insert_many(documents)
+
+    expected = await mongo_db.products.find({}).sort([("price", direction), ("_id", direction)]).to_list(length=None)
+    assert await page_through(mongo_db.products, "price", direction, limit) == [document["_id"] for document in expected]
+
+
+@pytest.mark.anyio
+async def test_keyset_pages_by_date(mongo_db):
+    start = datetime(2024, 1, 1)
+    await mongo_db.products.insert_many([
+        {"_id": ObjectId(), "created_at": start + timedelta(minutes=index // 2)} for index in range(7)
+    ])
+    expected = await mongo_db.products.find({}).sort([("created_at", -1), ("_id", -1)]).to_list(length=None)
+    assert await page_through(mongo_db.products, "created_at", -1, 2) == [document["_id"] for document in expected]
+
+
+def test_product_list_pages_through_the_api(api_client, api_user, mongo_db):
+    for index in range(5):
+        response = api_client.post("/api/products", json={"name": f"Product {index}", "price": float(index % 2), "basic_description": "A product"})
+        assert response.status_code == 200
+
+    names, cursor = [], None
+    while True:
+        params = {"limit": 2, "sort": "-price", "fields": "name"}
+        if cursor:
+            params["cursor"] = cursor
+        response = api_client.get("/api/products", params=params)
+        assert response.status_code == 200
+        names.extend(product["name"] for product in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert sorted(names) == [f"Product {index}" for index in range(5)]
+    assert set(names[:2]) == {"Product 1", "Product 3"}
+    assert api_client.get("/api/products", params={"cursor": "garbage"}).status_code == 400
@@ -0,0 +1,226 @@
+import json
+import time
+
+import pytest
+
+from services import product_service
+from services.product_service import ProductService
+
+PRODUCTS = [
+    {"id": "prod001", "name": "Runner", "price": 89.99, "brand": "SportsFlex", "category": "Footwear", "subcategory": "Running"},
+    {"id": "prod002", "name": "Headphones", "price": 199.99, "brand": "SoundTech", "category": "Electronics", "subcategory": "Audio"},
+    {"id": "prod003", "name": "Trail", "price": 120.0, "brand": "SportsFlex", "category": "Footwear", "subcategory": "Trail"},
+    {"id": "prod007", "name": "Speaker", "price": 89.99, "brand": "SoundTech", "category": "Electronics", "subcategory": "Audio"},
+]
+
+
+@pytest.fixture
+def make_service(tmp_path, monkeypatch):
+    """Build a ProductService over a copy of PRODUCTS with the given config overrides"""
+    def make(filename="products.json", products=PRODUCTS, **overrides):
+        path = tmp_path / filename
+        if not path.exists():
+            with open(path, "w") as file:
+                if filename.endswith(".jsonl"):
+                    file.writelines(json.dumps(product) + "\n" for product in products)
+                else:
+                    json.dump(products, file)
+        settings = {
+            "DATA_PATH": str(path),
+            "PRODUCT_STORE_MODE": "snapshot",
+            "PRODUCT_LOAD_MODE": "eager",
+            "PRODUCT_WAL_FSYNC_INTERVAL_SECONDS": 0,
+            "PRODUCT_WAL_COMPACT_AFTER": 10000,
+            **overrides,
+        }
+        for key, value in settings.items():
+            monkeypatch.setitem(product_service.config, key, value)
+        return ProductService()
+    return make
+
+
+def ids(products):
+    return [product["id"] for product in products]
+
+
+def test_lookups_use_the_indexes(make_service):
+    service = make_service()
+    assert service.get_product_by_id("prod002")["name"] == "Headphones"
+    assert service.get_product_by_id("missing") is None
+    assert ids(service.get_products_by_category("Footwear")) == ["prod001", "prod003"]
+    assert ids(service.get_products_by_brand("SoundTech")) == ["prod002", "prod007"]
+    assert ids(service.get_products_by_subcategory("Audio")) == ["prod002", "prod007"]
+    assert service.get_products_by_category("Garden") == []
+
+
+def test_price_range_is_inclusive_and_open_ended(make_service):
+    service = make_service()
+    assert sorted(ids(service.get_products_by_price_range(89.99, 120))) == ["prod001", "prod003", "prod007"]
+    assert ids(service.get_products_by_price_range(150, None)) == ["prod002"]
+    assert service.get_products_by_price_range(1, 10) == []
+
+
+def test_update_moves_the_record_between_index_buckets(make_service):
+    service = make_service()
+    updated = service.update_product("prod001", {"category": "Electronics", "price": 250, "id": "ignored"})
+    assert updated["id"] == "prod001"
+    assert ids(service.get_products_by_category("Footwear")) == ["prod003"]
+    assert "prod001" in ids(service.get_products_by_category("Electronics"))
+    assert ids(service.get_products_by_price_range(200, None)) == ["prod001"]
+    assert service.update_product("missing", {"price": 1}) is None
+    # The record keeps its position in the catalogue
+    assert ids(service.get_all_products())[0] == "prod001"
+
+
+def test_delete_removes_every_index_entry(make_service):
+    service = make_service()
+    assert service.delete_product("prod002")["name"] == "Headphones"
+    assert service.delete_product("prod002") is None
+    assert ids(service.get_products_by_brand("SoundTech")) == ["prod007"]
+    assert ids(service.get_products_by_price_range(150, None)) == []
+    assert "Audio" in service._indexes["subcategory"]
+    service.delete_product("prod007")
+    assert "Audio" not in service._indexes["subcategory"]
+
+
+def test_new_ids_continue_after_the_highest_ever_seen(make_service):
+    service = make_service()
+    assert service.add_product({"name": "Mat", "price": 30, "category": "Yoga"})["id"] == "prod008"
+    service.delete_product("prod008")
+    assert service.add_product({"name": "Block", "price": 10})["id"] == "prod009"
+    assert ids(service.get_products_by_category("Yoga")) == []
+
+
+def test_snapshot_mode_persists_changes(make_service, tmp_path):
+    service = make_service()
+    service.add_product({"name": "Mat", "price": 30})
+    service.delete_product("prod001")
+    with open(tmp_path / "products.json") as file:
+        assert ids(json.load(file)) == ["prod002", "prod003", "prod007", "prod008"]
+
+
+def read_lines(path):
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def test_journal_appends_changes_instead_of_rewriting(make_service, tmp_path):
+    service = make_service(PRODUCT_STORE_MODE="journal")
+    service.update_product("prod001", {"price": 10})
+    service.add_product({"name": "Mat", "price": 30, "brand": "Zen"})
+    service.delete_product("prod002")
+    service.close()
+
+    with open(tmp_path / "products.json") as file:
+        assert json.load(file) == PRODUCTS
+    assert [entry["op"] for entry in read_lines(tmp_path / "products.json.wal")] == ["put", "put", "delete"]
+
+
+def test_journal_is_replayed_on_startup(make_service):
+    service = make_service(PRODUCT_STORE_MODE="journal")
+    service.update_product("prod001", {"price": 10, "brand": "Budget"})
+    service.add_product({"name": "Mat", "price": 30})
+    service.delete_product("prod002")
+    service.close()
+
+    restarted = make_service(PRODUCT_STORE_MODE="journal")
+    assert ids(restarted.get_all_products()) == ["prod001", "prod003", "prod007", "prod008"]
+    assert ids(restarted.get_products_by_brand("Budget")) == ["prod001"]
+    assert ids(restarted.get_products_by_brand("SoundTech")) == ["prod007"]
+    assert ids(restarted.get_products_by_price_range(0, 50)) == ["prod001", "prod008"]
+    assert restarted.add_product({"name": "Block", "price": 5})["id"] == "prod009"
+    restarted.close()
+
+
+def test_torn_final_journal_line_is_skipped(make_service, tmp_path):
+    service = make_service(PRODUCT_STORE_MODE="journal")
+    service.update_product("prod001", {"price": 10})
+    service.close()
+    with open(tmp_path / "products.json.wal", "a") as file:
+        file.write('{"op":"put","product":{"id":"prod0')
+
+    restarted = make_service(PRODUCT_STORE_MODE="journal")
+    assert restarted.get_product_by_id("prod001")["price"] == 10
+    restarted.update_product("prod003", {"price": 1})
+    restarted.close()
+
+    again = make_service(PRODUCT_STORE_MODE="journal")
+    assert again.get_product_by_id("prod003")["price"] == 1
+    again.close()
+
+
+def test_compaction_folds_the_journal_into_the_snapshot(make_service, tmp_path):
+    service = make_service(PRODUCT_STORE_MODE="journal")
+    service.update_product("prod001", {"price": 10})
+    service.delete_product("prod002")
+    service.journal.compact()
+    service.add_product({"name": "Mat", "price": 30})
+    service.close()
+
+    with open(tmp_path / "products.json") as file:
+        assert ids(json.load(file)) == ["prod001", "prod003", "prod007"]
+    assert [entry["op"] for entry in read_lines(tmp_path / "products.json.wal")] == ["put"]
+    assert not (tmp_path / "products.json.wal.compacting").exists()
+
+    restarted = make_service(PRODUCT_STORE_MODE="journal")
+    assert ids(restarted.get_all_products()) == ["prod001", "prod003", "prod007", "prod008"]
+    restarted.close()
+
+
+def test_compaction_starts_after_enough_entries(make_service, tmp_path):
+    service = make_service(PRODUCT_STORE_MODE="journal", PRODUCT_WAL_COMPACT_AFTER=2)
+    service.update_product("prod001", {"price": 10})
+    service.update_product("prod003", {"price": 11})
+    # Set before the background compaction starts and cleared when it is done
+    for _ in range(500):
+        if not service.journal._compacting:
+            break
+        time.sleep(0.01)
+    service.close()
+    with open(tmp_path / "products.json") as file:
+        assert [product["price"] for product in json.load(file)][:3] == [10, 199.99, 11]
+
+
+def test_interrupted_compaction_is_recovered(make_service, tmp_path):
+    service = make_service(PRODUCT_STORE_MODE="journal")
+    service.update_product("prod001", {"price": 10})
+    service.close()
+    # A crash after the log was rotated but before the snapshot was written
+    (tmp_path / "products.json.wal").rename(tmp_path / "products.json.wal.compacting")
+
+    restarted = make_service(PRODUCT_STORE_MODE="journal")
+    assert restarted.get_product_by_id("prod001")["price"] == 10
+    restarted.update_product("prod003", {"price": 11})
+    restarted.journal.compact()
+    restarted.close()
+
+    with open(tmp_path / "products.json") as file:
+        snapshot = {product["id"]: product["price"] for product in json.load(file)}
+    assert snapshot["prod001"] == 10 and snapshot["prod003"] == 11
+    assert not (tmp_path / "products.json.wal.compacting").exists()
+
+
+@pytest.mark.parametrize("load_mode", ["eager", "stream", "mmap"])
+@pytest.mark.parametrize("filename", ["products.json", "products.jsonl"])
+def test_every_load_mode_builds_the_same_service(make_service, load_mode, filename):
+    service = make_service(filename, PRODUCT_LOAD_MODE=load_mode)
+    assert service.get_all_products() == PRODUCTS
+    assert ids(service.get_products_by_category("Footwear")) == ["prod001", "prod003"]
+    assert sorted(ids(service.get_products_by_price_range(89.99, 120))) == ["prod001", "prod003", "prod007"]
+
+    service.update_product("prod001", {"category": "Sale"})
+    service.delete_product("prod002")
+    assert ids(service.get_products_by_category("Sale")) == ["prod001"]
+    assert service.add_product({"name": "Mat", "price": 30})["id"] == "prod008"
+
+
+def test_mmap_mode_replays_the_journal(make_service):
+    service = make_service("products.jsonl", PRODUCT_LOAD_MODE="mmap", PRODUCT_STORE_MODE="journal")
+    service.update_product("prod001", {"price": 10})
+    service.delete_product("prod002")
+    service.close()
+
+    restarted = make_service("products.jsonl", PRODUCT_LOAD_MODE="mmap", PRODUCT_STORE_MODE="journal")
+    assert ids(restarted.get_all_products()) == ["prod001", "prod003", "prod007"]
+    assert ids(restarted.get_products_by_price_range(0, 50)) == ["prod001"]
+    restarted.close()
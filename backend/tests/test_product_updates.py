@@ -0,0 +1,115 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from routes import products as product_routes
+from services import product_writes
+from services.image_service import ImageService
+
+
+@pytest.fixture
+def product(api_client):
+    response = api_client.post("/api/products", json={"name": "Lamp", "price": 20.0, "basic_description": "A lamp", "tags": ["home"]})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_patch_returns_the_new_version_etag(api_client, product):
+    response = api_client.patch(f"/api/products/{product['id']}", json={"price": 25.0})
+    assert response.status_code == 200
+    assert response.json()["price"] == 25.0
+    assert response.json()["version"] == 1
+    assert response.headers["ETag"] == '"1"'
+
+
+def test_if_match_conflict(api_client, product):
+    url = f"/api/products/{product['id']}"
+    assert api_client.patch(url, json={"price": 25.0}, headers={"If-Match": '"0"'}).status_code == 200
+
+    # A second writer still holding version 0 must not overwrite the first
+    response = api_client.patch(url, json={"price": 30.0}, headers={"If-Match": '"0"'})
+    assert response.status_code == 412
+    assert api_client.get(url).json()["price"] == 25.0
+
+    assert api_client.patch(url, json={"price": 30.0}, headers={"If-Match": '"1"'}).status_code == 200
+    assert api_client.patch(url, json={"price": 31.0}, headers={"If-Match": "*"}).status_code == 200
+    assert api_client.patch(url, json={"price": 32.0}, headers={"If-Match": "latest"}).status_code == 400
+
+
+def test_if_match_conflict_on_put(api_client, product):
+    url = f"/api/products/{product['id']}"
+    api_client.patch(url, json={"name": "Desk lamp"})
+    response = api_client.put(url, json={**product, "name": "Floor lamp"}, headers={"If-Match": '"0"'})
+    assert response.status_code == 412
+    assert api_client.get(url).json()["name"] == "Desk lamp"
+
+
+def test_if_match_on_a_missing_product(api_client):
+    response = api_client.patch(f"/api/products/{ObjectId()}", json={"price": 1.0}, headers={"If-Match": '"0"'})
+    assert response.status_code == 404
+
+
+def test_if_match_zero_matches_unversioned_products(api_client, api_user, mongo_db):
+    product_id = ObjectId()
+    asyncio.run(mongo_db.products.insert_one({"_id": product_id, "user_id": ObjectId(api_user.id), "name": "Old", "price": 1.0}))
+    response = api_client.patch(f"/api/products/{product_id}", json={"price": 2.0}, headers={"If-Match": '"0"'})
+    assert response.status_code == 200
+    assert response.json()["version"] == 1
+
+
+def test_noop_updates_keep_the_version(api_client, product):
+    url = f"/api/products/{product['id']}"
+    response = api_client.patch(url, json={"price": 20.0, "tags": ["home"]}, headers={"If-Match": '"0"'})
+    assert response.status_code == 200
+    assert response.json()["version"] == 0
+    assert response.json()["updated_at"] == product["updated_at"]
+    assert response.headers["ETag"] == '"0"'
+
+    response = api_client.put(url, json=product)
+    assert response.status_code == 200
+    assert response.json()["version"] == 0
+
+
+def test_only_changed_fields_are_written(api_client, product, monkeypatch):
+    writes = []
+    update = product_writes.versioned_update
+
+    def spy(changes):
+        writes.append(changes)
+        return update(changes)
+
+    monkeypatch.setattr(product_writes, "versioned_update", spy)
+    response = api_client.put(f"/api/products/{product['id']}", json={**product, "brand": "Lumen"})
+    assert response.status_code == 200
+    assert writes == [{"brand": "Lumen"}]
+    assert response.json()["version"] == 1
+
+
+@pytest.mark.anyio
+async def test_unconditional_update_retries_after_a_concurrent_write(mongo_db, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    user_id = ObjectId()
+    product_id = (await mongo_db.products.insert_one({"user_id": user_id, "name": "Lamp", "price": 20.0, "brand": "", "version": 0})).inserted_id
+    products = mongo_db.products
+    find_one = products.find_one
+
+    async def read_then_concurrent_write(query):
+        document = await find_one(query)
+        if document["version"] == 0:
+            # Another request bumps the version between this read and the write
+            await products.update_one({"_id": product_id}, {"$set": {"brand": "Other"}, "$inc": {"version": 1}})
+        return document
+
+    monkeypatch.setattr(products, "find_one", read_then_concurrent_write)
+    updated = await product_routes.apply_product_update(SimpleNamespace(products=products), ImageService(), str(product_id), str(user_id), {"price": 50.0}, None)
+    assert (updated.brand, updated.price, updated.version) == ("Other", 50.0, 2)
+
+    monkeypatch.setattr(products, "find_one", find_one)
+    await products.update_one({"_id": product_id}, {"$set": {"version": 0}})
+    monkeypatch.setattr(products, "find_one", read_then_concurrent_write)
+    with pytest.raises(HTTPException) as raised:
+        await product_routes.apply_product_update(SimpleNamespace(products=products), ImageService(), str(product_id), str(user_id), {"price": 60.0}, 0)
+    assert raised.value.status_code == 412
@@ -0,0 +1,146 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import tiktoken
+
+from models.product import Product
+from services import prompt_budget
+from services.prompt_budget import (
+    MIN_LIST_ITEMS,
+    PromptBudgeter,
+    PromptBudgetError,
+    count_tokens,
+    get_encoding,
+    token_usage,
+    truncate_tokens,
+)
+from utils.prompts import get_prompt_for_basic_product
+
+MODEL = "test-model"
+
+
+@pytest.fixture(autouse=True)
+def encodings(monkeypatch):
+    """Fresh tokenizer state; MODEL has no tokenizer, so counts are character estimates"""
+    loaded = {MODEL: None}
+    monkeypatch.setattr(prompt_budget, "_encodings", loaded)
+    monkeypatch.setattr(prompt_budget, "_pending", set())
+    loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tokenizer-load")
+    monkeypatch.setattr(prompt_budget, "_loader", loader)
+    yield loaded
+    loader.shutdown(wait=False)
+
+
+def byte_encoding():
+    # One token per byte, so token counts are easy to predict
+    return tiktoken.Encoding(
+        name="bytes", pat_str=r"[\s\S]", mergeable_ranks={bytes([i]): i for i in range(256)}, special_tokens={}
+    )
+
+
+def test_first_use_loads_in_the_background(encodings, monkeypatch):
+    release = threading.Event()
+    loads = []
+
+    def slow_load(model):
+        loads.append(threading.current_thread().name)
+        release.wait(5)
+        return byte_encoding()
+
+    monkeypatch.setattr(prompt_budget, "_load", slow_load)
+    # Concurrent first calls neither block nor start a second load
+    assert get_encoding("gpt-4o") is None
+    assert get_encoding("gpt-4o") is None
+    assert count_tokens("a" * 40, "gpt-4o") == 11
+
+    release.set()
+    prompt_budget._loader.shutdown(wait=True)
+    assert get_encoding("gpt-4o") is not None
+    assert len(loads) == 1 and loads[0].startswith("tokenizer-load")
+    assert count_tokens("a" * 40, "gpt-4o") == 40
+
+
+def test_truncate_tokens(encodings):
+    assert truncate_tokens("abcdefgh", 4, MODEL) == "abcdefgh"
+    assert truncate_tokens("abcdefghijklmnopq", 2, MODEL) == "abcdefgh…"
+    encodings["bytes"] = byte_encoding()
+    assert truncate_tokens("abcdef", 3, "bytes") == "abc…"
+    assert truncate_tokens("abc", 3, "bytes") == "abc"
+
+
+def budgeter(max_prompt_tokens: int) -> PromptBudgeter:
+    return PromptBudgeter(MODEL, max_prompt_tokens, max_completion_tokens=1000, context_tokens=8000)
+
+
+def long_product(**overrides) -> Product:
+    return Product(**{
+        "id": "p1",
+        "name": "Runner",
+        "price": 89.99,
+        "basic_description": "A light running shoe. " * 40,
+        "features": [f"feature {index}" for index in range(10)],
+        "materials": ["mesh", "rubber"],
+        "colors": [f"colour {index}" for index in range(20)],
+        "tags": [f"tag {index}" for index in range(30)],
+        **overrides,
+    })
+
+
+def test_fit_leaves_prompts_within_budget_alone():
+    product = long_product()
+    prompt = get_prompt_for_basic_product(product)
+    assert budgeter(10000).fit("system", get_prompt_for_basic_product, product) == prompt
+
+
+def test_fit_trims_the_least_important_fields_first():
+    product = long_product()
+    limit = budgeter(10000).count_chat("system", get_prompt_for_basic_product(product)) - 20
+    prompt = budgeter(limit).fit("system", get_prompt_for_basic_product, product)
+
+    assert budgeter(limit).count_chat("system", prompt) <= limit
+    assert "tag 29" not in prompt and "tag 0" in prompt
+    # Only as much as needed: later fields are untouched
+    assert "colour 19" in prompt
+    assert prompt.count("A light running shoe.") == 40
+
+
+def test_fit_keeps_a_few_items_and_cuts_text(monkeypatch):
+    trimmed = []
+    monkeypatch.setattr(token_usage, "record_trimmed", trimmed.append)
+    product = long_product()
+    prompt = budgeter(450).fit("system", get_prompt_for_basic_product, product)
+
+    assert f"Tags: {', '.join(f'tag {index}' for index in range(MIN_LIST_ITEMS))}\n" in prompt
+    assert "Materials: mesh, rubber" in prompt
+    assert "…" in prompt
+    assert budgeter(450).count_chat("system", prompt) <= 450
+    assert trimmed == [MODEL]
+
+
+def test_fit_returns_the_best_effort_when_it_cannot_fit():
+    product = long_product(name="x" * 4000)
+    prompt = budgeter(100).fit("system", get_prompt_for_basic_product, product)
+    # The name is never trimmed, so the prompt stays over budget
+    assert "x" * 4000 in prompt
+    assert budgeter(100).count_chat("system", prompt) > 100
+
+
+def test_fit_trims_dict_products():
+    product = {"name": "Runner", "tags": [f"tag {index}" for index in range(200)]}
+
+    def build(data):
+        return f"{data['name']}: {', '.join(data['tags'])}"
+
+    prompt = budgeter(100).fit("system", build, product)
+    assert budgeter(100).count_chat("system", prompt) <= 100
+    assert len(product["tags"]) == 200
+
+
+def test_completion_tokens():
+    budget = PromptBudgeter(MODEL, 4000, max_completion_tokens=500, context_tokens=1000)
+    assert budget.completion_tokens(100, 300) == 300
+    assert budget.completion_tokens(100, 800) == 500
+    assert budget.completion_tokens(900, 300) == 100
+    with pytest.raises(PromptBudgetError):
+        budget.completion_tokens(1000, 300)
@@ -0,0 +1,25 @@
+from models.product import Product
+from utils import prompts
+from utils.prompts import PromptStats, PromptTemplate, get_prompt_for_field, timed
+
+
+def test_template_fills_slots():
+    template = PromptTemplate("a {x} b {y}{x}")
+    assert template.fields == {"x", "y"}
+    assert template.render(x="1", y="2") == "a 1 b 21"
+
+
+def test_only_a_sample_of_renders_is_timed(monkeypatch):
+    stats = PromptStats()
+    monkeypatch.setattr(prompts, "prompt_stats", stats)
+    render = timed("test")(lambda: "prompt")
+    for _ in range(prompts.TIMING_SAMPLE_EVERY * 3):
+        assert render() == "prompt"
+    assert stats.snapshot()["renders"]["test"]["sampled"] == 3
+
+
+def test_field_prompt_contains_present_product_fields():
+    product = Product(name="Runner", price=89.99, brand="", features=["Light", "Grippy"])
+    prompt = get_prompt_for_field(product, "seo_title")
+    assert "\nProduct Name: Runner\nPrice: $89.99\nFeatures: Light, Grippy\n" in prompt
+    assert "Brand" not in prompt
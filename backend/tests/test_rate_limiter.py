@@ -0,0 +1,132 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from services import rate_limiter
+from services.rate_limiter import ModelRateLimiter, OpenAIRateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limiter.time, "monotonic", lambda: now[0])
+    return now
+
+
+def rate_limit_error(retry_after="0"):
+    response = httpx.Response(429, request=httpx.Request("POST", "https://api.openai.com"), headers={"retry-after": retry_after})
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+def test_reservations_queue_in_arrival_order(clock):
+    limiter = ModelRateLimiter("m", requests_per_minute=60, tokens_per_minute=600)
+    assert limiter.reserve(300) == 0
+    assert limiter.reserve(300) == 0
+    # The bucket is empty: the next 300 tokens refill in 30s, the one after that in 60s
+    assert limiter.reserve(300) == pytest.approx(30)
+    assert limiter.reserve(300) == pytest.approx(60)
+    clock[0] += 60
+    assert limiter.reserve(0) == pytest.approx(0)
+
+
+def test_refund_returns_capacity(clock):
+    limiter = ModelRateLimiter("m", requests_per_minute=60, tokens_per_minute=600)
+    limiter.reserve(600)
+    assert limiter.reserve(600) == pytest.approx(60)
+    limiter.refund(600)
+    assert limiter.reserve(0) == pytest.approx(0)
+
+
+@pytest.mark.anyio
+async def test_cancelled_waiter_refunds_its_reservation(clock):
+    limiter = ModelRateLimiter("m", requests_per_minute=60, tokens_per_minute=600)
+    limiter.reserve(600)
+    waiter = asyncio.create_task(limiter.acquire(600))
+    await asyncio.sleep(0)
+    assert limiter.queue_depth == 1
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert limiter.queue_depth == 0
+    assert limiter.stats()["cancelled"] == 1
+    # Only the first reservation is still owed
+    assert limiter.reserve(0) == pytest.approx(0)
+
+
+def test_calibrate_adopts_server_limits(clock):
+    limiter = ModelRateLimiter("m", requests_per_minute=60, tokens_per_minute=600)
+    limiter.calibrate({
+        "x-ratelimit-limit-requests": "120",
+        "x-ratelimit-limit-tokens": "1200",
+        "x-ratelimit-remaining-requests": "120",
+        "x-ratelimit-remaining-tokens": "0",
+    })
+    assert limiter.requests_per_minute == 120
+    assert limiter.reserve(600) == pytest.approx(30)
+    limiter.calibrate({"x-ratelimit-limit-requests": "lots"})
+    assert limiter.requests_per_minute == 120
+
+
+@pytest.mark.anyio
+async def test_call_retries_rate_limits_then_succeeds(monkeypatch):
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(rate_limiter.asyncio, "sleep", fake_sleep)
+    limiter = OpenAIRateLimiter()
+    responses = [rate_limit_error("2"), rate_limit_error("1")]
+
+    async def request():
+        if responses:
+            raise responses.pop(0)
+        return "ok"
+
+    assert await limiter.call("m", 10, request) == "ok"
+    assert sleeps == [2.0, 1.0]
+    assert limiter.stats()["m"]["rate_limited"] == 2
+    assert limiter.stats()["m"]["retries"] == 2
+
+
+@pytest.mark.anyio
+async def test_call_gives_up_on_other_errors():
+    limiter = OpenAIRateLimiter()
+
+    async def request():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        await limiter.call("m", 10, request)
+    assert limiter.stats()["m"]["retries"] == 0
+
+
+@pytest.mark.anyio
+async def test_llm_service_shares_the_limiter(monkeypatch):
+    from types import SimpleNamespace
+
+    from services import llm_service
+
+    async def fake_sleep(seconds):
+        pass
+
+    monkeypatch.setattr(rate_limiter.asyncio, "sleep", fake_sleep)
+    limiter = OpenAIRateLimiter()
+    monkeypatch.setattr(llm_service, "openai_rate_limiter", limiter)
+    responses = [rate_limit_error()]
+    message = SimpleNamespace(content="Hello")
+    completion = SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")], usage=None)
+
+    async def create(**request):
+        if responses:
+            raise responses.pop(0)
+        return SimpleNamespace(headers={}, parse=lambda: completion)
+
+    chat = SimpleNamespace(completions=SimpleNamespace(with_raw_response=SimpleNamespace(create=create)))
+    monkeypatch.setattr(llm_service, "client", SimpleNamespace(chat=chat))
+    service = llm_service.LLMService()
+    assert await service._chat("system", "prompt") == "Hello"
+    assert limiter.stats()[service.model_name]["rate_limited"] == 1
@@ -1,5 +1,6 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional, Set, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
@@ -10,8 +11,13 @@ from dependencies.database import get_database
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 from bson import errors as bson_errors
+from config import config
+from services.password_hasher import PasswordHasher
+import hashlib
 import logging
 import os
+import threading
+import time
 
 # Security configuration
 SECRET_KEY = os.getenv("JWT_SECRET", "jwt-proddesc.ai-dev")  # Change this in production
@@ -19,11 +25,90 @@ ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Changing AUTH_BCRYPT_ROUNDS rehashes existing passwords on their next login
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=config['AUTH_BCRYPT_ROUNDS'])
+password_hasher = PasswordHasher(pwd_context, config['AUTH_HASH_WORKERS'], config['AUTH_HASH_MAX_QUEUE'])
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 logger = logging.getLogger(__name__)
 
+# The password hash never leaves the database on authenticated requests, and the
+# products array is unbounded; routes that need it (e.g. /me) load it themselves
+CURRENT_USER_PROJECTION = {"hashed_password": 0, "products": 0}
+
+
+class UserCache:
+    """
+    Verified access tokens mapped to their User for a short time
+
+    Keyed on a hash of the token so raw tokens are not kept in memory. Entries
+    never outlive the token's own expiry and are dropped on logout or when the
+    user's record changes (see invalidate_user).
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, User]]" = OrderedDict()
+        self._keys_by_user: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[User]:
+        key = self.key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, token: str, user: User, token_expires_at: Optional[float] = None):
+        if self.ttl_seconds <= 0 or self.max_entries <= 0:
+            return
+        ttl = self.ttl_seconds
+        if token_expires_at is not None:
+            ttl = min(ttl, token_expires_at - time.time())
+        if ttl <= 0:
+            return
+        key = self.key(token)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, user)
+            self._keys_by_user.setdefault(str(user.id), set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_token(self, token: str):
+        with self._lock:
+            self._remove(self.key(token))
+
+    def invalidate_user(self, user_id):
+        """Drop every cached token of a user; call after changing their record"""
+        with self._lock:
+            for key in self._keys_by_user.pop(str(user_id), set()):
+                self._entries.pop(key, None)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        user_id = str(entry[1].id)
+        keys = self._keys_by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[user_id]
+
+
+user_cache = UserCache(config['AUTH_USER_CACHE_TTL_SECONDS'], config['AUTH_USER_CACHE_MAX_ENTRIES'])
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -50,6 +135,9 @@ async def get_current_user(
     db: AsyncIOMotorDatabase = Depends(get_database)
 ) -> User:
     """Get current user from token"""
+    cached = user_cache.get(token)
+    if cached is not None:
+        return cached
     try:
         # Decode token
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -62,7 +150,7 @@ async def get_current_user(
             )
         
         # Get user from database
-        user_data = await db.users.find_one({"_id": ObjectId(user_id)})
+        user_data = await db.users.find_one({"_id": ObjectId(user_id)}, CURRENT_USER_PROJECTION)
         if not user_data:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -71,8 +159,12 @@ async def get_current_user(
             )
         
         # Create User object using from_dict method
-        return User.from_dict(user_data)
+        user = User.from_dict(user_data)
+        user_cache.put(token, user, payload.get("exp"))
+        return user
         
+    except HTTPException:
+        raise
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -0,0 +1,53 @@
+import re
+from typing import Pattern
+
+from fastapi import HTTPException, status
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class BodySizeLimitMiddleware:
+    """
+    Reject request bodies over `max_bytes` before the app parses them
+
+    FastAPI spools a whole multipart body into UploadFile before the route
+    runs, so a limit checked by the route only protects storage, not the
+    server. Bodies with a larger Content-Length are refused without being
+    read; chunked bodies are counted as they arrive and cut off at the limit.
+    """
+
+    def __init__(self, app: ASGIApp, max_bytes: int, paths: str):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths: Pattern = re.compile(paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self.paths.fullmatch(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            response = JSONResponse({"detail": self._detail()}, status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised inside the route's body parsing, which passes HTTPExceptions through
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=self._detail())
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    def _detail(self) -> str:
+        return f"Request body exceeds the maximum of {self.max_bytes} bytes"
@@ -0,0 +1,95 @@
+import hashlib
+import os
+import re
+from typing import Optional
+
+import anyio
+from fastapi import Request, Response, status
+from fastapi.staticfiles import StaticFiles
+
+from config import config
+from services.image_variants import image_variants, variant_filename
+
+# Product reads are per-user: browsers may keep them but must revalidate every time
+PRODUCT_CACHE_CONTROL = "private, no-cache"
+
+
+def product_etag(version: Optional[int]) -> str:
+    """Strong ETag for one product, derived from its version counter (also accepted by If-Match)"""
+    return f'"{version or 0}"'
+
+
+def list_etag(query_key: str, summary: dict) -> str:
+    """Strong ETag for a list page: the query plus the summary of the user's products (see list_summary)"""
+    digest = hashlib.sha1(query_key.encode())
+    digest.update(f"|{summary['count']}|{summary['updated_at']}|{summary['versions']}".encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison as required for If-None-Match"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (candidate.strip().removeprefix("W/") for candidate in if_none_match.split(","))
+    return etag in candidates
+
+
+def not_modified(etag: str) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": etag, "Cache-Control": PRODUCT_CACHE_CONTROL}
+    )
+
+
+# `<sha256>.<ext>` blobs and their `<sha256>.w<width>.<ext>` variants; the name is the content
+CONTENT_ADDRESSED_NAME = re.compile(r"^[0-9a-f]{64}(\.w\d+)?\.[A-Za-z0-9]+$")
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """
+    Static files where content-addressed uploads are cached for a long time
+    without revalidating; any other file must be revalidated
+
+    Images accept `?w=<pixels>`: the smallest stored variant at least that
+    wide is served, in the best format the client's Accept header allows.
+    """
+
+    def file_response(self, full_path, *args, **kwargs) -> Response:
+        response = super().file_response(full_path, *args, **kwargs)
+        if CONTENT_ADDRESSED_NAME.match(os.path.basename(full_path)):
+            response.headers["Cache-Control"] = f"public, max-age={config['UPLOADS_CACHE_MAX_AGE_SECONDS']}, immutable"
+        else:
+            response.headers["Cache-Control"] = "public, no-cache"
+        return response
+
+    async def get_response(self, path: str, scope) -> Response:
+        request = Request(scope)
+        width = request.query_params.get("w", "")
+        if not width.isdigit():
+            return await super().get_response(path, scope)
+
+        variant = await anyio.to_thread.run_sync(self._find_variant, path, int(width), request.headers.get("accept", ""))
+        response = await super().get_response(variant or path, scope)
+        response.headers["Vary"] = "Accept"
+        if variant is None:
+            # The variant may not have been rendered yet; don't pin the original to this URL
+            response.headers["Cache-Control"] = "public, no-cache"
+        return response
+
+    def _find_variant(self, path: str, width: int, accept: str) -> Optional[str]:
+        formats = [
+            fmt for fmt in image_variants.formats
+            if fmt == "jpeg" or f"image/{fmt}" in accept
+        ]
+        directory, filename = os.path.split(path)
+        for candidate_width in image_variants.widths:
+            if candidate_width < width:
+                continue
+            for fmt in formats:
+                candidate = os.path.join(directory, variant_filename(filename, candidate_width, fmt))
+                _, stat_result = self.lookup_path(candidate)
+                if stat_result is not None:
+                    return candidate
+        return None
@@ -1,79 +1,173 @@
-def add_product_info_to_prompt(prompt, product):
-    if product.name:
-        prompt += f"\nProduct Name: {product.name}"
-    if product.brand:
-        prompt += f"\nBrand: {product.brand}"
-    if product.price:
-        prompt += f"\nPrice: ${product.price}"  
-    if product.category:    
-        prompt += f"\nCategory: {product.category}"
-    if product.basic_description:
-        prompt += f"\nBasic Description: {product.basic_description}"
-    if product.features:
-        prompt += f"\nFeatures: {', '.join(product.features)}"
-    if product.materials:
-        prompt += f"\nMaterials: {', '.join(product.materials)}"
-    if product.colors: 
-        prompt += f"\nColors: {', '.join(product.colors)}"
-    if product.tags:
-        prompt += f"\nTags: {', '.join(product.tags)}"  
-    return prompt
+import itertools
+import threading
+import time
+from functools import lru_cache, wraps
+from string import Formatter
+from typing import Any, Dict, Optional, Tuple
+
+
+class PromptTemplate:
+    """
+    A prompt split once, at import, into literal text and named slots
+
+    Rendering only drops the values into their slots and joins, so nothing
+    is re-parsed or concatenated piece by piece per call.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self._parts = []
+        self._slots = []
+        for literal, name, _, _ in Formatter().parse(source):
+            self._parts.append(literal)
+            if name is not None:
+                self._slots.append((len(self._parts), name))
+                self._parts.append("")
+        self.fields = frozenset(name for _, name in self._slots)
+
+    def render(self, **values: str) -> str:
+        parts = self._parts.copy()
+        for index, name in self._slots:
+            parts[index] = values[name]
+        return "".join(parts)
+
+
+# Only one render in this many is timed, so the stats cost almost nothing per render
+TIMING_SAMPLE_EVERY = 64
+
+
+class PromptStats:
+    """Sampled render time per prompt kind for the metrics endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, int] = {}
+        self.seconds: Dict[str, float] = {}
+
+    def record(self, kind: str, seconds: float):
+        with self._lock:
+            self.samples[kind] = self.samples.get(kind, 0) + 1
+            self.seconds[kind] = self.seconds.get(kind, 0.0) + seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            renders = {
+                kind: {"sampled": count, "avg_us": round(self.seconds[kind] / count * 1_000_000, 1)}
+                for kind, count in self.samples.items()
+            }
+        return {"renders": renders, "sample_every": TIMING_SAMPLE_EVERY}
+
+
+prompt_stats = PromptStats()
+
+
+def timed(kind: str):
+    """Record how long a sample of the calls of a prompt builder take"""
+    def decorator(func):
+        calls = itertools.count()
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if next(calls) % TIMING_SAMPLE_EVERY:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            prompt = func(*args, **kwargs)
+            prompt_stats.record(kind, time.perf_counter() - started)
+            return prompt
+        return wrapper
+    return decorator
+
+
+def render_product_info(product) -> str:
+    """The product information block shared by the field, basic and image prompts"""
+    return "".join((
+        f"\nProduct Name: {product.name}" if product.name else "",
+        f"\nBrand: {product.brand}" if product.brand else "",
+        f"\nPrice: ${product.price}" if product.price else "",
+        f"\nCategory: {product.category}" if product.category else "",
+        f"\nBasic Description: {product.basic_description}" if product.basic_description else "",
+        f"\nFeatures: {', '.join(product.features)}" if product.features else "",
+        f"\nMaterials: {', '.join(product.materials)}" if product.materials else "",
+        f"\nColors: {', '.join(product.colors)}" if product.colors else "",
+        f"\nTags: {', '.join(product.tags)}" if product.tags else "",
+    ))
+
+
+def _bullets(heading: str, items) -> str:
+    return f"\n{heading}:\n• " + "\n• ".join(items) + "\n" if items else ""
+
+def _description_details(category, features, materials, colors, basic_description, tags) -> str:
+    return "".join((
+        f"CATEGORY: {category}\n" if category else "",
+        _bullets("KEY FEATURES", features),
+        _bullets("MATERIALS", materials),
+        f"\nAVAILABLE COLORS: {', '.join(colors)}\n" if colors else "",
+        f"\nBASIC PRODUCT INFO: {basic_description}\n" if basic_description else "",
+        f"\nTARGET KEYWORDS: {', '.join(tags)}\n" if tags else "",
+    ))
+
+def render_description_details(product) -> str:
+    """The product sections of the description prompt"""
+    return _description_details(
+        product.category, product.features, product.materials, product.colors, product.basic_description, product.tags
+    )
 
-def get_prompt_for_field(product, field):
-    """Return the appropriate prompt for the given field."""
-    base_info = add_product_info_to_prompt("", product)
 
-    prompts = {
-        "seo_title": f"""
+def add_product_info_to_prompt(prompt, product):
+    return prompt + render_product_info(product)
+
+# Field prompts, compiled once; {base_info} is the product information block
+FIELD_TEMPLATES = {
+    "seo_title": PromptTemplate("""
         Using the following product information:
         {base_info}
         Generate an SEO-optimized title for the product. The title should be concise, engaging, and include relevant keywords.
-        """,
+        """),
 
-        "seo_description": f"""
+    "seo_description": PromptTemplate("""
         Using the following product information:
         {base_info}
         Generate an SEO-optimized meta description for the product. The description should be engaging, include relevant keywords, and stay within 160 characters.
-        """,
+        """),
 
-        "detailed_description": f"""
+    "detailed_description": PromptTemplate("""
         Using the following product information:
         {base_info}
         Generate a detailed product description. Highlight the product's unique features, benefits, and use cases. The tone should be professional and informative.
-        """,
+        """),
 
-        "features": f"""
+    "features": PromptTemplate("""
         Using the following product information:
         {base_info}
         Suggest additional features that would make the product more appealing to customers. 
         Provide a list of 5 features, where each feature is concise and written as a single line.
-        """,
+        """),
 
-        "materials": f"""
+    "materials": PromptTemplate("""
         Using the following product information:
         {base_info}
         Suggest additional materials that could be used to manufacture this product. Provide a list of materials.
-        """,
+        """),
 
-        "colors": f"""
+    "colors": PromptTemplate("""
         Using the following product information:
         {base_info}
         Suggest additional color options for this product. Provide a list of colors.
-        """,
+        """),
 
-        "tags": f"""
+    "tags": PromptTemplate("""
         Using the following product information:
         {base_info}
         Suggest additional tags or keywords that could help categorize and market this product effectively. Provide a list of tags.
-        """,
+        """),
 
-        "marketing_copy.email": f"""
+    "marketing_copy.email": PromptTemplate("""
         Using the following product information:
         {base_info}
         Generate an engaging marketing email for this product. The email should highlight the product's key benefits and include a call-to-action to purchase or learn more.
-        """,
+        """),
 
-        "marketing_copy.social_media.instagram": f"""
+    "marketing_copy.social_media.instagram": PromptTemplate("""
         Using the following product information:
         {base_info}
         Generate an Instagram post caption for this product. The caption should be engaging, include relevant hashtags, and encourage users to interact with the post.
@@ -83,9 +177,9 @@ def get_prompt_for_field(product, field):
         - End with a clear call-to-action
         - Include 3-5 relevant hashtags at the end (format with # symbol)
         - Tone should be visual, aspirational, and lifestyle-focused
-        """,
+        """),
 
-        "marketing_copy.social_media.facebook": f"""
+    "marketing_copy.social_media.facebook": PromptTemplate("""
         Using the following product information:
         {base_info}
         Generate a Facebook post for this product. 
@@ -94,15 +188,15 @@ def get_prompt_for_field(product, field):
         - Create a clear value proposition
         - End with a specific call-to-action
         - Tone should be conversational and informative
-        """,
+        """),
 
-        "marketing_copy.social_media.linkedin": f"""
+    "marketing_copy.social_media.linkedin": PromptTemplate("""
         Using the following product information:
         {base_info}
         Generate a Facebook post for this product. The post should highlight the product's key benefits and include a call-to-action to purchase or learn more.
-        """,
+        """),
 
-        "marketing_copy.social_media.twitter": f"""
+    "marketing_copy.social_media.twitter": PromptTemplate("""
         Using the following product information:
         {base_info}
         - Create a concise, attention-grabbing tweet (max 280 characters)
@@ -110,32 +204,62 @@ def get_prompt_for_field(product, field):
         - Include 1-2 relevant hashtags integrated into the text
         - Include a call-to-action when possible
         - Make it conversational, clever or timely when appropriate
-        """,
+        """),
 
-        "description": f"""
+    "description": PromptTemplate("""
         Using the following product information:
         {base_info}
         Generate a concise and engaging product description. The description should highlight the product's key features and benefits.
-        """,
+        """),
 
-        "image_url": f""" 
+    "image_url": PromptTemplate(""" 
         Using the following product information:
-        {base_info}"""
-    }
+        {base_info}""")
+}
 
-    if field not in prompts:
+@timed("field")
+def get_prompt_for_field(product, field):
+    """Return the appropriate prompt for the given field."""
+    template = FIELD_TEMPLATES.get(field)
+    if template is None:
         raise ValueError(f"Field '{field}' is not supported for generation.")
-    
-    return prompts[field]
+    return template.render(base_info=render_product_info(product))
 
-def get_prompt_for_basic_product(product):
-    """Return a dictionary of prompts for the basic product data."""
-    prompt = f"""
-        Use the following product information to generate content:
-        """
-    prompt = add_product_info_to_prompt(prompt, product)
+MISSING_FIELD_INSTRUCTIONS = {
+    "features": "a JSON array of 5 concise features, each a single line",
+    "materials": "a JSON array of materials that could be used to manufacture this product",
+    "colors": "a JSON array of color options for this product",
+    "tags": "a JSON array of tags or keywords to categorize and market this product",
+    "seo_title": "an SEO-optimized title string (max 60 characters)",
+    "seo_description": "an SEO-optimized meta description string (max 160 characters)",
+    "detailed_description": "a detailed, professional product description string highlighting unique features, benefits and use cases",
+    "marketing_copy.email": "a marketing email string with a call-to-action",
+    "marketing_copy.social_media.instagram": "an Instagram caption string with 2-3 emojis and 3-5 hashtags at the end",
+    "marketing_copy.social_media.facebook": "a Facebook post string (75-100 words) with one engagement question",
+    "marketing_copy.social_media.twitter": "a tweet string (max 280 characters) with 1-2 hashtags",
+    "marketing_copy.social_media.linkedin": "a professional LinkedIn post string (100-150 words)"
+}
 
-    prompt += f"""
+MISSING_FIELDS_TEMPLATE = PromptTemplate("""
+        Using the following product information:
+        {base_info}
+        Generate the missing product content.
+        Respond with a single JSON object containing exactly these keys and nothing else:
+{field_lines}
+        Use the key names exactly as written, including dots. Do not wrap the JSON in markdown.
+        """)
+
+@timed("missing_fields")
+def get_prompt_for_missing_fields(product, fields):
+    """Return a prompt requesting all of the given fields as a single JSON object."""
+    field_lines = "\n".join(
+        f'        - "{field}": {MISSING_FIELD_INSTRUCTIONS[field]}' for field in fields
+    )
+    return MISSING_FIELDS_TEMPLATE.render(base_info=render_product_info(product), field_lines=field_lines)
+
+BASIC_PRODUCT_TEMPLATE = PromptTemplate("""
+        Use the following product information to generate content:
+        {base_info}
         Generate:
         1. An SEO-optimized title (max 60 characters)
         2. An SEO-optimized meta description (max 160 characters)
@@ -147,110 +271,101 @@ def get_prompt_for_basic_product(product):
         Give a line space between each section to enable easy parsing.
         Make sure to: use all the existing data, and suggest new data where necessary.
         Always use the same format. (**1.**, **2.**, **3.**, etc.)
-        """
-    return prompt
+        """)
 
+@timed("basic_product")
+def get_prompt_for_basic_product(product):
+    """Return a dictionary of prompts for the basic product data."""
+    return BASIC_PRODUCT_TEMPLATE.render(base_info=render_product_info(product))
+
+# {header} is the optional name/brand/price block, {details} the category, features and other product sections
+DESCRIPTION_TEMPLATE = PromptTemplate(
+    "Create a compelling product description for the following e-commerce product:\n\n"
+    "{header}{details}{instructions}"
+)
+
+# Writing instructions depend only on the style options, of which there are few combinations
+DESCRIPTION_INSTRUCTIONS_TEMPLATE = PromptTemplate(
+    "\n--- WRITING INSTRUCTIONS ---\n"
+    "TONE: {tone}\n"
+    "{length}"
+    "TARGET AUDIENCE: {audience}\n"
+    "\nSTRUCTURE:\n"
+    "1. Start with an attention-grabbing opening that highlights a key benefit\n"
+    "2. Describe what the product is and its primary use cases\n"
+    "3. Highlight 3-4 key features and their benefits to the user\n"
+    "4. Include relevant details about quality, materials, or design\n"
+    "5. End with a concise call-to-action or value proposition\n"
+    "\nADDITIONAL GUIDELINES:\n"
+    "• Use active voice and present tense\n"
+    "• Focus on benefits, not just features\n"
+    "• Create vivid, sensory language where appropriate\n"
+    "• Avoid clichés and generic marketing language\n"
+    "{keywords}"
+    "\nProvide the product description as a cohesive, ready-to-use text without headings or bullet points unless they enhance readability. Don't include any disclaimers or explanations about the content."
+)
+
+DESCRIPTION_LENGTHS = {
+    "short": "LENGTH: Concise, approximately 75-100 words\n",
+    "long": "LENGTH: Detailed, approximately 200-250 words\n",
+}
+DEFAULT_DESCRIPTION_LENGTH = "LENGTH: Balanced, approximately 150-175 words\n"
+
+@lru_cache(maxsize=256)
+def _description_instructions(tone: str, length: Optional[str], audience: str, keywords: Tuple[str, ...]) -> str:
+    return DESCRIPTION_INSTRUCTIONS_TEMPLATE.render(
+        tone=tone,
+        length=DESCRIPTION_LENGTHS.get(length, DEFAULT_DESCRIPTION_LENGTH),
+        audience=audience,
+        keywords=f"\nPlease naturally incorporate these keywords: {', '.join(keywords)}\n" if keywords else ""
+    )
+
+def render_description_prompt(header: str, details: str, style: Optional[dict]) -> str:
+    style = style or {}
+    instructions = _description_instructions(
+        str(style.get('tone', 'professional')),
+        style.get('length'),
+        str(style.get('audience', 'general consumers')),
+        tuple(style.get('keywords') or ())
+    )
+    return DESCRIPTION_TEMPLATE.render(header=header, details=details, instructions=instructions)
+
+@timed("product_description")
 def get_prompt_for_product_description(product, style=None):
-    # Implementation example - detailed prompt crafting
-    prompt = f"Create a compelling product description for the following e-commerce product:\n\n"
-        
-    # Add category information
-    if product.category:
-        prompt += f"CATEGORY: {product.category}\n"
-    
-    # Add product features with emphasis
-    if product.features and len(product.features) > 0:
-        prompt += "\nKEY FEATURES:\n"
-        for feature in product.features:
-            prompt += f"• {feature}\n"
-    
-    # Add materials information
-    if product.materials and len(product.materials) > 0:
-        prompt += "\nMATERIALS:\n"
-        for material in product.materials:
-            prompt += f"• {material}\n"
-    
-    # Add color options
-    if product.colors and len(product.colors) > 0:
-        prompt += f"\nAVAILABLE COLORS: {', '.join(product.colors)}\n"
-    
-    # Add existing basic description if available
-    if product.basic_description:
-        prompt += f"\nBASIC PRODUCT INFO: {product.basic_description}\n"
-    
-    # Add target keywords if available
-    if product.tags and len(product.tags) > 0:
-        prompt += f"\nTARGET KEYWORDS: {', '.join(product.tags)}\n"
-    
-    # Style and tone instructions
-    prompt += f"\n--- WRITING INSTRUCTIONS ---\n"
-    prompt += f"TONE: {style.get('tone', 'professional')}\n"
-    
-    # Length guidance based on style preference
-    if style.get('length') == 'short':
-        prompt += "LENGTH: Concise, approximately 75-100 words\n"
-    elif style.get('length') == 'long':
-        prompt += "LENGTH: Detailed, approximately 200-250 words\n"
-    else:  # medium is default
-        prompt += "LENGTH: Balanced, approximately 150-175 words\n"
-    
-    # Target audience customization
-    prompt += f"TARGET AUDIENCE: {style.get('audience', 'general consumers')}\n"
-    
-    # Structure guidance
-    prompt += "\nSTRUCTURE:\n"
-    prompt += "1. Start with an attention-grabbing opening that highlights a key benefit\n"
-    prompt += "2. Describe what the product is and its primary use cases\n"
-    prompt += "3. Highlight 3-4 key features and their benefits to the user\n"
-    prompt += "4. Include relevant details about quality, materials, or design\n"
-    prompt += "5. End with a concise call-to-action or value proposition\n"
-    
-    # Additional writing guidance
-    prompt += "\nADDITIONAL GUIDELINES:\n"
-    prompt += "• Use active voice and present tense\n"
-    prompt += "• Focus on benefits, not just features\n"
-    prompt += "• Create vivid, sensory language where appropriate\n"
-    prompt += "• Avoid clichés and generic marketing language\n"
-    
-    # Keyword integration
-    if style.get('keywords'):
-        prompt += f"\nPlease naturally incorporate these keywords: {', '.join(style['keywords'])}\n"
-    
-    # Final output formatting instructions
-    prompt += "\nProvide the product description as a cohesive, ready-to-use text without headings or bullet points unless they enhance readability. Don't include any disclaimers or explanations about the content."
-    return prompt
+    return render_description_prompt("", render_description_details(product), style)
 
+@timed("product_description")
+def get_prompt_for_product_data_description(product_data: Dict[str, Any], style=None):
+    """Description prompt for a plain product dict, as used by LLMService"""
+    header = (
+        f"PRODUCT: {product_data.get('name', '')}\n"
+        f"BRAND: {product_data.get('brand', '')}\n"
+        f"PRICE: ${product_data.get('price', '')}\n"
+    )
+    category = product_data.get('category')
+    if category and product_data.get('subcategory'):
+        category = f"{category} > {product_data['subcategory']}"
+    details = _description_details(
+        category, product_data.get('features'), product_data.get('materials'), product_data.get('colors'),
+        product_data.get('basic_description'), product_data.get('tags')
+    )
+    return render_description_prompt(header, details, style)
+
+IMAGE_GENERATION_TEMPLATE = PromptTemplate(
+    "\n    Generate a high-quality image of the following product:\n    "
+    "{base_info}"
+    "\n    \nUse an aesthetic Background: {background}\n    "
+    "\n    \nEnsure {lighting} lighting\n    "
+    "\n    Show the product in {angle} angle\n    "
+)
+
+@timed("image_generation")
 def get_prompt_for_image_generation(product, style=None):
     """Return a prompt for generating product images."""
-    prompt = f"""
-    Generate a high-quality image of the following product:
-    """
-    if product.name:
-        prompt += f"\nProduct Name: {product.name}"
-    if product.brand:
-        prompt += f"\nBrand: {product.brand}"
-    if product.price:
-        prompt += f"\nPrice: ${product.price}"  
-    if product.category:    
-        prompt += f"\nCategory: {product.category}"
-    if product.basic_description:
-        prompt += f"\nBasic Description: {product.basic_description}"
-    if product.features:
-        prompt += f"\nFeatures: {', '.join(product.features)}"
-    if product.materials:
-        prompt += f"\nMaterials: {', '.join(product.materials)}"
-    if product.colors: 
-        prompt += f"\nColors: {', '.join(product.colors)}"
-    if product.tags:
-        prompt += f"\nTags: {', '.join(product.tags)}"  
-
-    prompt += f"""
-    \nUse an aesthetic Background: {style.get('background', 'white')}
-    """
-    prompt += f"""
-    \nEnsure {style.get('lighting', 'Natural')} lighting
-    """
-    prompt += f"""
-    Show the product in {style.get('angle', 'front')} angle
-    """
-    return prompt
\ No newline at end of file
+    style = style or {}
+    return IMAGE_GENERATION_TEMPLATE.render(
+        base_info=render_product_info(product),
+        background=style.get('background', 'white'),
+        lighting=style.get('lighting', 'Natural'),
+        angle=style.get('angle', 'front')
+    )
@@ -23,7 +23,7 @@ import {
 } from '@mui/icons-material';
 import { useAuth } from '../context/AuthContext';
 import { useProduct } from '../context/ProductContext';
-import { fetchProducts } from '../services/api';
+import { fetchProducts, productImageSrc } from '../services/api';
 
 function Home() {
   const navigate = useNavigate();
@@ -122,7 +122,7 @@ function Home() {
                   <CardMedia
                     component="img"
                     height="200"
-                    image={product.image_url}
+                    image={productImageSrc(product, 400)}
                     alt={product.name}
                     sx={{
                       objectFit: 'cover',
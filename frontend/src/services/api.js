@@ -47,6 +47,21 @@ export const fetchProducts = async () => {
   }
 };
 
+// One page of products; pass the returned nextCursor back to get the next page
+export const fetchProductPage = async ({ cursor, limit, sort, fields } = {}) => {
+  const params = { count: true };
+  if (cursor) params.cursor = cursor;
+  if (limit) params.limit = limit;
+  if (sort) params.sort = sort;
+  if (fields) params.fields = fields.join(',');
+  const response = await api.get('/api/products', { params });
+  return {
+    items: Array.isArray(response.data) ? response.data : [],
+    nextCursor: response.headers['x-next-cursor'] || null,
+    total: Number(response.headers['x-total-count'] ?? 0),
+  };
+};
+
 export const fetchProduct = async (id) => {
   try {
     const response = await api.get(`/api/products/${id}`);
@@ -90,6 +105,18 @@ export const updateProduct = async (id, productData) => {
   }
 };
 
+// Send only the changed fields; pass the version the edit started from to detect conflicting edits (HTTP 412)
+export const patchProduct = async (id, changes, version) => {
+  try {
+    const headers = version === undefined ? {} : { 'If-Match': `"${version}"` };
+    const response = await api.patch(`/api/products/${id}`, changes, { headers });
+    return response.data;
+  } catch (error) {
+    console.error('Error updating product:', error);
+    throw error;
+  }
+};
+
 export const deleteProduct = async (id) => {
   try {
     await api.delete(`/api/products/${id}`);
@@ -100,6 +127,24 @@ export const deleteProduct = async (id) => {
   }
 };
 
+export const fetchJob = async (jobId) => {
+  const response = await api.get(`/api/jobs/${jobId}`);
+  return response.data;
+};
+
+export const waitForJob = async (jobId, intervalMs = 1000) => {
+  for (;;) {
+    const job = await fetchJob(jobId);
+    if (job.status === 'completed') {
+      return job;
+    }
+    if (job.status === 'failed') {
+      throw new Error(job.error || 'Generation job failed');
+    }
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+};
+
 export const generateSectionContent = async (id, section, payload) => {
   try {
     const requestBody = {
@@ -108,7 +153,12 @@ export const generateSectionContent = async (id, section, payload) => {
     };
 
     const response = await api.post(`/api/products/${id}/generate-basic-data`, requestBody);
-    return response.data;
+    // Generation runs as a background job; wait for it to finish
+    const job = await waitForJob(response.data.job_id);
+    return {
+      message: 'Basic data generated successfully.',
+      generated_basic_data: job.result,
+    };
   } catch (error) {
     console.error('Error generating content:', error);
     throw error;
@@ -137,6 +187,51 @@ export const generateProductImages = async (productId, options = {}) => {
   }
 };
 
+// Smallest resized copy at least `width` px wide, best format first; the original until variants exist
+const VARIANT_FORMAT_ORDER = ['avif', 'webp', 'jpeg'];
+
+export const productImageSrc = (product, width) => {
+  const variants = product.image_variants;
+  if (!variants || variants.source !== product.image_url) {
+    return product.image_url;
+  }
+  const candidates = variants.items
+    .filter((item) => item.width >= width)
+    .sort((a, b) => a.width - b.width
+      || VARIANT_FORMAT_ORDER.indexOf(a.format) - VARIANT_FORMAT_ORDER.indexOf(b.format));
+  return candidates.length ? candidates[0].url : product.image_url;
+};
+
+const sha256Hex = async (file) => {
+  const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+  return Array.from(new Uint8Array(digest), (byte) => byte.toString(16).padStart(2, '0')).join('');
+};
+
+// Sends the file straight to storage (presigned S3 in production) instead of through the API
+export const uploadProductImageDirect = async (productId, file) => {
+  try {
+    const { data: upload } = await api.post(`/api/products/${productId}/image/upload-url`, {
+      filename: file.name,
+      content_type: file.type,
+      size: file.size,
+      sha256: await sha256Hex(file),
+    });
+    // No upload_url means the same image is already stored
+    if (upload.upload_url) {
+      // Presigned S3 URLs are absolute and must not carry our auth header
+      const client = upload.upload_url.startsWith('/') ? api : axios;
+      await client.put(upload.upload_url, file, { headers: upload.headers });
+    }
+    const response = await api.post(`/api/products/${productId}/image/complete`, {
+      upload_id: upload.upload_id,
+    });
+    return response.data;
+  } catch (error) {
+    console.error('Error uploading product image:', error);
+    throw error;
+  }
+};
+
 export const updateProductImage = async (productId, imageData) => {
   try {
     const response = await api.put(`/api/products/${productId}/image`, imageData);